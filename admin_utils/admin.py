@@ -0,0 +1,16 @@
+"""admin_utils.admin.py
+
+ModelAdmin mixin for changelists of tables with millions of rows,
+see `admin_utils.pagination` and `admin_utils.dates`.
+"""
+from admin_utils.pagination import CachedCountPaginator, KeysetChangeList
+
+
+class LargeTableAdminMixin:
+    """Cached counts, keyset pagination and a date hierarchy from precomputed buckets."""
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin_utils/change_list.html'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
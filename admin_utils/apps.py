@@ -0,0 +1,5 @@
+from django.apps import AppConfig
+
+
+class AdminUtilsConfig(AppConfig):
+    name = 'admin_utils'
@@ -0,0 +1,150 @@
+"""admin_utils.pagination.py
+
+Changelist pagination for tables with millions of rows.
+
+CachedCountPaginator keeps the result count of a changelist query in
+the cache for `ADMIN_COUNT_CACHE_TIMEOUT` seconds, so the COUNT(*)
+runs once per query and timeout instead of on every page view.
+
+KeysetChangeList pages with a cursor instead of an OFFSET: the
+"next" link carries the ordering values of the last row shown, and
+the following page is selected with a range condition on the ordering
+columns, which the database answers with an index seek however deep
+the page is.
+"""
+import base64
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+CURSOR_VAR = 'after'
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator caching the count of its queryset."""
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        key = 'admin_utils:count:{}:{}'.format(
+            query.model._meta.label_lower, hashlib.md5(str(query).encode()).hexdigest()
+        )
+        timeout = getattr(settings, 'ADMIN_COUNT_CACHE_TIMEOUT', 60)
+        return cache.get_or_set(key, self.object_list.count, timeout)
+
+
+def _cursor_value(value):
+    # Unlike DjangoJSONEncoder keep the microseconds, the cursor must be exact
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=_cursor_value).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise IncorrectLookupParameters("Invalid cursor.")
+    if not isinstance(values, list):
+        raise IncorrectLookupParameters("Invalid cursor.")
+    return values
+
+
+class KeysetChangeList(ChangeList):
+    """ChangeList selecting the rows after the `after` cursor instead of a page number.
+
+    Keyset pagination needs an ordering on non-null, non-relation
+    fields of the model itself, which the admin always ends with the
+    primary key. For other orderings, e.g. by a related field, the
+    page number is used as usual.
+    """
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Sorting and filter links start from the first page
+        remove = list(remove or [])
+        if CURSOR_VAR not in (new_params or {}):
+            remove.append(CURSOR_VAR)
+        return super().get_query_string(new_params, remove)
+
+    @cached_property
+    def keyset_fields(self):
+        """(field, descending) pairs of the ordering, or None if it cannot be used for keyset pagination."""
+        fields = []
+        for name in self.queryset.query.order_by:
+            if not isinstance(name, str):
+                return None
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            try:
+                field = self.lookup_opts.pk if name == 'pk' else self.lookup_opts.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.null or field.is_relation:
+                return None
+            fields.append((field, descending))
+        if not fields or fields[-1][0] != self.lookup_opts.pk:
+            return None
+        return fields
+
+    def seek_condition(self, values):
+        """Rows following the row with the ordering `values`."""
+        condition = Q()
+        equal = {}
+        for (field, descending), value in zip(self.keyset_fields, values):
+            lookup = 'lt' if descending else 'gt'
+            condition |= Q(**equal, **{f'{field.attname}__{lookup}': value})
+            equal[field.attname] = value
+        return condition
+
+    def get_results(self, request):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        if not self.cursor or self.keyset_fields is None:
+            self.cursor = None
+            super().get_results(request)
+            return
+
+        raw_values = decode_cursor(self.cursor)
+        if len(raw_values) != len(self.keyset_fields):
+            raise IncorrectLookupParameters("Invalid cursor.")
+        try:
+            values = [field.to_python(value) for (field, _), value in zip(self.keyset_fields, raw_values)]
+        except ValidationError:
+            raise IncorrectLookupParameters("Invalid cursor.")
+
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = self.queryset.filter(self.seek_condition(values))[:self.list_per_page]
+        self.can_show_all = False
+        self.multi_page = True
+
+    def next_cursor(self):
+        """Cursor of the page after the shown rows, or None on the last page."""
+        if self.keyset_fields is None or not self.multi_page or self.show_all:
+            return None
+        rows = list(self.result_list)
+        if len(rows) < self.list_per_page:
+            return None
+        values = [getattr(rows[-1], field.attname) for field, _ in self.keyset_fields]
+        return encode_cursor(values)
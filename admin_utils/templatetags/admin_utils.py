@@ -0,0 +1,22 @@
+from django import template
+
+from admin_utils.dates import bucketed_date_hierarchy
+from admin_utils.pagination import CURSOR_VAR
+
+
+register = template.Library()
+
+
+@register.inclusion_tag('admin/date_hierarchy.html')
+def bucketed_date_hierarchy_tag(cl):
+    return bucketed_date_hierarchy(cl)
+
+
+@register.inclusion_tag('admin_utils/keyset_pagination.html')
+def keyset_pagination(cl):
+    next_cursor = cl.next_cursor()
+    return {
+        'cl': cl,
+        'first_url': cl.get_query_string(remove=[CURSOR_VAR, 'p']) if cl.cursor or cl.page_num > 1 else None,
+        'next_url': cl.get_query_string({CURSOR_VAR: next_cursor}, remove=['p']) if next_cursor else None,
+    }
@@ -2,26 +2,45 @@
 generated by Claude.ai
 """
 from django.contrib import admin
+
+from admin_utils.admin import LargeTableAdminMixin
+from search.admin import FullTextSearchMixin
 from .models import Customer, AccountManager, ServiceProvider, Service, Order
 
 
+class AccountManagerListFilter(admin.RelatedFieldListFilter):
+    """Filter by account manager, loading the names with the managers."""
+
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        managers = AccountManager.objects.select_related('user').order_by(*ordering)
+        return [(manager.pk, str(manager)) for manager in managers]
+
+
 @admin.register(Customer)
-class CustomerAdmin(admin.ModelAdmin):
+class CustomerAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('name', 'created_by')
-    list_filter = ('created_by',)
-    search_fields = ('name',)
-
-    def formfield_for_foreignkey(self, db_field, request, **kwargs):
-        if db_field.name == 'created_by':
-            kwargs["queryset"] = AccountManager.objects.all().select_related('user')
-        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+    list_filter = (('created_by', AccountManagerListFilter),)
+    list_select_related = ('created_by__user',)
+    autocomplete_fields = ('created_by',)
+    search_documents = (('customer', 'pk'),)
+    # Prefix searches served by the NOCASE name indexes, for terms without words
+    search_fields = ('^name',)
+    ordering = ('name',)
 
 
 @admin.register(AccountManager)
-class AccountManagerAdmin(admin.ModelAdmin):
+class AccountManagerAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('user', 'get_full_name')
-    filter_horizontal = ('service_providers',)
-    search_fields = ('user__username', 'user__first_name', 'user__last_name')
+    list_select_related = ('user',)
+    autocomplete_fields = ('service_providers',)
+    search_documents = (('manager', 'pk'),)
+    search_fields = ('^user__username', '^user__first_name', '^user__last_name')
+    ordering = ('user__username',)
+
+    def get_queryset(self, request):
+        # The autocomplete results are labelled with the user names
+        return super().get_queryset(request).select_related('user')
 
     def get_full_name(self, obj):
         return obj.user.get_full_name()
@@ -30,30 +49,43 @@ class AccountManagerAdmin(admin.ModelAdmin):
 
 
 @admin.register(ServiceProvider)
-class ServiceProviderAdmin(admin.ModelAdmin):
+class ServiceProviderAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('name',)
-    search_fields = ('name',)
+    search_documents = (('provider', 'pk'),)
+    search_fields = ('^name',)
+    ordering = ('name',)
 
 
 @admin.register(Service)
-class ServiceAdmin(admin.ModelAdmin):
+class ServiceAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('name', 'provider', 'price')
     list_filter = ('provider',)
-    search_fields = ('name', 'description')
+    list_select_related = ('provider',)
+    search_documents = (('service', 'pk'),)
+    search_fields = ('^name',)
+    ordering = ('name',)
+
+    def get_queryset(self, request):
+        # The autocomplete results are labelled with the provider names
+        return super().get_queryset(request).select_related('provider')
 
 
 class ServiceInline(admin.TabularInline):
     model = Order.services.through
     extra = 1
+    autocomplete_fields = ('service',)
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(FullTextSearchMixin, LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'customer', 'account_manager', 'created_at', 'get_total_price')
-    list_filter = ('account_manager', 'created_at')
+    list_filter = (('account_manager', AccountManagerListFilter), 'created_at')
+    list_select_related = ('customer', 'account_manager__user')
+    search_documents = (('customer', 'customer'),)
     search_fields = ('customer__name',)
     date_hierarchy = 'created_at'
     exclude = ('services',)
+    autocomplete_fields = ('customer', 'account_manager', 'job')
     inlines = [ServiceInline]
 
     def save_model(self, request, obj, form, change):
@@ -66,6 +98,7 @@ class OrderAdmin(admin.ModelAdmin):
             obj.services.set(form.cleaned_data['services'])
 
     def get_total_price(self, obj):
-        return sum(service.price for service in obj.services.all())
+        return obj.total_value
 
-    get_total_price.short_description = 'Total Price'
\ No newline at end of file
+    get_total_price.short_description = 'Total Price'
+    get_total_price.admin_order_field = 'total_value'
\ No newline at end of file
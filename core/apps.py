@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    name = 'core'
+
+    def ready(self):
+        # Keep the order totals and the provider permission cache up to date
+        from core import signals, validation  # noqa: F401
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.totals import repair_order_totals
+
+
+class Command(BaseCommand):
+    help = "Recompute Order.total_value and Order.service_count where they differ from the services."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help="Orders checked per UPDATE.")
+
+    def handle(self, *args, **options):
+        repaired = repair_order_totals(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Repaired the totals of {repaired} order(s)."))
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:14
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_order_totals(apps, schema_editor):
+    Order = apps.get_model('core', 'Order')
+    OrderServices = Order.services.through
+    services = OrderServices.objects.filter(order=OuterRef('pk')).values('order')
+    Order.objects.update(
+        total_value=Coalesce(
+            Subquery(services.annotate(value=Sum('service__price')).values('value'),
+                     output_field=DecimalField(max_digits=12, decimal_places=2)),
+            0, output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        service_count=Coalesce(
+            Subquery(services.annotate(value=Count('pk')).values('value'), output_field=IntegerField()), 0
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_report_indexes'),
+        ('execution', '0002_report_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_created_covering_idx',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='service_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_value',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at', 'account_manager', 'customer', 'total_value'], name='order_created_covering_idx'),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:20
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+USER_SEARCH_COLUMNS = ('username', 'first_name', 'last_name')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0003_order_totals'),
+    ]
+
+    operations = [
+        # Prefix search of the account managers in the admin
+        migrations.RunSQL(
+            [f'CREATE INDEX core_user_{column}_prefix_idx ON auth_user ({column} COLLATE NOCASE)'
+             for column in USER_SEARCH_COLUMNS],
+            [f'DROP INDEX core_user_{column}_prefix_idx' for column in USER_SEARCH_COLUMNS],
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(django.db.models.functions.comparison.Collate('name', 'NOCASE'), name='customer_name_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(django.db.models.functions.comparison.Collate('name', 'NOCASE'), name='service_name_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='serviceprovider',
+            index=models.Index(django.db.models.functions.comparison.Collate('name', 'NOCASE'), name='provider_name_prefix_idx'),
+        ),
+    ]
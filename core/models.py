@@ -1,9 +1,15 @@
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models.functions import Collate
 from execution.models import Job
 
 
+# SQLite answers the case-insensitive LIKE of a prefix search from an
+# index only if the index uses this collation
+SEARCH_COLLATION = 'NOCASE'
+
+
 class Customer(models.Model):
     name = models.CharField(max_length=200)
     created_by = models.ForeignKey(
@@ -17,6 +23,14 @@ class Customer(models.Model):
     def __str__(self):
         return self.name
 
+    class Meta:
+        indexes = [
+            # New customers in a reporting range
+            models.Index(fields=['created_at'], name='customer_created_idx'),
+            # Prefix search of the admin autocomplete, see SEARCH_COLLATION
+            models.Index(Collate('name', SEARCH_COLLATION), name='customer_name_prefix_idx'),
+        ]
+
 
 class AccountManager(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -35,6 +49,11 @@ class ServiceProvider(models.Model):
     def __str__(self):
         return self.name
 
+    class Meta:
+        indexes = [
+            models.Index(Collate('name', SEARCH_COLLATION), name='provider_name_prefix_idx'),
+        ]
+
 
 class Service(models.Model):
     name = models.CharField(max_length=200)
@@ -45,6 +64,11 @@ class Service(models.Model):
     def __str__(self):
         return f"{self.name} ({self.provider.name})"
 
+    class Meta:
+        indexes = [
+            models.Index(Collate('name', SEARCH_COLLATION), name='service_name_prefix_idx'),
+        ]
+
 
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
@@ -54,6 +78,10 @@ class Order(models.Model):
     # Services in this order
     services = models.ManyToManyField(Service, related_name='orders')
 
+    # Sum of the prices and number of the services, maintained by core.signals
+    total_value = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    service_count = models.PositiveIntegerField(default=0, editable=False)
+
     job = models.ForeignKey(
         Job,
         on_delete=models.SET_NULL,
@@ -62,25 +90,31 @@ class Order(models.Model):
         related_name='orders'
     )
 
+    # Fields written by core.totals only
+    TOTAL_FIELDS = ('total_value', 'service_count')
+
     def __str__(self):
         return f"Order #{self.id} by {self.customer.name}"
 
+    def save(self, *args, **kwargs):
+        # Do not overwrite the totals with the values loaded with this instance
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.TOTAL_FIELDS]
+        super().save(*args, **kwargs)
+
     def clean(self):
         super().clean()
         # Custom validation: all services must be from providers managed by this order's account manager
-        from django.core.exceptions import ValidationError
+        from core.validation import validate_orders
 
         if not self.pk or not self.account_manager_id:
             return  # Skip validation on unsaved instance
 
-        allowed_providers = set(self.account_manager.service_providers.values_list('id', flat=True))
-        print(self.account_manager)
-        print(allowed_providers)
-        for service in self.services.all():
-            print(service.name)
-            print(service.provider_id)
-            if service.provider_id not in allowed_providers:
-                raise ValidationError(f"Service '{service.name}' from provider '{service.provider.name}' is not allowed.")
+        service_ids = self.services.values_list('pk', flat=True)
+        error, = validate_orders([(self.account_manager_id, service_ids)])
+        if error is not None:
+            raise error
 
     class Meta:
         constraints = [
@@ -91,4 +125,9 @@ class Order(models.Model):
         ]
         permissions = [
             ("view_own_orders", "Can view orders managed by the account manager"),
+        ]
+        indexes = [
+            # Covers the order statistics of a reporting range
+            models.Index(fields=['created_at', 'account_manager', 'customer', 'total_value'],
+                         name='order_created_covering_idx'),
         ]
\ No newline at end of file
@@ -0,0 +1,61 @@
+"""core.signals.py
+
+Signal receivers keeping `Order.total_value` and `Order.service_count`
+up to date, see `core.totals`.
+
+Also defines the signals sent by the bulk writes of `core.validation`,
+which bypass the model signals.
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from core.models import Order, Service
+from core.totals import update_order_totals
+
+
+# Sent with `order_ids` after orders and their services were bulk-created
+orders_bulk_created = Signal()
+
+
+@receiver(m2m_changed, sender=Order.services.through)
+def update_totals_on_services_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # The cleared orders are not known any more after the clear
+        instance._total_order_ids = list(instance.orders.values_list('pk', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        order_ids = [instance.pk]
+    elif action == 'post_clear':
+        order_ids = getattr(instance, '_total_order_ids', [])
+    else:
+        order_ids = list(pk_set or [])
+    if order_ids:
+        update_order_totals(Order.objects.filter(pk__in=order_ids))
+
+
+@receiver(pre_save, sender=Service)
+def check_price_before_save(sender, instance, raw=False, **kwargs):
+    instance._price_changed = False
+    if not raw and instance.pk:
+        previous = Service.objects.filter(pk=instance.pk).values_list('price', flat=True).first()
+        instance._price_changed = previous is not None and previous != instance.price
+
+
+@receiver(post_save, sender=Service)
+def update_totals_on_price_change(sender, instance, raw=False, **kwargs):
+    if getattr(instance, '_price_changed', False):
+        update_order_totals(Order.objects.filter(services=instance))
+
+
+@receiver(pre_delete, sender=Service)
+def remember_orders_before_delete(sender, instance, **kwargs):
+    instance._total_order_ids = list(instance.orders.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Service)
+def update_totals_after_delete(sender, instance, **kwargs):
+    # The through rows are deleted without m2m_changed
+    if getattr(instance, '_total_order_ids', None):
+        update_order_totals(Order.objects.filter(pk__in=instance._total_order_ids))
@@ -0,0 +1,50 @@
+import datetime
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from core.models import AccountManager, Customer, Order, Service, ServiceProvider
+
+
+class ChangelistQueryCountTest(TestCase):
+    """The changelists render with the same number of queries for 5 and 120 rows."""
+
+    changelists = ['core_customer', 'core_accountmanager', 'core_serviceprovider', 'core_service', 'core_order']
+
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser("admin")
+        self.rows = 0
+
+    def create_rows(self, count):
+        # Every row gets its own related objects, so per-row queries cannot hit a cache
+        created_at = datetime.datetime(2024, 1, 10, tzinfo=datetime.timezone.utc)
+        for index in range(self.rows, self.rows + count):
+            user = User.objects.create(username=f"manager{index}", first_name="Anna", last_name=f"B{index}")
+            manager = AccountManager.objects.create(user=user)
+            provider = ServiceProvider.objects.create(name=f"Provider {index}")
+            manager.service_providers.add(provider)
+            service = Service.objects.create(name=f"Service {index}", price=Decimal("10.00"), provider=provider)
+            customer = Customer.objects.create(name=f"Customer {index}", created_by=manager)
+            order = Order.objects.create(customer=customer, account_manager=manager, created_at=created_at)
+            order.services.add(service)
+        self.rows += count
+
+    def changelist_queries(self, changelist):
+        self.client.force_login(self.admin_user)
+        # Measure without the cached counts and date buckets of the large tables
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:{changelist}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries.captured_queries)
+
+    def test_query_count_does_not_depend_on_rows(self):
+        self.create_rows(5)
+        few = {changelist: self.changelist_queries(changelist) for changelist in self.changelists}
+        self.create_rows(115)
+        for changelist in self.changelists:
+            with self.subTest(changelist=changelist):
+                self.assertEqual(self.changelist_queries(changelist), few[changelist])
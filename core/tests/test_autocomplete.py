@@ -0,0 +1,71 @@
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from core.models import AccountManager, Customer, Service, ServiceProvider
+
+
+class AutocompleteTest(TestCase):
+    """The admin pickers search with an index instead of listing every row."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin"))
+        user = User.objects.create(username="manager", first_name="Anna", last_name="Bauer")
+        self.manager = AccountManager.objects.create(user=user)
+        self.provider = ServiceProvider.objects.create(name="Fab")
+        for index in range(25):
+            Customer.objects.create(name=f"Acme {index:02}", created_by=self.manager)
+            Service.objects.create(name=f"Etch {index:02}", price=Decimal("10.00"), provider=self.provider)
+        Customer.objects.create(name="Globex", created_by=self.manager)
+
+    def autocomplete(self, model_name, field_name, term, **params):
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'core', 'model_name': model_name, 'field_name': field_name, 'term': term, **params,
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_results_are_paginated(self):
+        first = self.autocomplete('order', 'customer', 'acme')
+        self.assertEqual(len(first['results']), 20)
+        self.assertTrue(first['pagination']['more'])
+        second = self.autocomplete('order', 'customer', 'acme', page=2)
+        self.assertEqual([result['text'] for result in second['results']],
+                         [f"Acme {index}" for index in range(20, 25)])
+        self.assertFalse(second['pagination']['more'])
+
+    def test_search_matches_prefix(self):
+        self.assertEqual(self.autocomplete('order', 'customer', 'lobex')['results'], [])
+        results = self.autocomplete('order', 'account_manager', 'bau')['results']
+        self.assertEqual([result['text'] for result in results], ["Anna Bauer (manager)"])
+
+    def test_query_count_does_not_depend_on_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            results = self.autocomplete('order_services', 'service', 'etch')['results']
+        self.assertEqual(results[0]['text'], "Etch 00 (Fab)")
+        # Session, user, count and page
+        self.assertEqual(len(queries.captured_queries), 4)
+
+    def test_order_form_does_not_list_choices(self):
+        response = self.client.get(reverse('admin:core_order_add'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "Acme 00")
+        self.assertNotContains(response, "Etch 00")
+        self.assertContains(response, 'data-field-name="service"')
+
+    def test_searches_use_indexes(self):
+        for model_name, field_name in [('order', 'customer'), ('order', 'account_manager'), ('order', 'job'),
+                                       ('order_services', 'service'), ('accountmanager', 'service_providers')]:
+            with CaptureQueriesContext(connection) as queries:
+                self.autocomplete(model_name, field_name, 'ab')
+            searches = [query['sql'] for query in queries.captured_queries if 'MATCH' in query['sql']]
+            self.assertTrue(searches)
+            for sql in searches:
+                with self.subTest(field_name=field_name, sql=sql), connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                    details = [row[3] for row in cursor.fetchall()]
+                    # The full-text index is a virtual table, everything else must be searched
+                    self.assertEqual([detail for detail in details
+                                      if detail.startswith('SCAN ') and 'VIRTUAL TABLE' not in detail], [])
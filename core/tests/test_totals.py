@@ -0,0 +1,60 @@
+import io
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from core.models import AccountManager, Customer, Order, Service, ServiceProvider
+from core.totals import repair_order_totals
+
+
+class OrderTotalsTest(TestCase):
+    def setUp(self):
+        provider = ServiceProvider.objects.create(name="Fab")
+        self.manager = AccountManager.objects.create(user=User.objects.create(username="manager"))
+        self.customer = Customer.objects.create(name="Acme", created_by=self.manager)
+        self.etch = Service.objects.create(name="Etch", price=Decimal("10.00"), provider=provider)
+        self.dice = Service.objects.create(name="Dice", price=Decimal("2.50"), provider=provider)
+        self.order = Order.objects.create(customer=self.customer, account_manager=self.manager)
+
+    def assert_totals(self, total_value, service_count, order=None):
+        order = Order.objects.get(pk=(order or self.order).pk)
+        self.assertEqual((order.total_value, order.service_count), (Decimal(total_value), service_count))
+
+    def test_services_change(self):
+        self.order.services.add(self.etch, self.dice)
+        self.assert_totals("12.50", 2)
+        self.order.services.remove(self.etch)
+        self.assert_totals("2.50", 1)
+        self.etch.orders.add(self.order)
+        self.assert_totals("12.50", 2)
+        self.dice.orders.clear()
+        self.assert_totals("10.00", 1)
+        self.order.services.clear()
+        self.assert_totals("0.00", 0)
+
+    def test_price_change_and_service_delete(self):
+        self.order.services.set([self.etch, self.dice])
+        self.etch.price = Decimal("20.00")
+        self.etch.save()
+        self.assert_totals("22.50", 2)
+        self.dice.delete()
+        self.assert_totals("20.00", 1)
+
+    def test_saving_a_stale_instance_keeps_the_totals(self):
+        self.order.services.add(self.etch)
+        self.order.save()
+        self.assert_totals("10.00", 1)
+
+    def test_repair(self):
+        other = Order.objects.create(customer=self.customer, account_manager=self.manager)
+        self.order.services.add(self.etch)
+        other.services.add(self.dice)
+        Order.objects.filter(pk=self.order.pk).update(total_value=0, service_count=0)
+
+        self.assertEqual(repair_order_totals(batch_size=1), 1)
+        self.assert_totals("10.00", 1)
+        self.assert_totals("2.50", 1, other)
+
+        output = io.StringIO()
+        call_command('repair_order_totals', stdout=output)
+        self.assertIn('0 order(s)', output.getvalue())
@@ -0,0 +1,79 @@
+import datetime
+import io
+from contextlib import redirect_stdout
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from core.models import AccountManager, Customer, Order, Service, ServiceProvider
+from core.validation import bulk_create_orders, provider_permissions, validate_orders
+from stat_analysis.models import OrderManagerRollup
+from stat_analysis.rollups import rebuild_rollups
+
+
+class OrderValidationTest(TestCase):
+    def setUp(self):
+        provider_permissions.invalidate()
+        self.allowed = ServiceProvider.objects.create(name="Allowed Fab")
+        self.other = ServiceProvider.objects.create(name="Other Fab")
+        self.manager = AccountManager.objects.create(user=User.objects.create(username="manager"))
+        self.manager.service_providers.add(self.allowed)
+        self.customer = Customer.objects.create(name="Acme", created_by=self.manager)
+        self.etch = Service.objects.create(name="Etch", price=Decimal("10.00"), provider=self.allowed)
+        self.dice = Service.objects.create(name="Dice", price=Decimal("5.00"), provider=self.other)
+
+    def test_batch_validation(self):
+        errors = validate_orders([
+            (self.manager.pk, [self.etch.pk]),
+            (self.manager.pk, [self.etch.pk, self.dice.pk]),
+            (self.manager.pk, []),
+        ])
+        self.assertIsNone(errors[0])
+        self.assertEqual(errors[1].messages, ["Service 'Dice' from provider 'Other Fab' is not allowed."])
+        self.assertIsNone(errors[2])
+
+    def test_query_count_does_not_depend_on_orders(self):
+        orders = [(self.manager.pk, [self.etch.pk])] * 2000 + [(self.manager.pk, [self.dice.pk])]
+        # allowed providers, service providers and the names of the violating services
+        with self.assertNumQueries(3):
+            errors = validate_orders(orders)
+        self.assertEqual(sum(error is not None for error in errors), 1)
+        with self.assertNumQueries(2):
+            validate_orders(orders)
+
+    def test_cache_is_invalidated_on_provider_change(self):
+        self.assertIsNotNone(validate_orders([(self.manager.pk, [self.dice.pk])])[0])
+        self.manager.service_providers.add(self.other)
+        self.assertEqual(validate_orders([(self.manager.pk, [self.dice.pk])]), [None])
+
+        self.other.account_managers.remove(self.manager)
+        self.assertIsNotNone(validate_orders([(self.manager.pk, [self.dice.pk])])[0])
+
+    def test_clean_does_not_print(self):
+        order = Order.objects.create(customer=self.customer, account_manager=self.manager)
+        order.services.set([self.etch, self.dice])
+        output = io.StringIO()
+        with redirect_stdout(output), self.assertRaises(ValidationError):
+            order.clean()
+        self.assertEqual(output.getvalue(), "")
+
+    def test_bulk_create_orders(self):
+        rebuild_rollups()
+        created_at = datetime.datetime(2024, 1, 10, tzinfo=datetime.timezone.utc)
+        orders = bulk_create_orders([
+            (Order(customer=self.customer, account_manager=self.manager, created_at=created_at), [self.etch.pk])
+            for _ in range(3)
+        ])
+        self.assertEqual(len(orders), 3)
+        self.assertEqual(Order.services.through.objects.filter(order__in=orders).count(), 3)
+        rollup = OrderManagerRollup.objects.get(account_manager=self.manager)
+        self.assertEqual((rollup.order_count, rollup.revenue), (3, Decimal("30.00")))
+
+    def test_bulk_create_rejects_invalid_orders(self):
+        with self.assertRaises(ValidationError) as context:
+            bulk_create_orders([
+                (Order(customer=self.customer, account_manager=self.manager), [self.etch.pk]),
+                (Order(customer=self.customer, account_manager=self.manager), [self.dice.pk]),
+            ])
+        self.assertEqual(list(context.exception.message_dict), ["order 1"])
+        self.assertFalse(Order.objects.exists())
@@ -0,0 +1,86 @@
+"""core.totals.py
+
+This module maintains the denormalized `Order.total_value` and
+`Order.service_count`.
+
+Both are recomputed in the database with one UPDATE over correlated
+subqueries on the `Order.services` through table, so no services
+are loaded into Python. The receivers in `core.signals` call
+`update_order_totals` whenever the services of an order or the price
+of a service change. `repair_order_totals` recomputes every order,
+e.g. after raw SQL writes. Its UPDATEs bypass the model signals, so
+every batch sends `order_totals_pre_repair` and
+`order_totals_post_repair` instead.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from django.dispatch import Signal
+
+from core.models import Order
+
+
+# Sent with `order_ids`, the repaired orders of a batch, inside the transaction of the batch.
+# Defined here as `core.signals` imports this module.
+order_totals_pre_repair = Signal()
+order_totals_post_repair = Signal()
+
+
+def _through_aggregate(aggregate, output_field):
+    rows = (
+        Order.services.through.objects
+        .filter(order=OuterRef('pk'))
+        .values('order')
+        .annotate(value=aggregate)
+        .values('value')
+    )
+    return Subquery(rows, output_field=output_field)
+
+
+def order_totals():
+    """Expressions of the services total and count of an order, for `update()` or `annotate()`."""
+    value_field = Order._meta.get_field('total_value')
+    return {
+        'total_value': Coalesce(
+            _through_aggregate(Sum('service__price'), value_field),
+            Value(Decimal('0.00')), output_field=DecimalField(max_digits=value_field.max_digits,
+                                                              decimal_places=value_field.decimal_places),
+        ),
+        'service_count': Coalesce(_through_aggregate(Count('pk'), IntegerField()), Value(0)),
+    }
+
+
+def update_order_totals(orders):
+    """Recompute the totals of the orders in the queryset `orders` with one UPDATE."""
+    return Order.objects.filter(pk__in=orders.values('pk')).update(**order_totals())
+
+
+def repair_order_totals(batch_size=10000):
+    """Recompute the totals of every order whose stored values are stale.
+
+    The orders are checked in primary key ranges of `batch_size`, so
+    each UPDATE touches a bounded number of rows. Returns the number
+    of repaired orders.
+    """
+    repaired = 0
+    last_pk = 0
+    while True:
+        pks = list(Order.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return repaired
+        batch = Order.objects.filter(pk__gte=pks[0], pk__lte=pks[-1])
+        stale = (
+            batch
+            .annotate(**{f'expected_{name}': expression for name, expression in order_totals().items()})
+            .filter(~Q(total_value=F('expected_total_value')) | ~Q(service_count=F('expected_service_count')))
+        )
+        order_ids = list(stale.values_list('pk', flat=True))
+        if order_ids:
+            with transaction.atomic():
+                order_totals_pre_repair.send(sender=Order, order_ids=order_ids)
+                repaired += update_order_totals(Order.objects.filter(pk__in=order_ids))
+                order_totals_post_repair.send(sender=Order, order_ids=order_ids)
+        last_pk = pks[-1]
@@ -0,0 +1,179 @@
+"""core.validation.py
+
+This module checks and creates Orders in batches.
+
+An Order may only contain services of providers its account manager
+is allowed to sell. The allowed provider ids of every account manager
+are kept in an in-process cache. The receivers at the end of this
+module clear a manager's entry when their `service_providers` change.
+Entries also expire after `PROVIDER_CACHE_TIMEOUT` seconds, so
+changes made by other processes are picked up.
+
+`validate_orders` checks any number of (account manager, services)
+pairs with a fixed number of queries, `bulk_create_orders` writes
+validated orders and their services with `bulk_create`.
+"""
+import threading
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+
+from core.models import AccountManager, Order, Service, ServiceProvider
+from core.signals import orders_bulk_created
+from core.totals import update_order_totals
+
+
+PROVIDER_CACHE_TIMEOUT = 300
+
+# Number of ids per `__in` lookup, below the SQLite variable limit
+LOOKUP_BATCH_SIZE = 900
+
+
+def _batches(ids, size=LOOKUP_BATCH_SIZE):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+class ProviderPermissionCache:
+    """Allowed service provider ids per account manager id."""
+
+    def __init__(self, timeout=PROVIDER_CACHE_TIMEOUT):
+        self.timeout = timeout
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, manager_ids):
+        """Return {manager id: frozenset of provider ids}, loading the missing managers in one query."""
+        now = time.monotonic()
+        allowed, missing = {}, set()
+        with self._lock:
+            for manager_id in set(manager_ids):
+                entry = self._entries.get(manager_id)
+                if entry is not None and entry[0] > now:
+                    allowed[manager_id] = entry[1]
+                else:
+                    missing.add(manager_id)
+
+        if missing:
+            loaded = {manager_id: set() for manager_id in missing}
+            ManagerProviders = AccountManager.service_providers.through
+            for batch in _batches(missing):
+                rows = ManagerProviders.objects.filter(accountmanager_id__in=batch)
+                for manager_id, provider_id in rows.values_list('accountmanager_id', 'serviceprovider_id'):
+                    loaded[manager_id].add(provider_id)
+            with self._lock:
+                for manager_id, providers in loaded.items():
+                    allowed[manager_id] = frozenset(providers)
+                    self._entries[manager_id] = (now + self.timeout, allowed[manager_id])
+        return allowed
+
+    def get(self, manager_id):
+        return self.get_many([manager_id])[manager_id]
+
+    def invalidate(self, manager_ids=None):
+        """Forget the given managers, or all managers if `manager_ids` is None."""
+        with self._lock:
+            if manager_ids is None:
+                self._entries.clear()
+            else:
+                for manager_id in manager_ids:
+                    self._entries.pop(manager_id, None)
+
+
+provider_permissions = ProviderPermissionCache()
+
+
+def validate_orders(orders):
+    """Check (account manager id, service ids) pairs against the allowed providers.
+
+    Returns a list with a ValidationError, or None if the pair is
+    valid, for every pair. The queries issued only depend on the
+    number of distinct managers and services, not on the number of
+    pairs.
+    """
+    orders = [(manager_id, list(service_ids)) for manager_id, service_ids in orders]
+    allowed = provider_permissions.get_many(manager_id for manager_id, _ in orders)
+
+    service_providers = {}
+    for batch in _batches({service_id for _, service_ids in orders for service_id in service_ids}):
+        service_providers.update(Service.objects.filter(pk__in=batch).values_list('pk', 'provider_id'))
+
+    violations = []
+    for manager_id, service_ids in orders:
+        violation = next((service_id for service_id in service_ids
+                          if service_providers.get(service_id) not in allowed[manager_id]), None)
+        violations.append(violation)
+
+    # Names are only needed for the error messages
+    names = {}
+    for batch in _batches({service_id for service_id in violations if service_id is not None}):
+        names.update(
+            (pk, (name, provider_name))
+            for pk, name, provider_name in Service.objects.filter(pk__in=batch).values_list(
+                'pk', 'name', 'provider__name')
+        )
+
+    errors = []
+    for service_id in violations:
+        if service_id is None:
+            errors.append(None)
+        elif service_id not in names:
+            errors.append(ValidationError(f"Service {service_id} does not exist."))
+        else:
+            name, provider_name = names[service_id]
+            errors.append(ValidationError(f"Service '{name}' from provider '{provider_name}' is not allowed."))
+    return errors
+
+
+def bulk_create_orders(orders, validate=True, batch_size=1000):
+    """Create (unsaved Order, service ids) pairs and their services with `bulk_create`.
+
+    With `validate` the services are checked first and a
+    ValidationError listing the invalid orders by position is raised
+    if any is not allowed; nothing is written in that case. Returns
+    the created orders.
+    """
+    orders = [(order, list(service_ids)) for order, service_ids in orders]
+    if validate:
+        errors = validate_orders((order.account_manager_id, service_ids) for order, service_ids in orders)
+        invalid = {f"order {index}": error.messages for index, error in enumerate(errors) if error is not None}
+        if invalid:
+            raise ValidationError(invalid)
+
+    OrderServices = Order.services.through
+    with transaction.atomic():
+        created = Order.objects.bulk_create([order for order, _ in orders], batch_size=batch_size)
+        OrderServices.objects.bulk_create(
+            [OrderServices(order_id=order.pk, service_id=service_id)
+             for order, (_, service_ids) in zip(created, orders) for service_id in dict.fromkeys(service_ids)],
+            batch_size=batch_size,
+        )
+        order_ids = [order.pk for order in created]
+        for batch in _batches(order_ids):
+            update_order_totals(Order.objects.filter(pk__in=batch))
+        orders_bulk_created.send(sender=Order, order_ids=order_ids)
+    return created
+
+
+@receiver(m2m_changed, sender=AccountManager.service_providers.through)
+def invalidate_providers_on_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        provider_permissions.invalidate([instance.pk])
+    elif pk_set:
+        provider_permissions.invalidate(pk_set)
+    else:
+        # The managers of a cleared provider are not known any more
+        provider_permissions.invalidate()
+
+
+@receiver(post_delete, sender=AccountManager)
+@receiver(post_delete, sender=ServiceProvider)
+def invalidate_providers_on_delete(sender, instance, **kwargs):
+    # Deleting a provider removes its permissions without m2m_changed
+    provider_permissions.invalidate([instance.pk] if sender is AccountManager else None)
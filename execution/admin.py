@@ -2,12 +2,18 @@
 generated by Claude.ai
 """
 from django.contrib import admin
+
+from admin_utils.admin import LargeTableAdminMixin
+from search.admin import FullTextSearchMixin
 from .models import Job
 
 
 @admin.register(Job)
-class JobAdmin(admin.ModelAdmin):
+class JobAdmin(FullTextSearchMixin, LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('job_id', 'job_name', 'state', 'job_type', 'starting_date', 'end_date', 'completion_time')
     list_filter = ('state', 'job_type')
-    search_fields = ('job_id', 'job_name')
+    search_documents = (('job', 'pk'),)
+    search_fields = ('^job_id', '^job_name')
+    # Newest first, as in the changelist, also for the autocomplete
+    ordering = ('-pk',)
     date_hierarchy = 'starting_date'
\ No newline at end of file
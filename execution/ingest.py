@@ -0,0 +1,186 @@
+"""execution.ingest.py
+
+This module imports batches of Jobs from CSV or NDJSON feeds.
+
+The input is read line by line and split into batches, so a feed of
+any size is imported in bounded memory. Each batch is validated
+column-wise against the model choices and written with a single
+`bulk_create(update_conflicts=True)` keyed by `job_id`, which makes
+repeated imports of the same feed idempotent.
+
+`bulk_create` does not send the model signals, so every batch sends
+`jobs_pre_upsert` and `jobs_post_upsert` instead.
+"""
+import csv
+import json
+import time
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from execution.models import Job
+from execution.signals import jobs_post_upsert, jobs_pre_upsert
+
+
+INGEST_FORMATS = ('csv', 'ndjson')
+
+BATCH_SIZE = 2000
+
+# Number of invalid rows reported individually
+MAX_ERRORS = 1000
+
+JOB_FIELDS = ['job_id', 'job_name', 'state', 'job_type', 'starting_date', 'end_date', 'completion_time']
+UPDATE_FIELDS = [field for field in JOB_FIELDS if field != 'job_id']
+
+VALID_STATES = {value for value, label in Job.STATE_CHOICES}
+VALID_JOB_TYPES = {value for value, label in Job.JOB_TYPE_CHOICES}
+JOB_ID_LENGTH = Job._meta.get_field('job_id').max_length
+
+
+def read_csv(stream):
+    """Yield (row dict, error) pairs of a CSV feed with a header line."""
+    for row in csv.DictReader(stream):
+        yield row, None
+
+
+def read_ndjson(stream):
+    """Yield (row dict, error) pairs of a feed with one JSON object per line."""
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield None, f"Invalid JSON: {error}"
+            continue
+        if not isinstance(row, dict):
+            yield None, "Expected a JSON object"
+            continue
+        yield row, None
+
+
+READERS = {
+    'csv': read_csv,
+    'ndjson': read_ndjson,
+}
+
+
+def _parse_datetime(value):
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _parse_float(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def validate_batch(rows):
+    """Split a batch of (line, row dict) pairs into Job objects and (line, error) pairs.
+
+    The choice fields are checked once per batch on the set of
+    distinct values, so rows are only inspected one by one for the
+    invalid values and for parsing. Values of the wrong JSON type are
+    invalid. A `job_id` repeated within the batch keeps its last row.
+    """
+    errors = []
+    # Only strings can be valid, other values, e.g. lists, need not even be hashable
+    invalid_states = {row.get('state') for line, row in rows if isinstance(row.get('state'), str)} - VALID_STATES
+    invalid_types = {row.get('job_type') for line, row in rows
+                     if isinstance(row.get('job_type'), str)} - VALID_JOB_TYPES
+
+    jobs = {}
+    for line, row in rows:
+        job_id = row.get('job_id')
+        job_name, state, job_type = row.get('job_name'), row.get('state'), row.get('job_type')
+        starting_date = _parse_datetime(row.get('starting_date'))
+        end_date = _parse_datetime(row.get('end_date'))
+        completion_time = _parse_float(row.get('completion_time'))
+        if not job_id or not isinstance(job_id, str) or len(job_id) > JOB_ID_LENGTH:
+            errors.append((line, f"Invalid job_id {job_id!r}"))
+        elif not job_name:
+            errors.append((line, "Missing job_name"))
+        elif not isinstance(job_name, str):
+            errors.append((line, f"Invalid job_name {job_name!r}"))
+        elif not isinstance(state, str) or state in invalid_states:
+            errors.append((line, f"Invalid state {state!r}"))
+        elif not isinstance(job_type, str) or job_type in invalid_types:
+            errors.append((line, f"Invalid job_type {job_type!r}"))
+        elif starting_date is None or end_date is None:
+            errors.append((line, "Invalid starting_date or end_date"))
+        elif completion_time is None:
+            errors.append((line, f"Invalid completion_time {row.get('completion_time')!r}"))
+        else:
+            jobs[job_id] = Job(job_id=job_id, job_name=job_name, state=state,
+                               job_type=job_type, starting_date=starting_date, end_date=end_date,
+                               completion_time=completion_time)
+    return list(jobs.values()), errors
+
+
+def upsert_jobs(jobs):
+    """Insert or update `jobs` by `job_id` and return the number of newly created jobs."""
+    job_ids = [job.job_id for job in jobs]
+    with transaction.atomic():
+        existing = Job.objects.filter(job_id__in=job_ids).count()
+        jobs_pre_upsert.send(sender=Job, job_ids=job_ids)
+        Job.objects.bulk_create(jobs, update_conflicts=True, unique_fields=['job_id'],
+                                update_fields=UPDATE_FIELDS)
+        jobs_post_upsert.send(sender=Job, job_ids=job_ids)
+    return len(jobs) - existing
+
+
+def ingest_jobs(stream, ingest_format, batch_size=BATCH_SIZE, progress=None):
+    """Import the jobs of the text stream `stream` in batches of `batch_size` rows.
+
+    Invalid rows are skipped and counted in `invalid`, the first
+    `MAX_ERRORS` of them are listed in `errors` with their row number
+    (the data rows are counted from 1). `progress` is called with a
+    dict of the counts and the throughput of every batch, including
+    the time spent reading the batch.
+    """
+    if ingest_format not in READERS:
+        raise ValueError(f"Unknown format '{ingest_format}', use one of: {', '.join(READERS)}.")
+
+    totals = {'rows': 0, 'created': 0, 'updated': 0, 'invalid': 0, 'errors': [], 'seconds': 0.0}
+    rows = ((line, row, error) for line, (row, error) in enumerate(READERS[ingest_format](stream), start=1))
+    batch_number = 0
+    started = time.perf_counter()
+    while batch := list(islice(rows, batch_size)):
+        batch_number += 1
+        errors = [(line, error) for line, row, error in batch if error]
+        jobs, invalid = validate_batch([(line, row) for line, row, error in batch if not error])
+        errors += invalid
+        created = upsert_jobs(jobs) if jobs else 0
+        finished = time.perf_counter()
+        seconds, started = finished - started, finished
+
+        totals['rows'] += len(batch)
+        totals['created'] += created
+        totals['updated'] += len(jobs) - created
+        totals['invalid'] += len(errors)
+        totals['errors'] += errors[:MAX_ERRORS - len(totals['errors'])]
+        totals['seconds'] += seconds
+        if progress is not None:
+            progress({
+                'batch': batch_number,
+                'rows': len(batch),
+                'created': created,
+                'updated': len(jobs) - created,
+                'errors': len(errors),
+                'seconds': seconds,
+                'rows_per_second': len(batch) / seconds if seconds else 0.0,
+            })
+    return totals
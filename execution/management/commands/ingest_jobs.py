@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from execution.ingest import BATCH_SIZE, INGEST_FORMATS, ingest_jobs
+
+
+class Command(BaseCommand):
+    help = "Insert or update jobs by job_id from a CSV or NDJSON feed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, '-' for stdin.")
+        parser.add_argument('--format', dest='ingest_format', choices=INGEST_FORMATS,
+                            help="Feed format, default: from the file extension.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        ingest_format = options['ingest_format'] or path.rpartition('.')[2].lower()
+        if ingest_format not in INGEST_FORMATS:
+            raise CommandError(f"Cannot tell the format of '{path}', use --format.")
+
+        def progress(batch):
+            self.stdout.write(
+                f"Batch {batch['batch']}: {batch['rows']} rows, {batch['created']} created, "
+                f"{batch['updated']} updated, {batch['errors']} invalid in {batch['seconds']:.2f}s "
+                f"({batch['rows_per_second']:.0f} rows/s)"
+            )
+
+        if path == '-':
+            totals = ingest_jobs(sys.stdin, ingest_format, options['batch_size'], progress)
+        else:
+            with open(path, newline='', encoding='utf-8') as stream:
+                totals = ingest_jobs(stream, ingest_format, options['batch_size'], progress)
+
+        for line, error in totals['errors']:
+            self.stderr.write(f"Row {line}: {error}")
+        rate = totals['rows'] / totals['seconds'] if totals['seconds'] else 0.0
+        summary = (f"{totals['rows']} rows in {totals['seconds']:.2f}s ({rate:.0f} rows/s): "
+                   f"{totals['created']} created, {totals['updated']} updated, {totals['invalid']} invalid.")
+        if totals['invalid']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
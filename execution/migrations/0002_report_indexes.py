@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execution', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['starting_date', 'end_date', 'job_type', 'state', 'completion_time'], name='job_range_covering_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['state', 'starting_date'], name='job_state_started_idx'),
+        ),
+    ]
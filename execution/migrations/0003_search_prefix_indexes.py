@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:20
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execution', '0002_report_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(django.db.models.functions.comparison.Collate('job_id', 'NOCASE'), name='job_id_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(django.db.models.functions.comparison.Collate('job_name', 'NOCASE'), name='job_name_prefix_idx'),
+        ),
+    ]
@@ -4,6 +4,7 @@ This script defines the Job model which is used to track
 the execution progress of customer orders.
 """
 from django.db import models
+from django.db.models.functions import Collate
 
 
 class Job(models.Model):
@@ -30,3 +31,15 @@ class Job(models.Model):
 
     def __str__(self):
         return self.job_name
+
+    class Meta:
+        indexes = [
+            # Covers the job statistics of a reporting range
+            models.Index(fields=['starting_date', 'end_date', 'job_type', 'state', 'completion_time'],
+                         name='job_range_covering_idx'),
+            # Open jobs by date, e.g. the admin state filter with the date hierarchy
+            models.Index(fields=['state', 'starting_date'], name='job_state_started_idx'),
+            # Prefix search of the admin autocomplete, SQLite needs the NOCASE collation for LIKE
+            models.Index(Collate('job_id', 'NOCASE'), name='job_id_prefix_idx'),
+            models.Index(Collate('job_name', 'NOCASE'), name='job_name_prefix_idx'),
+        ]
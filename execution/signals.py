@@ -0,0 +1,11 @@
+"""execution.signals.py
+
+Signals sent around the bulk upserts of `execution.ingest`, which
+bypass the model signals. Both are sent with `job_ids`, the ids of
+the jobs of the batch, inside the transaction of the batch.
+"""
+from django.dispatch import Signal
+
+
+jobs_pre_upsert = Signal()
+jobs_post_upsert = Signal()
@@ -0,0 +1,33 @@
+import datetime
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from execution.models import Job
+
+
+class JobChangelistQueryCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser("admin"))
+
+    def create_jobs(self, start, count):
+        starting_date = datetime.datetime(2024, 1, 10, tzinfo=datetime.timezone.utc)
+        Job.objects.bulk_create([
+            Job(job_id=f"J{index}", job_name=f"Job {index}", state="completed", job_type="regular",
+                starting_date=starting_date, end_date=starting_date, completion_time=1)
+            for index in range(start, start + count)
+        ])
+
+    def test_query_count_does_not_depend_on_rows(self):
+        self.create_jobs(0, 5)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse('admin:execution_job_changelist'))
+        self.create_jobs(5, 115)
+        # Without the cached count and date buckets
+        cache.clear()
+        with self.assertNumQueries(len(few)):
+            response = self.client.get(reverse('admin:execution_job_changelist'))
+        self.assertContains(response, "Job 119")
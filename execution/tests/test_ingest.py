@@ -0,0 +1,104 @@
+import io
+import json
+import tempfile
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.urls import reverse
+from execution.ingest import ingest_jobs
+from execution.models import Job
+from stat_analysis.models import JobRollup
+from stat_analysis.rollups import rebuild_rollups, verify_rollups
+from stat_analysis.stat_utils import get_quarter_index
+
+
+CSV_FEED = """job_id,job_name,state,job_type,starting_date,end_date,completion_time
+J1,Job 1,active,regular,2024-01-10T08:00:00Z,2024-01-12T08:00:00Z,2
+J2,Job 2,completed,wafer_run,2024-02-01T08:00:00Z,2024-02-06T08:00:00Z,5
+J3,Job 3,finished,regular,2024-02-01T08:00:00Z,2024-02-06T08:00:00Z,5
+J4,Job 4,completed,regular,yesterday,2024-02-06T08:00:00Z,5
+"""
+
+
+def ndjson_feed(*jobs):
+    return ''.join(json.dumps(job) + '\n' for job in jobs)
+
+
+def job_row(job_id, state='completed', completion_time=3):
+    return {'job_id': job_id, 'job_name': f"Job {job_id}", 'state': state, 'job_type': 'regular',
+            'starting_date': '2024-03-01T00:00:00+00:00', 'end_date': '2024-03-04T00:00:00+00:00',
+            'completion_time': completion_time}
+
+
+class IngestJobsTest(TestCase):
+    def test_csv_rows_are_validated(self):
+        totals = ingest_jobs(io.StringIO(CSV_FEED), 'csv')
+        self.assertEqual((totals['rows'], totals['created'], totals['invalid']), (4, 2, 2))
+        self.assertEqual([line for line, error in totals['errors']], [3, 4])
+        self.assertIn("'finished'", totals['errors'][0][1])
+        self.assertEqual(sorted(Job.objects.values_list('job_id', flat=True)), ['J1', 'J2'])
+
+    def test_rerun_is_idempotent(self):
+        feed = ndjson_feed(job_row('J1'), job_row('J2'))
+        ingest_jobs(io.StringIO(feed), 'ndjson')
+        totals = ingest_jobs(io.StringIO(feed), 'ndjson')
+        self.assertEqual((totals['created'], totals['updated']), (0, 2))
+        self.assertEqual(Job.objects.count(), 2)
+
+    def test_upsert_updates_by_job_id(self):
+        ingest_jobs(io.StringIO(ndjson_feed(job_row('J1', state='active'))), 'ndjson')
+        ingest_jobs(io.StringIO(ndjson_feed(job_row('J1'), job_row('J1', completion_time=7))), 'ndjson')
+        job = Job.objects.get(job_id='J1')
+        self.assertEqual((job.state, job.completion_time), ('completed', 7))
+
+    def test_values_of_wrong_type_are_invalid(self):
+        rows = [dict(job_row('J1'), state=['completed']), dict(job_row('J2'), job_type={'regular': 1}),
+                dict(job_row('J3'), job_name=7), job_row('J4', completion_time=True), job_row('J5')]
+        totals = ingest_jobs(io.StringIO(ndjson_feed(*rows)), 'ndjson')
+        self.assertEqual((totals['created'], totals['invalid']), (1, 4))
+        self.assertEqual([line for line, error in totals['errors']], [1, 2, 3, 4])
+        self.assertEqual(list(Job.objects.values_list('job_id', flat=True)), ['J5'])
+
+    def test_batches_report_throughput(self):
+        batches = []
+        feed = ndjson_feed(*(job_row(f"J{index}") for index in range(5))) + 'not json\n'
+        totals = ingest_jobs(io.StringIO(feed), 'ndjson', batch_size=2, progress=batches.append)
+        self.assertEqual([batch['rows'] for batch in batches], [2, 2, 2])
+        self.assertEqual(batches[-1]['errors'], 1)
+        self.assertTrue(all('rows_per_second' in batch for batch in batches))
+        self.assertEqual(totals['errors'][0][0], 6)
+
+    def test_rollups_follow_upserts(self):
+        rebuild_rollups()
+        ingest_jobs(io.StringIO(ndjson_feed(job_row('J1', state='active'))), 'ndjson')
+        ingest_jobs(io.StringIO(ndjson_feed(job_row('J1'), job_row('J2'))), 'ndjson')
+
+        quarter = get_quarter_index('Q1', 2024)
+        self.assertEqual(verify_rollups([quarter]), [])
+        self.assertEqual(JobRollup.objects.get(state='completed').job_count, 2)
+        self.assertFalse(JobRollup.objects.filter(state='active', job_count__gt=0).exists())
+
+    def test_command(self):
+        stdout = io.StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as feed:
+            feed.write(ndjson_feed(job_row('J1')))
+            feed.flush()
+            call_command('ingest_jobs', feed.name, stdout=stdout)
+        self.assertIn('1 created', stdout.getvalue())
+        self.assertTrue(Job.objects.filter(job_id='J1').exists())
+
+        with self.assertRaises(CommandError):
+            call_command('ingest_jobs', 'jobs.xml', stdout=io.StringIO())
+
+    def test_endpoint(self):
+        self.client.force_login(User.objects.create_superuser("admin"))
+        response = self.client.post(reverse('execution:ingest'), CSV_FEED, content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(response.json()['errors'][0]['row'], 3)
+
+        response = self.client.post(reverse('execution:ingest'), ndjson_feed(job_row('J9')),
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 1)
@@ -0,0 +1,10 @@
+from django.urls import path
+
+from execution import views
+
+
+app_name = 'execution'
+
+urlpatterns = [
+    path('jobs/ingest', views.ingest, name='ingest'),
+]
@@ -0,0 +1,39 @@
+"""execution.views.py
+
+Endpoint for bulk Job imports, see `execution.ingest`.
+"""
+import codecs
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+
+from execution.ingest import ingest_jobs
+
+
+CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+}
+
+
+@require_POST
+@staff_member_required
+def ingest(request):
+    """Import the CSV or NDJSON request body, chosen by its Content-Type.
+
+    The body is decoded line by line and never loaded as a whole.
+    """
+    if not request.user.has_perms(['execution.add_job', 'execution.change_job']):
+        raise PermissionDenied
+    ingest_format = CONTENT_TYPES.get(request.content_type)
+    if ingest_format is None:
+        return JsonResponse({'error': f"Unsupported content type, use one of: {', '.join(CONTENT_TYPES)}."},
+                            status=415)
+
+    batches = []
+    stream = codecs.iterdecode(request, request.encoding or 'utf-8')
+    totals = ingest_jobs(stream, ingest_format, progress=batches.append)
+    totals['errors'] = [{'row': line, 'error': error} for line, error in totals['errors']]
+    return JsonResponse({**totals, 'batches': batches}, status=400 if totals['invalid'] else 200)
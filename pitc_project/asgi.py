@@ -3,6 +3,9 @@ ASGI config for pitc_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Served by an ASGI server, the async views of the report API
+(``stat_analysis.api``) do not hold a thread while waiting on the database.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from pitc_project.sqlite import sqlite_options
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -37,9 +39,11 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'admin_utils',
     'execution',
     'stat_analysis',
     'core',
+    'search',
 ]
 
 MIDDLEWARE = [
@@ -50,6 +54,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'stat_analysis.profiling.SlowRequestMiddleware',
 ]
 
 ROOT_URLCONF = 'pitc_project.urls'
@@ -75,13 +80,34 @@ WSGI_APPLICATION = 'pitc_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# PRAGMAs and transaction mode of the SQLite connections, see pitc_project.sqlite
+
+SQLITE_PROFILE = 'production'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'OPTIONS': sqlite_options(SQLITE_PROFILE),
+        # Keep the connections, and with them their page caches, between requests
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
+    # Stand-in for a read replica of the default database, copied from it with `manage.py sync_replica`
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica.sqlite3',
+        'OPTIONS': sqlite_options(SQLITE_PROFILE),
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
 }
 
+DATABASE_ROUTERS = ['stat_analysis.routers.AnalyticsRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -119,6 +145,79 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Reports
+# Compute report statistics in the report worker (`manage.py run_report_worker`)
+# instead of during Report.save
+
+REPORTS_COMPUTE_IN_BACKGROUND = True
+
+# Merge report statistics from the per-quarter rollups once they are built
+# (`manage.py rebuild_rollups`) instead of scanning orders, jobs and customers
+
+REPORTS_USE_ROLLUPS = True
+
+# Processes scanning the quarters of a multi-quarter report range in parallel while the
+# rollups are not built, see stat_analysis.fanout. 1 scans the whole range at once. From the
+# threads of the report worker and web server the processes are spawned once per process,
+# which takes seconds, and then kept. The quarters take more queries than the single scan,
+# so only with several CPUs and long ranges is the fanout faster; compare with
+# `manage.py benchmark_fanout` before raising it. With a single CPU the range is scanned at once.
+
+REPORTS_FANOUT_WORKERS = 1
+
+# Compute report statistics with NumPy from the column store of the orders, jobs and customers
+# while the rollups are not used, once it is built (`manage.py refresh_columns`).
+# Requires NumPy, see stat_analysis.columnar.
+
+REPORTS_USE_COLUMNAR = True
+REPORTS_COLUMNAR_DIR = BASE_DIR / 'columns'
+
+# Compute and store the values of the registered report metrics (stat_analysis.metrics) with
+# every report. They are evaluated from the raw rows, one pass per source and quarter.
+
+REPORTS_COMPUTE_METRICS = False
+
+# Cache of computed report statistics, shared by the web and worker processes.
+# Entries are keyed on the version of the data they were computed from.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'reports': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'reports',
+        'TIMEOUT': 7 * 24 * 60 * 60,
+    },
+}
+
+REPORTS_CACHE = 'reports'
+
+# Seconds after which the lock of a computation is taken over from a holder that did not
+# release it, see stat_analysis.singleflight
+
+REPORTS_LOCK_TIMEOUT = 600
+
+# Database alias the report statistics and exports are read from, see stat_analysis.routers.
+# None reads them from the default database.
+
+REPORTS_READ_DATABASE = None
+
+# Log admin requests slower than this many seconds with their query breakdown
+
+SLOW_REQUEST_THRESHOLD = 1.0
+SLOW_REQUEST_PATH_PREFIXES = ['/admin/']
+
+# Seconds the changelist counts and date hierarchy buckets of the large admin tables are cached
+
+ADMIN_COUNT_CACHE_TIMEOUT = 60
+ADMIN_DATE_BUCKETS_TIMEOUT = 600
+
+# Full-text index behind the admin search and the search API, see search.backends
+
+SEARCH_BACKEND = 'search.backends.FTS5Backend'
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
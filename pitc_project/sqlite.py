@@ -0,0 +1,59 @@
+"""pitc_project.sqlite.py
+
+Connection settings of the SQLite databases by profile.
+
+A profile sets the PRAGMAs run on every new connection and the mode
+of the transactions Django opens:
+
+- `journal_mode` WAL lets readers continue while a writer commits,
+  with the default rollback journal a report scan blocks all writers
+  and the other way round.
+- `busy_timeout` is how many milliseconds a connection waits for a
+  lock before failing with "database is locked".
+- `synchronous` NORMAL syncs the WAL at checkpoints instead of every
+  commit, which is durable against application crashes and only
+  loses the last commits on a power loss.
+- `cache_size` (negative: KiB) and `mmap_size` (bytes) keep more of
+  the database in memory per connection.
+- IMMEDIATE transactions take the write lock when they begin. A
+  DEFERRED transaction upgrading from a read to a write fails at once
+  when another writer holds the lock, without waiting `busy_timeout`.
+
+The profiles are benchmarked with `manage.py benchmark_concurrency`.
+"""
+
+
+PROFILES = {
+    # SQLite defaults
+    'stock': {
+        'pragmas': {'journal_mode': 'DELETE', 'synchronous': 'FULL'},
+        'transaction_mode': None,
+    },
+    'wal': {
+        'pragmas': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 5000},
+        'transaction_mode': 'IMMEDIATE',
+    },
+    'production': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 5000,
+            'cache_size': -64 * 1024,
+            'mmap_size': 256 * 1024 * 1024,
+            'temp_store': 'MEMORY',
+        },
+        'transaction_mode': 'IMMEDIATE',
+    },
+}
+
+
+def sqlite_options(profile):
+    """`OPTIONS` of a SQLite entry of `DATABASES` for the profile named `profile`."""
+    try:
+        config = PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"Unknown SQLite profile '{profile}', use one of: {', '.join(PROFILES)}.") from None
+    return {
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in config['pragmas'].items()),
+        'transaction_mode': config['transaction_mode'],
+    }
@@ -0,0 +1,34 @@
+"""search.admin.py
+
+ModelAdmin mixin answering the admin search box and autocomplete from
+the full-text index instead of the LIKE '%term%' lookups of
+`search_fields`, see `search.backends`.
+"""
+from django.db.models import Q
+
+from search.backends import get_backend
+from search.documents import DOCUMENTS
+
+
+class FullTextSearchMixin:
+    """Search the objects matching the documents of `search_documents`.
+
+    `search_documents` holds (document name, field) pairs: the rows
+    whose `field` is the primary key of a matching document object are
+    found, e.g. ('customer', 'customer') searches orders by the names
+    of their customers. `search_fields` is still needed for the search
+    box and is used for search terms without words.
+    """
+    search_documents = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        backend = get_backend()
+        condition = Q()
+        for name, field in self.search_documents:
+            matches = backend.matches(DOCUMENTS[name], search_term)
+            if matches is None:
+                return super().get_search_results(request, queryset, search_term)
+            condition |= Q(**{f'{field}__in': matches})
+        if not condition:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(condition), False
@@ -0,0 +1,135 @@
+"""search.backends.py
+
+Full-text index of the documents of `search.documents`.
+
+A backend keeps one index per document and answers searches with the
+primary keys of the matching objects, either as a ranked list or as a
+subquery to filter a queryset with. `SEARCH_BACKEND` names the backend
+class; FTS5Backend keeps the index in SQLite FTS5 tables in the same
+database as the data, created by the migrations of this app.
+
+Search text is split into words and each word matches the words of a
+document starting with it, e.g. "ann bau" finds "Anna Bauer". Words
+of a single character only match whole words, their prefix matches
+would be too many to answer quickly. Results are not ranked by
+relevance, computing the rank reads all matches of the common words;
+the newest objects come first instead.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+
+# Shortest word matched as a prefix, the FTS5 tables keep prefix indexes of 2 and 3 characters
+MIN_PREFIX_LENGTH = 2
+
+# Ids per statement, below the SQLite limit of bound parameters
+UPDATE_BATCH_SIZE = 500
+
+WORD_RE = re.compile(r'\w+')
+
+
+class SearchBackend:
+    """Interface of the full-text index backends."""
+
+    def matches(self, document, text):
+        """Expression of the primary keys of the `document` objects matching `text`, usable with `__in`.
+
+        None if `text` contains no words.
+        """
+        raise NotImplementedError
+
+    def search(self, document, text, limit):
+        """Primary keys of the `limit` newest `document` objects matching `text`."""
+        raise NotImplementedError
+
+    def update(self, document, ids):
+        """(Re)index the `document` objects with the primary keys `ids`, removing the ones that are gone."""
+        raise NotImplementedError
+
+    def delete(self, document, ids):
+        """Remove the `document` objects with the primary keys `ids` from the index."""
+        raise NotImplementedError
+
+    def rebuild(self, document):
+        """Index all `document` objects from scratch, returns their number."""
+        raise NotImplementedError
+
+
+def _batches(ids, batch_size):
+    ids = list(ids)
+    for start in range(0, len(ids), batch_size):
+        yield ids[start:start + batch_size]
+
+
+class FTS5Backend(SearchBackend):
+    """Index in one FTS5 table per document, with the primary keys of the objects as rowids."""
+
+    def match_query(self, text):
+        words = WORD_RE.findall(text)
+        if not words:
+            return None
+        # Every word quoted, which leaves no FTS5 query syntax in the text
+        return ' '.join(f'"{word}"*' if len(word) >= MIN_PREFIX_LENGTH else f'"{word}"' for word in words)
+
+    def matches(self, document, text):
+        query = self.match_query(text)
+        if query is None:
+            return None
+        return RawSQL(f'SELECT rowid FROM {document.table} WHERE {document.table} MATCH %s', [query])
+
+    def search(self, document, text, limit):
+        query = self.match_query(text)
+        if query is None:
+            return []
+        connection = connections[router.db_for_read(document.model)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {document.table} WHERE {document.table} MATCH %s ORDER BY rowid DESC LIMIT %s',
+                [query, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def _insert(self, cursor, document, rows):
+        select, params = rows.query.sql_with_params()
+        cursor.execute(f'INSERT INTO {document.table} (rowid, {", ".join(document.columns)}) {select}', params)
+
+    def update(self, document, ids):
+        connection = connections[router.db_for_write(document.model)]
+        with connection.cursor() as cursor:
+            for batch in _batches(ids, UPDATE_BATCH_SIZE):
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(f'DELETE FROM {document.table} WHERE rowid IN ({placeholders})', batch)
+                self._insert(cursor, document, document.rows().filter(pk__in=batch))
+
+    def delete(self, document, ids):
+        connection = connections[router.db_for_write(document.model)]
+        with connection.cursor() as cursor:
+            for batch in _batches(ids, UPDATE_BATCH_SIZE):
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(f'DELETE FROM {document.table} WHERE rowid IN ({placeholders})', batch)
+
+    def rebuild(self, document):
+        connection = connections[router.db_for_write(document.model)]
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {document.table}')
+            self._insert(cursor, document, document.rows())
+            # Merge the index segments written by the insert
+            cursor.execute(f"INSERT INTO {document.table} ({document.table}) VALUES ('optimize')")
+            cursor.execute(f'SELECT count(*) FROM {document.table}')
+            return cursor.fetchone()[0]
+
+
+_backend = None
+
+
+def get_backend():
+    """The backend of the `SEARCH_BACKEND` setting."""
+    global _backend
+    path = getattr(settings, 'SEARCH_BACKEND', 'search.backends.FTS5Backend')
+    if _backend is None or _backend[0] != path:
+        _backend = (path, import_string(path)())
+    return _backend[1]
@@ -0,0 +1,71 @@
+"""search.documents.py
+
+The searchable documents: for each kind of object the fields whose
+text goes into the full-text index. Field paths may follow relations,
+e.g. the names of the user of an account manager; saving the related
+object then updates the documents referring to it.
+"""
+from django.apps import apps
+from django.utils.functional import cached_property
+
+
+class Document:
+    """Searchable text of the rows of `model_label`, one index column per field path.
+
+    `related` maps the labels of related models to the lookup from
+    `model_label` to them, the documents are updated when they change.
+    """
+
+    def __init__(self, name, model_label, fields, related=None, select_related=()):
+        self.name = name
+        self.model_label = model_label
+        self.fields = fields
+        self.related = related or {}
+        self.select_related = select_related
+
+    def __repr__(self):
+        return f'<Document {self.name}>'
+
+    @cached_property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    @property
+    def table(self):
+        return f'search_{self.name}'
+
+    @property
+    def columns(self):
+        return [path.split('__')[-1] for path in self.fields]
+
+    @property
+    def view_permission(self):
+        return f'{self.model._meta.app_label}.view_{self.model._meta.model_name}'
+
+    def get_queryset(self):
+        """The indexed objects, with the relations needed to display them."""
+        return self.model._default_manager.select_related(*self.select_related)
+
+    def rows(self):
+        """(pk, *field values) of the indexed objects."""
+        return self.model._default_manager.order_by().values_list('pk', *self.fields)
+
+
+DOCUMENTS = {document.name: document for document in [
+    Document('customer', 'core.Customer', ['name']),
+    Document('manager', 'core.AccountManager', ['user__username', 'user__first_name', 'user__last_name'],
+             related={'auth.User': 'user'}, select_related=['user']),
+    Document('provider', 'core.ServiceProvider', ['name']),
+    Document('service', 'core.Service', ['name', 'description'], select_related=['provider']),
+    Document('job', 'execution.Job', ['job_id', 'job_name']),
+]}
+
+
+def documents_for_model(model):
+    """The documents of `model` and the documents depending on it, as (document, lookup) pairs."""
+    label = model._meta.label
+    for document in DOCUMENTS.values():
+        if document.model_label == label:
+            yield document, 'pk'
+        elif label in document.related:
+            yield document, document.related[label]
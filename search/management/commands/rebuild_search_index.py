@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from search.backends import get_backend
+from search.documents import DOCUMENTS
+
+
+class Command(BaseCommand):
+    help = "Regenerate the full-text index of customers, account managers, providers, services and jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('documents', nargs='*', metavar='document',
+                            help=f"Documents to rebuild, of: {', '.join(DOCUMENTS)}. All by default.")
+
+    def handle(self, *args, **options):
+        names = options['documents'] or list(DOCUMENTS)
+        unknown = [name for name in names if name not in DOCUMENTS]
+        if unknown:
+            raise CommandError(f"Unknown document(s) {', '.join(unknown)}, use one of: {', '.join(DOCUMENTS)}.")
+
+        backend = get_backend()
+        for name in names:
+            started = time.perf_counter()
+            count = backend.rebuild(DOCUMENTS[name])
+            self.stdout.write(f"Indexed {count} {name} document(s) in {time.perf_counter() - started:.1f}s")
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
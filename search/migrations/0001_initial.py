@@ -0,0 +1,43 @@
+from django.db import migrations
+
+
+# Table, columns and the SELECT of the indexed rows of each document
+INDEXES = [
+    ('search_customer', ['name'],
+     'SELECT id, name FROM core_customer'),
+    ('search_manager', ['username', 'first_name', 'last_name'],
+     'SELECT m.id, u.username, u.first_name, u.last_name '
+     'FROM core_accountmanager m JOIN auth_user u ON u.id = m.user_id'),
+    ('search_provider', ['name'],
+     'SELECT id, name FROM core_serviceprovider'),
+    ('search_service', ['name', 'description'],
+     'SELECT id, name, description FROM core_service'),
+    ('search_job', ['job_id', 'job_name'],
+     'SELECT id, job_id, job_name FROM execution_job'),
+]
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0004_search_prefix_indexes'),
+        ('execution', '0003_search_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [
+                # Prefix indexes of 2 and 3 characters for the searches while typing
+                f"CREATE VIRTUAL TABLE {table} USING fts5({', '.join(columns)}, "
+                f"prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+                for table, columns, _ in INDEXES
+            ] + [
+                f"INSERT INTO {table} (rowid, {', '.join(columns)}) {select}"
+                for table, columns, select in INDEXES
+            ],
+            [f'DROP TABLE {table}' for table, _, _ in INDEXES],
+        ),
+    ]
@@ -0,0 +1,49 @@
+"""search.signals.py
+
+Signal receivers keeping the full-text index up to date.
+
+Saving or deleting an object reindexes its document and the documents
+referring to it, inside the transaction of the write. The bulk job
+upserts of `execution.ingest` send `jobs_post_upsert`; other writes
+bypassing the model signals (`bulk_create`, `QuerySet.update`) need
+`manage.py rebuild_search_index`.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from execution.models import Job
+from execution.signals import jobs_post_upsert
+from search.backends import get_backend
+from search.documents import DOCUMENTS, documents_for_model
+
+
+def update_documents(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    for document, lookup in documents_for_model(sender):
+        if lookup == 'pk':
+            get_backend().update(document, [instance.pk])
+        else:
+            ids = document.model._default_manager.filter(**{lookup: instance.pk}).values_list('pk', flat=True)
+            get_backend().update(document, ids)
+
+
+def delete_documents(sender, instance, **kwargs):
+    for document, lookup in documents_for_model(sender):
+        if lookup == 'pk':
+            get_backend().delete(document, [instance.pk])
+        else:
+            ids = document.model._default_manager.filter(**{lookup: instance.pk}).values_list('pk', flat=True)
+            get_backend().update(document, ids)
+
+
+for label in sorted({document.model_label for document in DOCUMENTS.values()}
+                    | {label for document in DOCUMENTS.values() for label in document.related}):
+    post_save.connect(update_documents, sender=label, dispatch_uid=f'search_update_{label}')
+    post_delete.connect(delete_documents, sender=label, dispatch_uid=f'search_delete_{label}')
+
+
+@receiver(jobs_post_upsert)
+def update_jobs_after_upsert(sender, job_ids, **kwargs):
+    ids = Job.objects.filter(job_id__in=job_ids).values_list('pk', flat=True)
+    get_backend().update(DOCUMENTS['job'], ids)
@@ -0,0 +1,114 @@
+import datetime
+import io
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from core.models import AccountManager, Customer, Service, ServiceProvider
+from execution.ingest import upsert_jobs
+from execution.models import Job
+from search.backends import get_backend
+from search.documents import DOCUMENTS
+
+
+def search(name, text, limit=20):
+    return get_backend().search(DOCUMENTS[name], text, limit)
+
+
+class IndexTest(TestCase):
+    """The index follows saves, deletes and bulk upserts."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="abauer", first_name="Anna", last_name="Bauer")
+        self.manager = AccountManager.objects.create(user=self.user)
+        self.provider = ServiceProvider.objects.create(name="Fabrication Lab")
+        self.service = Service.objects.create(name="Etching", description="Deep reactive ion etching",
+                                              price=Decimal("10.00"), provider=self.provider)
+        self.customer = Customer.objects.create(name="Acme Corporation", created_by=self.manager)
+
+    def test_words_match_prefixes(self):
+        self.assertEqual(search('customer', "acm corp"), [self.customer.pk])
+        self.assertEqual(search('customer', "corporation acme"), [self.customer.pk])
+        self.assertEqual(search('customer', "cme"), [])
+        self.assertEqual(search('service', "reactive"), [self.service.pk])
+        self.assertEqual(search('provider', "fab"), [self.provider.pk])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(search('customer', 'acme OR "x'), [])
+        self.assertEqual(search('customer', "name:acme"), [])
+        self.assertEqual(search('customer', "*"), [])
+
+    def test_save_and_delete_update_index(self):
+        self.customer.name = "Globex"
+        self.customer.save()
+        self.assertEqual(search('customer', "acme"), [])
+        self.assertEqual(search('customer', "glob"), [self.customer.pk])
+        pk = self.customer.pk
+        self.customer.delete()
+        self.assertEqual(search('customer', "glob"), [])
+        self.assertFalse(Customer.objects.filter(pk=pk).exists())
+
+    def test_related_user_updates_manager(self):
+        self.assertEqual(search('manager', "anna"), [self.manager.pk])
+        self.user.first_name = "Berta"
+        self.user.save()
+        self.assertEqual(search('manager', "anna"), [])
+        self.assertEqual(search('manager', "berta bau"), [self.manager.pk])
+        self.user.delete()
+        self.assertEqual(search('manager', "berta"), [])
+
+    def test_bulk_upsert_updates_jobs(self):
+        start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        job = Job(job_id="WAFER-0042", job_name="Wafer run", state="active", job_type="wafer_run",
+                  starting_date=start, end_date=start, completion_time=0)
+        upsert_jobs([job])
+        pk = Job.objects.get(job_id="WAFER-0042").pk
+        self.assertEqual(search('job', "wafer-0042"), [pk])
+        self.assertEqual(search('job', "0042"), [pk])
+
+    def test_rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM search_customer')
+        self.assertEqual(search('customer', "acme"), [])
+        output = io.StringIO()
+        call_command('rebuild_search_index', 'customer', stdout=output)
+        self.assertIn("Indexed 1 customer document(s)", output.getvalue())
+        self.assertEqual(search('customer', "acme"), [self.customer.pk])
+
+    def test_admin_search(self):
+        self.client.force_login(User.objects.create_superuser("admin"))
+        response = self.client.get(reverse('admin:core_service_changelist'), {'q': "ion etch"})
+        self.assertContains(response, "Etching")
+        response = self.client.get(reverse('admin:core_service_changelist'), {'q': "plasma"})
+        self.assertNotContains(response, "Etching (")
+
+
+class SearchViewTest(TestCase):
+    def setUp(self):
+        user = User.objects.create(username="manager", first_name="Anna", last_name="Bauer")
+        manager = AccountManager.objects.create(user=user)
+        self.customers = [Customer.objects.create(name=f"Acme {index}", created_by=manager) for index in range(3)]
+        self.url = reverse('search:search')
+
+    def test_results_per_kind(self):
+        self.client.force_login(User.objects.create_superuser("admin"))
+        response = self.client.get(self.url, {'q': "acme", 'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(set(results), set(DOCUMENTS))
+        self.assertEqual(results['customer'], [{'id': customer.pk, 'text': customer.name}
+                                               for customer in reversed(self.customers[1:])])
+        self.assertEqual(results['job'], [])
+
+    def test_only_viewable_kinds(self):
+        staff = User.objects.create_user("staff", is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(self.url, {'q': "acme", 'kind': 'customer'})
+        self.assertEqual(response.json()['results'], {})
+
+    def test_invalid_parameters(self):
+        self.client.force_login(User.objects.create_superuser("admin"))
+        self.assertEqual(self.client.get(self.url, {'q': "acme", 'kind': 'order'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'q': "acme", 'limit': 1000}).status_code, 400)
@@ -0,0 +1,47 @@
+"""search.views.py
+
+Search API over the full-text index, see `search.backends`.
+"""
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from search.backends import get_backend
+from search.documents import DOCUMENTS
+
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+@require_GET
+@staff_member_required
+def search(request):
+    """Matches of `q` for each `kind` (all kinds by default) the user may view.
+
+    Returns {"query": q, "results": {kind: [{"id": pk, "text": str(object)}, ...]}}
+    with at most `limit` results per kind, newest first.
+    """
+    text = request.GET.get('q', '')
+    kinds = request.GET.getlist('kind') or list(DOCUMENTS)
+    unknown = [kind for kind in kinds if kind not in DOCUMENTS]
+    if unknown:
+        return JsonResponse({'error': f"Unknown kind {', '.join(unknown)}, use one of: {', '.join(DOCUMENTS)}."},
+                            status=400)
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_LIMIT:
+        return JsonResponse({'error': f"The limit must be a number from 1 to {MAX_LIMIT}."}, status=400)
+
+    backend = get_backend()
+    results = {}
+    for kind in kinds:
+        document = DOCUMENTS[kind]
+        if not request.user.has_perm(document.view_permission):
+            continue
+        ids = backend.search(document, text, limit)
+        objects = document.get_queryset().in_bulk(ids)
+        results[kind] = [{'id': pk, 'text': str(objects[pk])} for pk in ids if pk in objects]
+    return JsonResponse({'query': text, 'results': results})
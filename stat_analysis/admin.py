@@ -2,7 +2,9 @@
 generated by Claude.ai
 """
 from django.contrib import admin
-from .models import Report, JobReportResult, OrderReportResult, UserReportResult
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
+from .models import Report, JobReportResult, MetricValue, OrderReportResult, UserReportResult
 
 
 class JobReportResultInline(admin.StackedInline):
@@ -23,13 +25,27 @@ class UserReportResultInline(admin.StackedInline):
     verbose_name_plural = 'User Statistics'
 
 
+class MetricValueInline(admin.TabularInline):
+    model = MetricValue
+    can_delete = False
+    extra = 0
+    fields = ('name', 'value')
+    readonly_fields = ('name', 'value')
+    verbose_name_plural = 'Metrics'
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Report)
 class ReportAdmin(admin.ModelAdmin):
-    list_display = ('title', 'created_at', 'created_by', 'date_range', 'has_pdf')
-    list_filter = ('quarter_from', 'year_from', 'created_by')
+    list_display = ('title', 'created_at', 'created_by', 'date_range', 'has_pdf', 'computation')
+    list_filter = ('status', 'quarter_from', 'year_from', 'created_by')
+    list_select_related = ('created_by',)
     search_fields = ('title',)
     date_hierarchy = 'created_at'
-    inlines = [JobReportResultInline, OrderReportResultInline, UserReportResultInline]
+    readonly_fields = ('computation', 'started_at', 'finished_at', 'error', 'profile_table', 'exports')
+    inlines = [JobReportResultInline, OrderReportResultInline, UserReportResultInline, MetricValueInline]
 
     def date_range(self, obj):
         return f"{obj.quarter_from}/{obj.year_from} - {obj.quarter_to}/{obj.year_to}"
@@ -42,11 +58,47 @@ class ReportAdmin(admin.ModelAdmin):
     has_pdf.boolean = True
     has_pdf.short_description = 'PDF Attached'
 
+    def computation(self, obj):
+        if obj.status == Report.STATUS_RUNNING:
+            return f"{obj.get_status_display()} ({obj.progress}%)"
+        return obj.get_status_display()
+
+    computation.short_description = 'Status'
+
+    def profile_table(self, obj):
+        if not obj.profile:
+            return '-'
+        rows = format_html_join(
+            '', '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>',
+            ((stage['name'], f"{stage['wall_time'] * 1000:.1f}", stage['queries'],
+              f"{stage['sql_time'] * 1000:.1f}", stage['rows'])
+             for stage in obj.profile['stages'] + [obj.profile['total']])
+        )
+        return format_html(
+            '<table><thead><tr><th>Stage</th><th>Wall time (ms)</th><th>Queries</th>'
+            '<th>SQL time (ms)</th><th>Rows</th></tr></thead><tbody>{}</tbody></table>', rows
+        )
+
+    profile_table.short_description = 'Profile'
+
+    def exports(self, obj):
+        if not obj.pk:
+            return '-'
+        return format_html_join(
+            ' | ', '<a href="{}">{} ({})</a>',
+            ((reverse('stat_analysis:export_report', args=[obj.pk, kind, export_format]), kind.title(),
+              export_format.upper())
+             for kind in ('orders', 'jobs') for export_format in ('csv', 'ndjson'))
+        )
+
+    exports.short_description = 'Raw data'
+
 
 @admin.register(JobReportResult)
 class JobReportResultAdmin(admin.ModelAdmin):
     list_display = ('report', 'total_jobs', 'num_created', 'num_active', 'num_completed')
     list_filter = ('report__quarter_from', 'report__year_from')
+    list_select_related = ('report',)
     search_fields = ('report__title',)
 
 
@@ -54,6 +106,7 @@ class JobReportResultAdmin(admin.ModelAdmin):
 class OrderReportResultAdmin(admin.ModelAdmin):
     list_display = ('report', 'total_orders', 'total_revenue', 'average_order_value')
     list_filter = ('report__quarter_from', 'report__year_from')
+    list_select_related = ('report',)
     search_fields = ('report__title',)
 
 
@@ -61,4 +114,5 @@ class OrderReportResultAdmin(admin.ModelAdmin):
 class UserReportResultAdmin(admin.ModelAdmin):
     list_display = ('report', 'total_customers', 'new_customers', 'total_account_managers', 'customers_with_orders')
     list_filter = ('report__quarter_from', 'report__year_from')
-    search_fields = ('report__title',)
\ No newline at end of file
+    list_select_related = ('report',)
+    search_fields = ('report__title',)
@@ -0,0 +1,176 @@
+"""stat_analysis.aggregation.py
+
+This module pushes the statistics of the reporting period down
+into the database.
+
+Each function takes an already filtered queryset and returns a
+plain dictionary with the computed values. The number of
+queries issued does not depend on the number of rows in the
+queryset, i.e. no per-order iteration is done in Python.
+"""
+from decimal import Decimal
+
+from django.db.models import Avg, Count, Q, Sum
+
+from core.models import Order, Customer, AccountManager
+from execution.models import Job
+from stat_analysis.sketches import QuantileSketch, bucket_expression
+
+
+def manager_display_name(first_name, last_name, username):
+    """Mirror `User.get_full_name() or User.username` on raw column values."""
+    full_name = f"{first_name} {last_name}".strip()
+    return full_name or username
+
+
+def aggregate_manager_totals(orders):
+    """Return number of orders and order value per account manager name.
+
+    Both tallies come from one grouped query over `orders`, the
+    order value is the denormalized `Order.total_value`.
+    """
+    manager_rows = (
+        orders
+        .values('account_manager', 'account_manager__user__first_name',
+                'account_manager__user__last_name', 'account_manager__user__username')
+        .annotate(num_orders=Count('pk'), revenue=Sum('total_value'))
+        .order_by()
+    )
+    managers = {}
+    for row in manager_rows:
+        manager_name = manager_display_name(row['account_manager__user__first_name'],
+                                            row['account_manager__user__last_name'],
+                                            row['account_manager__user__username'])
+        totals = managers.setdefault(manager_name, {'num_orders': 0, 'revenue': Decimal('0.00')})
+        totals['num_orders'] += row['num_orders']
+        totals['revenue'] += row['revenue'] or Decimal('0.00')
+    return managers
+
+
+def aggregate_order_stats(orders, managers=None):
+    """Aggregate revenue and distribution statistics of `orders`.
+
+    Runs three queries: order count and revenue as a sum of
+    `Order.total_value`, distinct orders per service provider over the
+    `Order.services` through table and orders and value per account
+    manager. The last one can be shared with `aggregate_user_stats`
+    via `managers`.
+    """
+    order_services = Order.services.through.objects.filter(order__in=orders.values('pk'))
+
+    totals = orders.aggregate(total_orders=Count('pk'), total_revenue=Sum('total_value'))
+    total_orders = totals['total_orders']
+    total_revenue = totals['total_revenue'] or Decimal('0.00')
+
+    if total_orders > 0:
+        average_order_value = total_revenue / total_orders
+    else:
+        average_order_value = Decimal('0.00')
+
+    # An order is counted once per provider, even with several services of that provider
+    provider_rows = (
+        order_services
+        .values('service__provider__name')
+        .annotate(num_orders=Count('order', distinct=True))
+        .order_by()
+    )
+    provider_stats = {row['service__provider__name']: row['num_orders'] for row in provider_rows}
+
+    if managers is None:
+        managers = aggregate_manager_totals(orders)
+    manager_stats = {name: totals['num_orders'] for name, totals in managers.items()}
+
+    return {
+        'total_orders': total_orders,
+        'total_revenue': total_revenue,
+        'average_order_value': average_order_value,
+        'orders_per_service_provider': provider_stats,
+        'orders_per_account_manager': manager_stats,
+    }
+
+
+def aggregate_job_stats(jobs):
+    """Aggregate count, average completion time per job type and state breakdown of `jobs`."""
+    # Count, averages by job type and status breakdown in one pass over the range index.
+    # Conditional aggregates instead of GROUP BY keep the planner on that index.
+    totals = jobs.aggregate(
+        total_jobs=Count('pk'),
+        **{f'avg_{job_type}': Avg('completion_time', filter=Q(job_type=job_type))
+           for job_type, _ in Job.JOB_TYPE_CHOICES},
+        **{f'num_{state}': Count('pk', filter=Q(state=state)) for state, _ in Job.STATE_CHOICES},
+    )
+
+    # Completion time distribution, bucketed in the database
+    bucket_rows = (
+        jobs
+        .annotate(bucket=bucket_expression('completion_time'))
+        .values_list('job_type', 'bucket')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+    sketches = {}
+    for job_type, bucket, count in bucket_rows:
+        sketches.setdefault(job_type, QuantileSketch()).merge(QuantileSketch.from_bucket_rows([(bucket, count)]))
+
+    return {
+        'total_jobs': totals['total_jobs'],
+        'avg_completion_time_regular': totals['avg_regular'],
+        'avg_completion_time_wafer_run': totals['avg_wafer_run'],
+        'num_created': totals['num_created'],
+        'num_active': totals['num_active'],
+        'num_completed': totals['num_completed'],
+        **job_distribution_stats(sketches),
+    }
+
+
+def job_distribution_stats(sketches):
+    """Quantiles and histogram of the completion time from sketches per job type."""
+    stats = {}
+    histogram = {}
+    for job_type, _ in Job.JOB_TYPE_CHOICES:
+        summary = (sketches.get(job_type) or QuantileSketch()).summary()
+        stats[f'median_completion_time_{job_type}'] = summary['median']
+        stats[f'p90_completion_time_{job_type}'] = summary['p90']
+        stats[f'p99_completion_time_{job_type}'] = summary['p99']
+        histogram[job_type] = summary['histogram']
+    stats['completion_time_histogram'] = histogram
+    return stats
+
+
+def aggregate_user_stats(orders, new_customers, total_orders=None, managers=None):
+    """Aggregate customer and account manager activity for `orders`.
+
+    `new_customers` is the queryset of customers created in the
+    reporting period. `total_orders` and `managers` may be passed in
+    when they were already computed for the order statistics.
+    """
+    total_customers = Customer.objects.count()
+    total_managers = AccountManager.objects.count()
+
+    # Customers with orders
+    customers_with_orders = orders.values('customer').distinct().count()
+
+    # Avg orders per customer
+    avg_orders = 0.0
+    if customers_with_orders > 0:
+        if total_orders is None:
+            total_orders = orders.count()
+        avg_orders = total_orders / customers_with_orders
+
+    # Top performing managers by order value
+    if managers is None:
+        managers = aggregate_manager_totals(orders)
+    manager_performance = sorted(
+        ((name, float(totals['revenue'])) for name, totals in managers.items()),
+        key=lambda item: (-item[1], item[0])
+    )
+    top_managers = dict(manager_performance[:5])
+
+    return {
+        'total_customers': total_customers,
+        'new_customers': new_customers.count(),
+        'total_account_managers': total_managers,
+        'customers_with_orders': customers_with_orders,
+        'avg_orders_per_customer': avg_orders,
+        'top_performing_managers': top_managers,
+    }
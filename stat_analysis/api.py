@@ -0,0 +1,168 @@
+"""stat_analysis.api.py
+
+Async JSON API of the Reports and their results for the dashboards.
+
+The views use the async ORM, so when served by an ASGI server (see
+`pitc_project.asgi`) a slow report fetch waits on the database without
+holding a worker thread.
+
+Every response carries an ETag and a Last-Modified header derived
+from `Report.updated_at`, which is also set by the report worker and
+the pipeline. A client revalidating an unchanged report gets a 304
+after a single indexed query, without the results being loaded.
+"""
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import PermissionDenied
+from django.db.models import Count, Max
+from django.http import Http404, JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_GET, require_POST
+
+from stat_analysis.models import MetricValue, Report
+
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+# Result relation of each kind of statistics
+RESULTS = {
+    'jobs': 'jobreportresult',
+    'orders': 'orderreportresult',
+    'users': 'userreportresult',
+}
+
+# Revalidated on every use, and never stored by shared caches as the responses are staff only
+CACHE_CONTROL = {'private': True, 'no_cache': True}
+
+
+def report_data(report):
+    return {
+        'id': report.pk,
+        'title': report.title,
+        'created_at': report.created_at,
+        'created_by': report.created_by_id,
+        'quarter_from': report.quarter_from,
+        'year_from': report.year_from,
+        'quarter_to': report.quarter_to,
+        'year_to': report.year_to,
+        'status': report.status,
+        'progress': report.progress,
+        'started_at': report.started_at,
+        'finished_at': report.finished_at,
+        'error': report.error,
+        'updated_at': report.updated_at,
+        'pdf_report': report.pdf_report.url if report.pdf_report else None,
+    }
+
+
+def result_data(result):
+    if result is None:
+        return None
+    return {field.attname: getattr(result, field.attname) for field in result._meta.concrete_fields
+            if field.name not in ('id', 'report')}
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest())
+
+
+def conditional(request, etag, last_modified):
+    """The 304 response if the client's copy is still current, else None."""
+    return get_conditional_response(request, etag=etag,
+                                    last_modified=last_modified and int(last_modified.timestamp()))
+
+
+def add_validators(response, etag, last_modified):
+    response.headers['ETag'] = etag
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_cache_control(response, **CACHE_CONTROL)
+    return response
+
+
+async def check_permission(request, permission):
+    user = await request.auser()
+    if not await user.ahas_perm(permission):
+        raise PermissionDenied
+
+
+@require_GET
+@staff_member_required
+async def report_list(request):
+    """The reports, newest first.
+
+    Returns {"reports": [...], "next": id} with at most `limit` reports
+    with an id below `before`. `next` is the `before` of the next page,
+    or null on the last page.
+    """
+    await check_permission(request, 'stat_analysis.view_report')
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+        before = int(request.GET['before']) if 'before' in request.GET else None
+    except ValueError:
+        return JsonResponse({'error': "The limit and before must be numbers."}, status=400)
+    if not 1 <= limit <= MAX_LIMIT:
+        return JsonResponse({'error': f"The limit must be a number from 1 to {MAX_LIMIT}."}, status=400)
+
+    # Any report created, changed or deleted changes the count or the latest update
+    state = await Report.objects.aaggregate(updated_at=Max('updated_at'), count=Count('pk'))
+    etag = make_etag('reports', state['count'], state['updated_at'], limit, before)
+    response = conditional(request, etag, state['updated_at'])
+    if response is None:
+        reports = Report.objects.order_by('-pk')
+        if before is not None:
+            reports = reports.filter(pk__lt=before)
+        items = [report_data(report) async for report in reports[:limit]]
+        response = JsonResponse({
+            'reports': items,
+            'next': items[-1]['id'] if len(items) == limit else None,
+        })
+    return add_validators(response, etag, state['updated_at'])
+
+
+@require_GET
+@staff_member_required
+async def report_detail(request, pk):
+    """The report with its job, order and user statistics, null until computed, and its metric values."""
+    await check_permission(request, 'stat_analysis.view_report')
+    try:
+        updated_at = await Report.objects.filter(pk=pk).values_list('updated_at', flat=True).aget()
+    except Report.DoesNotExist:
+        raise Http404("No report with this id.")
+
+    etag = make_etag('report', pk, updated_at)
+    response = conditional(request, etag, updated_at)
+    if response is None:
+        report = await aget_object_or_404(Report.objects.select_related(*RESULTS.values()), pk=pk)
+        # The report may have changed since its version was read
+        updated_at = report.updated_at
+        etag = make_etag('report', pk, updated_at)
+        metrics = {name: value async for name, value in
+                   MetricValue.objects.filter(report=report).values_list('name', 'value').order_by('name')}
+        response = JsonResponse({
+            **report_data(report),
+            'results': {kind: result_data(getattr(report, name, None)) for kind, name in RESULTS.items()},
+            'metrics': metrics,
+        })
+    return add_validators(response, etag, updated_at)
+
+
+@require_POST
+@staff_member_required
+async def recompute_report(request, pk):
+    """Compute the statistics of the report again.
+
+    Responds with 202 and the report when the computation was queued
+    for the report worker, with 200 when it already ran.
+    """
+    await check_permission(request, 'stat_analysis.change_report')
+    report = await aget_object_or_404(Report, pk=pk)
+    queued = await sync_to_async(report.compute_statistics)()
+    if not queued:
+        await report.arefresh_from_db()
+    return JsonResponse(report_data(report), status=202 if queued else 200)
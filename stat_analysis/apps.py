@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class StatAnalysisConfig(AppConfig):
+    name = 'stat_analysis'
+
+    def ready(self):
+        # Keep the per-quarter rollups up to date
+        from stat_analysis import signals  # noqa: F401
@@ -0,0 +1,221 @@
+"""stat_analysis.benchmarks.py
+
+This module benchmarks the statistics calculators at several data
+volumes.
+
+The benchmark runs against a separate test database, which is
+filled incrementally with synthetic data (see `stat_analysis.datagen`)
+up to each scale. For every calculator the wall time, the peak
+Python memory and the number of SQL queries are recorded. Results
+are plain dicts, which can be written to JSON and compared with a
+stored baseline.
+
+The fanout of a report range to worker processes (see
+`stat_analysis.fanout`) is benchmarked separately against the single
+scan of the range, on a scratch database file the workers can open.
+"""
+import os
+import platform
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext, override_settings, setup_databases, teardown_databases
+from django.utils import timezone
+
+from stat_analysis.datagen import generate_data
+from stat_analysis.fanout import fanout_stats, shutdown_spawned_pools
+from stat_analysis.rollups import raw_stats
+from stat_analysis.stat_utils import (
+    calculate_job_stats, calculate_order_stats, calculate_user_stats, get_or_create_report, get_quarter_index
+)
+
+
+CALCULATORS = {
+    'calculate_job_stats': calculate_job_stats,
+    'calculate_order_stats': calculate_order_stats,
+    'calculate_user_stats': calculate_user_stats,
+}
+
+# Do not flag timing differences below this many seconds
+MIN_TIME_DELTA = 0.005
+
+
+def measure(func, *args, trace_memory=True):
+    """Run `func` once and return its wall time, peak memory and query count.
+
+    Without `trace_memory` the peak memory is 0. Forked processes
+    inherit the tracing, which slows them down.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            func(*args)
+            wall_time = time.perf_counter() - started
+        peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+    finally:
+        tracemalloc.stop()
+    return {'wall_time': wall_time, 'peak_memory': peak_memory, 'queries': len(queries.captured_queries)}
+
+
+def run_benchmarks(scales, report_range=('Q1', 2020, 'Q4', 2025), use_rollups=False, repeat=3, seed=0,
+                   progress=None):
+    """Benchmark all calculators at each scale, i.e. number of orders and jobs.
+
+    The statistics cache is disabled and reports are not computed on
+    save, so only the calculators themselves are measured. With
+    `use_rollups` the statistics are merged from the rollups instead
+    of scanning the raw rows, else the raw rows are scanned in this
+    process, without the column store or fanout workers. Every
+    measurement is the fastest of `repeat` runs.
+    """
+    def report(message):
+        if progress is not None:
+            progress(message)
+
+    results = []
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        with override_settings(
+            CACHES={'benchmark': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+            REPORTS_CACHE='benchmark',
+            REPORTS_COMPUTE_IN_BACKGROUND=True,
+            REPORTS_USE_ROLLUPS=use_rollups,
+            # Work in worker processes or on other connections would not be measured
+            REPORTS_FANOUT_WORKERS=1,
+            REPORTS_USE_COLUMNAR=False,
+        ):
+            generated = 0
+            quarter_from, year_from, quarter_to, year_to = report_range
+            for step, scale in enumerate(sorted(scales)):
+                increment = scale - generated
+                generate_data(
+                    orders=increment, jobs=increment, customers=max(1, increment // 10),
+                    managers=max(1, increment // 1000), providers=max(1, increment // 1000),
+                    services=max(1, increment // 100), year_from=year_from, year_to=year_to,
+                    seed=seed + step, prefix=f"B{step}",
+                )
+                generated = scale
+                get_or_create_report(quarter_from, year_from, quarter_to, year_to, 'Benchmark')
+
+                for name, calculator in CALCULATORS.items():
+                    runs = [measure(calculator, *report_range) for _ in range(repeat)]
+                    best = min(runs, key=lambda run: run['wall_time'])
+                    results.append({'scale': scale, 'calculator': name, **best})
+                    report(f"{name} at {scale}: {best['wall_time']:.3f}s, "
+                           f"{best['peak_memory'] / 1024:.0f} KiB, {best['queries']} queries")
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+    return {
+        'created_at': timezone.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+        },
+        'use_rollups': use_rollups,
+        'results': results,
+    }
+
+
+def run_fanout_benchmark(orders=20000, report_range=('Q1', 2020, 'Q4', 2025), workers=4, repeat=3, seed=0,
+                         progress=None):
+    """Benchmark the fanout of `report_range` to `workers` processes against its single scan.
+
+    'raw_scan' scans the whole range in this process. 'fanout_forked'
+    forks the workers from this single-threaded process for every run.
+    'fanout_spawned' runs from another thread, like the report worker
+    and web server, on the pool spawned once per process; its first
+    run, which spawns the workers, is 'fanout_spawned_startup'. Memory
+    is not traced and the queries are those of this process. Every
+    measurement but the start up is the fastest of `repeat` runs.
+    """
+    def report(message):
+        if progress is not None:
+            progress(message)
+
+    def run(func, *args):
+        return measure(func, *args, trace_memory=False)
+
+    def fastest(name, func, *args):
+        runs = [func(*args) for _ in range(repeat)]
+        record(name, min(runs, key=lambda run: run['wall_time']))
+
+    def record(name, run):
+        results.append({'scale': orders, 'calculator': name, **run})
+        report(f"{name} at {orders}: {run['wall_time']:.3f}s")
+
+    quarter_from, year_from, quarter_to, year_to = report_range
+    quarters = get_quarter_index(quarter_from, year_from), get_quarter_index(quarter_to, year_to)
+    results = []
+
+    settings_dict = connections['default'].settings_dict
+    old_test_name = settings_dict['TEST'].get('NAME')
+    directory = tempfile.mkdtemp(prefix='pitc-fanout-')
+    settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+    try:
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(REPORTS_COMPUTE_IN_BACKGROUND=True):
+                generate_data(orders=orders, jobs=orders, customers=max(1, orders // 10),
+                              managers=max(1, orders // 1000), providers=max(1, orders // 1000),
+                              services=max(1, orders // 100), year_from=year_from, year_to=year_to, seed=seed,
+                              prefix='F')
+                report(f"Generated {orders} orders and jobs")
+
+                fastest('raw_scan', run, raw_stats, *quarters)
+                fastest('fanout_forked', run, fanout_stats, *quarters, workers)
+                with ThreadPoolExecutor(max_workers=1) as thread:
+                    record('fanout_spawned_startup', thread.submit(run, fanout_stats, *quarters, workers).result())
+                    fastest('fanout_spawned', lambda: thread.submit(run, fanout_stats, *quarters, workers).result())
+        finally:
+            shutdown_spawned_pools()
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0)
+    finally:
+        settings_dict['TEST']['NAME'] = old_test_name
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    return {
+        'created_at': timezone.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+        },
+        'workers': workers,
+        'results': results,
+    }
+
+
+def compare_results(current, baseline, tolerance=0.25):
+    """Return a description of every regression of `current` against `baseline`.
+
+    Wall time and peak memory regress when they grow by more than
+    `tolerance`, the query count regresses on any increase.
+    """
+    baseline_results = {(result['scale'], result['calculator']): result for result in baseline['results']}
+
+    regressions = []
+    for result in current['results']:
+        previous = baseline_results.get((result['scale'], result['calculator']))
+        if previous is None:
+            continue
+        label = f"{result['calculator']} at {result['scale']}"
+        if (result['wall_time'] > previous['wall_time'] * (1 + tolerance)
+                and result['wall_time'] - previous['wall_time'] > MIN_TIME_DELTA):
+            regressions.append(f"{label}: wall time {previous['wall_time']:.3f}s -> {result['wall_time']:.3f}s")
+        if result['peak_memory'] > previous['peak_memory'] * (1 + tolerance):
+            regressions.append(f"{label}: peak memory {previous['peak_memory']} -> {result['peak_memory']} bytes")
+        if result['queries'] > previous['queries']:
+            regressions.append(f"{label}: queries {previous['queries']} -> {result['queries']}")
+    return regressions
@@ -0,0 +1,79 @@
+"""stat_analysis.cache.py
+
+This module caches computed report statistics.
+
+Statistics are cached per stage and quarter range and keyed on the
+current DataVersion of each data source the stage reads. Every
+write to a source replaces its version (see `stat_analysis.signals`),
+which invalidates all cached statistics depending on it.
+
+Concurrent misses of the same statistics are computed once, see
+`stat_analysis.singleflight`.
+
+The cache alias is configured by the `REPORTS_CACHE` setting.
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+from stat_analysis.models import DataVersion
+from stat_analysis.models.versions import new_version
+from stat_analysis.singleflight import single_flight
+
+
+# Part of every key, increase when the computed statistics change
+STATS_FORMAT = 2
+
+# Data sources read by each statistics stage
+STAGE_SOURCES = {
+    'jobs': [DataVersion.SOURCE_JOBS],
+    'orders': [DataVersion.SOURCE_ORDERS],
+    'users': [DataVersion.SOURCE_ORDERS, DataVersion.SOURCE_CUSTOMERS],
+    'metrics': [DataVersion.SOURCE_ORDERS, DataVersion.SOURCE_JOBS, DataVersion.SOURCE_CUSTOMERS],
+    'metric_partials': [DataVersion.SOURCE_ORDERS, DataVersion.SOURCE_JOBS, DataVersion.SOURCE_CUSTOMERS],
+}
+
+
+def get_cache():
+    return caches[getattr(settings, 'REPORTS_CACHE', 'default')]
+
+
+def bump_data_version(source):
+    """Mark `source` as changed."""
+    version = new_version()
+    if not DataVersion.objects.filter(source=source).update(version=version):
+        DataVersion.objects.get_or_create(source=source, defaults={'version': version})
+
+
+def get_data_versions(sources):
+    versions = dict(DataVersion.objects.filter(source__in=sources).values_list('source', 'version'))
+    missing = [source for source in sources if source not in versions]
+    for source in missing:
+        versions[source] = DataVersion.objects.get_or_create(source=source)[0].version
+    return versions
+
+
+def get_or_compute_stats(stage, quarters, compute, variant=None):
+    """Return the cached statistics of `stage` for the quarter range, computing them on a miss.
+
+    `variant` tells apart statistics of the same stage computed
+    differently, e.g. of other metrics.
+
+    The data versions are read before computing, so statistics of data
+    changed during the computation are stored under an outdated key.
+    Callers missing the same key at once wait for the first one to
+    compute and store it.
+    """
+    versions = get_data_versions(STAGE_SOURCES[stage])
+    version_key = '-'.join(versions[source] for source in STAGE_SOURCES[stage])
+    key = f"stat_analysis:{STATS_FORMAT}:{stage}:{quarters[0]}:{quarters[1]}:{version_key}"
+    if variant:
+        key += f":{variant}"
+
+    cache = get_cache()
+
+    def compute_and_store():
+        stats = compute()
+        cache.set(key, stats)
+        return stats
+
+    return single_flight(key, lambda: cache.get(key), compute_and_store)
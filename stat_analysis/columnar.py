@@ -0,0 +1,525 @@
+"""stat_analysis.columnar.py
+
+This module keeps the rows behind the report statistics in a column
+store and computes the statistics from it with vectorized NumPy
+operations.
+
+Instead of model instances the store holds one compact array per
+column: the orders with their customer, account manager and value in
+cents, the provider of every service of an order, the jobs with their
+state and type as small integer codes and the customers. The arrays
+are `.npy` files in a directory per table and quarter under the
+`REPORTS_COLUMNAR_DIR` and are memory-mapped when read, so a report
+only pages in the quarters of its range.
+
+The store is refreshed before it is read. New rows are loaded in
+chunks with `values_list` and appended as one segment per quarter.
+Changes to rows already in the store are recorded as dirty ids by the
+receivers in `stat_analysis.signals` once committed, and the quarters
+holding them are then reloaded from the database as a whole. A quarter
+is also rewritten as a single segment once it has `MAX_SEGMENTS`.
+The rows are always loaded from the primary: a lagging replica could
+still return the old version of a dirty row, which would then stay in
+the store.
+
+The manifest lists the directory and number of segments of every
+quarter. Files are only referenced once written and replaced
+directories are only removed a while later, so the store is read
+without a lock. Refreshes hold the advisory lock `STORE_LOCK`.
+
+Writes that bypass model signals (`QuerySet.update`, raw SQL) must be
+followed by `manage.py refresh_columns --rebuild`.
+
+NumPy is optional: without it the store is not used.
+"""
+import datetime
+import itertools
+import json
+import os
+import shutil
+import time
+import uuid
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core.models import AccountManager, Customer, Order, ServiceProvider
+from execution.models import Job
+from stat_analysis.aggregation import manager_display_name
+from stat_analysis.fanout import partial_stats
+from stat_analysis.routers import primary_reads
+from stat_analysis.singleflight import LockTimeout, advisory_lock
+from stat_analysis.sketches import LOG_GAMMA, QuantileSketch
+from stat_analysis.stat_utils import get_quarter_bounds
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+STORE_LOCK = 'stat_analysis:columns'
+
+# Rows converted to arrays at once while loading
+CHUNK_SIZE = 20000
+
+# Segments of a quarter before it is rewritten as one
+MAX_SEGMENTS = 16
+
+# Seconds a replaced directory is kept for the readers still using it
+GARBAGE_AGE = 300
+
+# Seconds a report waits for a running refresh before computing without the store
+REFRESH_WAIT = 5
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def microseconds(value):
+    """Microseconds since the epoch of the aware datetime `value`."""
+    return (value - EPOCH) // MICROSECOND
+
+
+def cents(value):
+    return int(value.scaleb(2))
+
+
+def codes(choices):
+    """Convert the values of `choices` to their position, other values to -1."""
+    positions = {value: position for position, (value, _) in enumerate(choices)}
+    return lambda value: positions.get(value, -1)
+
+
+# Per table: the model, the field of the quarter of a row and the row sets
+# stored for the selected rows of the model, each with the field of its
+# quarter and its (column, field, dtype, conversion) columns
+TABLES = {
+    'orders': (Order, 'created_at', [
+        (lambda orders: orders, 'created_at', [
+            ('id', 'pk', 'int64', int),
+            ('created_at', 'created_at', 'int64', microseconds),
+            ('customer', 'customer_id', 'int64', int),
+            ('manager', 'account_manager_id', 'int64', int),
+            ('value', 'total_value', 'int64', cents),
+        ]),
+        (lambda orders: Order.services.through.objects.filter(order__in=orders.values('pk')), 'order__created_at', [
+            ('service_order', 'order_id', 'int64', int),
+            ('service_provider', 'service__provider_id', 'int64', int),
+        ]),
+    ]),
+    'jobs': (Job, 'starting_date', [
+        (lambda jobs: jobs, 'starting_date', [
+            ('id', 'pk', 'int64', int),
+            ('end_date', 'end_date', 'int64', microseconds),
+            ('completion_time', 'completion_time', 'float64', float),
+            ('job_type', 'job_type', 'int8', codes(Job.JOB_TYPE_CHOICES)),
+            ('state', 'state', 'int8', codes(Job.STATE_CHOICES)),
+        ]),
+    ]),
+    'customers': (Customer, 'created_at', [
+        (lambda customers: customers, 'created_at', [
+            ('id', 'pk', 'int64', int),
+            ('created_at', 'created_at', 'int64', microseconds),
+        ]),
+    ]),
+}
+
+DTYPES = {
+    table: {name: dtype for _, _, columns in rowsets for name, _, dtype, _ in columns}
+    for table, (_, _, rowsets) in TABLES.items()
+}
+
+
+def require_numpy():
+    if np is None:
+        raise ImproperlyConfigured("The column store requires NumPy, install it with `pip install numpy`.")
+
+
+def database_name():
+    """Name of the database the store is built from, a store of another one is not used."""
+    return str(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+
+
+def quarter_index(timestamp):
+    moment = timezone.localtime(EPOCH + datetime.timedelta(microseconds=timestamp))
+    return moment.year * 4 + (moment.month - 1) // 3
+
+
+def quarters_of(timestamps):
+    """Quarter index of every timestamp of the array `timestamps`, in microseconds."""
+    first, last = quarter_index(int(timestamps.min())), quarter_index(int(timestamps.max()))
+    starts = np.array([microseconds(get_quarter_bounds(quarter)[0]) for quarter in range(first, last + 1)],
+                      dtype='int64')
+    return first + np.searchsorted(starts, timestamps, side='right') - 1
+
+
+def load_columns(table, selection):
+    """Load the columns of the rows of `table` for the `selection` queryset of its model.
+
+    Returns the arrays of every column per quarter index.
+    """
+    _, _, rowsets = TABLES[table]
+    parts = {}
+    for rows, quarter_field, columns in rowsets:
+        values = (rows(selection).order_by('pk')
+                  .values_list(quarter_field, *[field for _, field, _, _ in columns])
+                  .iterator(chunk_size=CHUNK_SIZE))
+        while chunk := list(itertools.islice(values, CHUNK_SIZE)):
+            fields = list(zip(*chunk))
+            quarters = quarters_of(np.fromiter(map(microseconds, fields[0]), dtype='int64', count=len(chunk)))
+            arrays = {name: np.fromiter(map(convert, column), dtype=dtype, count=len(chunk))
+                      for (name, _, dtype, convert), column in zip(columns, fields[1:])}
+            # Split the chunk by quarter
+            order = np.argsort(quarters, kind='stable')
+            unique, starts = np.unique(quarters[order], return_index=True)
+            for quarter, rows_of_quarter in zip(unique.tolist(), np.split(order, starts[1:])):
+                quarter_parts = parts.setdefault(quarter, {})
+                for name, array in arrays.items():
+                    quarter_parts.setdefault(name, []).append(array[rows_of_quarter])
+    return {
+        quarter: {name: np.concatenate(columns.get(name, [np.empty(0, dtype=dtype)]))
+                  for name, dtype in DTYPES[table].items()}
+        for quarter, columns in parts.items()
+    }
+
+
+def group_sums(keys, values):
+    """The distinct `keys`, which are ids, with the number of rows and the sum of `values` of each.
+
+    Counted per id with `bincount`, which is faster than sorting for
+    dense ids. The float sums of the integer `values` are exact below
+    2 ** 53.
+    """
+    counts = np.bincount(keys)
+    sums = np.bincount(keys, weights=values)
+    ids = np.flatnonzero(counts)
+    return ids, counts[ids], np.rint(sums[ids]).astype('int64')
+
+
+def distinct_ids(ids):
+    """The distinct values of the array of ids `ids`, sorted."""
+    seen = np.zeros(ids.max() + 1 if len(ids) else 0, dtype=bool)
+    seen[ids] = True
+    return np.flatnonzero(seen)
+
+
+class ColumnStore:
+    """The column store in the directory `path`, by default the `REPORTS_COLUMNAR_DIR` setting."""
+
+    def __init__(self, path=None):
+        self.path = Path(path or getattr(settings, 'REPORTS_COLUMNAR_DIR', 'columns'))
+
+    @property
+    def manifest_path(self):
+        return self.path / 'manifest.json'
+
+    def dirty_path(self, table):
+        return self.path / f'{table}.dirty'
+
+    def read_manifest(self):
+        """The manifest of the store of this database, None when there is none."""
+        try:
+            with open(self.manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+        except FileNotFoundError:
+            return None
+        return manifest if manifest['database'] == database_name() else None
+
+    def write_manifest(self, manifest):
+        temporary = self.path / f'manifest.{uuid.uuid4().hex}.tmp'
+        with open(temporary, 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+        # Readers see either the old or the new manifest
+        os.replace(temporary, self.manifest_path)
+
+    def is_built(self):
+        return np is not None and self.read_manifest() is not None
+
+    # Dirty rows
+
+    def record_dirty(self, table, ids):
+        """Record that the rows `ids` of `table` changed, if they are stored or being loaded."""
+        manifest = self.read_manifest()
+        if manifest is None:
+            return
+        claimed = manifest['tables'][table]['claimed']
+        ids = [pk for pk in ids if pk is not None and pk <= claimed]
+        if ids:
+            with open(self.dirty_path(table), 'a') as dirty_file:
+                dirty_file.write(''.join(f'{pk}\n' for pk in ids))
+
+    def take_dirty(self, table):
+        """Move the recorded dirty ids of `table` aside. Returns their files and the ids."""
+        path = self.dirty_path(table)
+        if path.exists():
+            os.replace(path, path.with_name(f'{path.name}.{uuid.uuid4().hex}'))
+        # Including those of an earlier refresh which failed
+        files = sorted(self.path.glob(f'{path.name}.*'))
+        ids = set()
+        for taken in files:
+            ids.update(int(line) for line in taken.read_text().split())
+        return files, ids
+
+    def is_current(self, manifest):
+        """Whether no rows were added or changed since the last refresh."""
+        for table, (model, _, _) in TABLES.items():
+            if self.dirty_path(table).exists() or any(self.path.glob(f'{table}.dirty.*')):
+                return False
+            high_water = model.objects.aggregate(high_water=Max('pk'))['high_water'] or 0
+            if high_water != manifest['tables'][table]['high_water']:
+                return False
+        return True
+
+    # Segments
+
+    def read_column(self, manifest, table, name, quarters):
+        """The values of the column `name` of `table` in `quarters`, in one array."""
+        quarter_directories = manifest['tables'][table]['quarters']
+        arrays = []
+        for quarter in quarters:
+            directory, segments = quarter_directories.get(str(quarter), (None, 0))
+            for segment in range(segments):
+                arrays.append(np.load(self.path / table / directory / f'{name}.{segment}.npy', mmap_mode='r'))
+        if not arrays:
+            return np.empty(0, dtype=DTYPES[table][name])
+        return np.concatenate(arrays)
+
+    def write_segment(self, manifest, table, quarter, directory, segment, columns):
+        path = self.path / table / directory
+        path.mkdir(parents=True, exist_ok=True)
+        for name, array in columns.items():
+            np.save(path / f'{name}.{segment}.npy', array)
+        manifest['tables'][table]['quarters'][str(quarter)] = [directory, segment + 1]
+
+    def discard(self, manifest, table, directory):
+        manifest['garbage'].append([str(Path(table) / directory), time.time()])
+
+    def replace_quarter(self, manifest, table, quarter, columns):
+        """Replace all segments of `quarter` by one with `columns`."""
+        directory, _ = manifest['tables'][table]['quarters'].pop(str(quarter), (None, 0))
+        if directory is not None:
+            self.discard(manifest, table, directory)
+        if columns and len(columns['id']):
+            self.write_segment(manifest, table, quarter, f'{quarter}.{uuid.uuid4().hex[:8]}', 0, columns)
+
+    def append_segment(self, manifest, table, quarter, columns):
+        directory, segments = manifest['tables'][table]['quarters'].get(str(quarter), (None, 0))
+        if directory is None:
+            self.write_segment(manifest, table, quarter, f'{quarter}.{uuid.uuid4().hex[:8]}', 0, columns)
+        elif segments + 1 >= MAX_SEGMENTS:
+            stored = {name: self.read_column(manifest, table, name, [quarter]) for name in columns}
+            self.replace_quarter(manifest, table, quarter,
+                                 {name: np.concatenate([stored[name], array]) for name, array in columns.items()})
+        else:
+            self.write_segment(manifest, table, quarter, directory, segments, columns)
+
+    def collect_garbage(self, manifest):
+        kept = []
+        for directory, discarded_at in manifest['garbage']:
+            if time.time() - discarded_at < GARBAGE_AGE:
+                kept.append([directory, discarded_at])
+            else:
+                shutil.rmtree(self.path / directory, ignore_errors=True)
+        manifest['garbage'] = kept
+
+    # Refresh
+
+    def refresh(self, rebuild=False, wait=None, progress=None):
+        """Append the new rows and reload the quarters of the changed ones.
+
+        With `rebuild` all rows are loaded again. Waits at most `wait`
+        seconds for a running refresh, see `advisory_lock`. `progress`
+        is called with a message per table. The rows are read from the
+        primary. Returns the number of rows loaded per table.
+        """
+        require_numpy()
+        with primary_reads():
+            manifest = self.read_manifest()
+            if not rebuild and manifest is not None and self.is_current(manifest):
+                return {table: 0 for table in TABLES}
+
+            with advisory_lock(STORE_LOCK, wait=wait):
+                self.path.mkdir(parents=True, exist_ok=True)
+                manifest = self.read_manifest()
+                if manifest is None or rebuild:
+                    new_manifest = {
+                        'database': database_name(),
+                        'tables': {table: {'high_water': 0, 'claimed': 0, 'quarters': {}} for table in TABLES},
+                        'garbage': manifest['garbage'] if manifest else [],
+                    }
+                    for table in TABLES:
+                        for directory, _ in (manifest or new_manifest)['tables'][table]['quarters'].values():
+                            self.discard(new_manifest, table, directory)
+                    manifest = new_manifest
+                self.collect_garbage(manifest)
+
+                loaded = {}
+                for table in TABLES:
+                    loaded[table] = self.refresh_table(manifest, table, discard_dirty=rebuild)
+                    if progress is not None:
+                        progress(f"{table}: {loaded[table]} row(s) loaded")
+                return loaded
+
+    def refresh_table(self, manifest, table, discard_dirty=False):
+        model, quarter_field, _ = TABLES[table]
+        entry = manifest['tables'][table]
+        high_water = model.objects.aggregate(high_water=Max('pk'))['high_water'] or 0
+        if high_water > entry['claimed']:
+            # Changes to these rows are recorded as dirty from now on
+            entry['claimed'] = high_water
+            self.write_manifest(manifest)
+
+        loaded = 0
+        dirty_files, dirty = self.take_dirty(table)
+        dirty = sorted(pk for pk in dirty if pk <= entry['high_water'])
+        if dirty and not discard_dirty:
+            ids = np.array(dirty, dtype='int64')
+            # The quarters a changed row was in and is in now
+            quarters = {int(quarter) for quarter in entry['quarters']
+                        if np.isin(self.read_column(manifest, table, 'id', [quarter]), ids).any()}
+            timestamps = [microseconds(value) for value in
+                          model.objects.filter(pk__in=dirty).values_list(quarter_field, flat=True)]
+            if timestamps:
+                quarters.update(quarters_of(np.array(timestamps, dtype='int64')).tolist())
+            for quarter in sorted(quarters):
+                start_date, end_date = get_quarter_bounds(quarter)
+                selection = model.objects.filter(**{f'{quarter_field}__gte': start_date,
+                                                    f'{quarter_field}__lt': end_date},
+                                                 pk__lte=entry['high_water'])
+                columns = load_columns(table, selection).get(quarter)
+                self.replace_quarter(manifest, table, quarter, columns)
+                loaded += len(columns['id']) if columns else 0
+
+        if high_water > entry['high_water']:
+            selection = model.objects.filter(pk__gt=entry['high_water'], pk__lte=high_water)
+            for quarter, columns in load_columns(table, selection).items():
+                self.append_segment(manifest, table, quarter, columns)
+                loaded += len(columns['id'])
+            entry['high_water'] = high_water
+
+        self.write_manifest(manifest)
+        for taken in dirty_files:
+            os.remove(taken)
+        return loaded
+
+    def size(self):
+        """Bytes of the segments of the store."""
+        manifest = self.read_manifest()
+        if manifest is None:
+            return 0
+        return sum(path.stat().st_size
+                   for table, entry in manifest['tables'].items()
+                   for directory, _ in entry['quarters'].values()
+                   for path in (self.path / table / directory).iterdir())
+
+    # Statistics
+
+    def stats(self, first_quarter, last_quarter):
+        """Compute the statistics of the quarter range from the store.
+
+        Returns the same dict as `stat_analysis.fanout.fanout_stats`.
+        """
+        require_numpy()
+        manifest = self.read_manifest()
+        quarters = range(first_quarter, last_quarter + 1)
+
+        def column(table, name):
+            return self.read_column(manifest, table, name, quarters)
+
+        values = column('orders', 'value')
+        manager_ids, manager_counts, manager_cents = group_sums(column('orders', 'manager'), values)
+        names = {
+            pk: manager_display_name(first_name, last_name, username)
+            for pk, first_name, last_name, username in AccountManager.objects.filter(pk__in=manager_ids.tolist())
+            .values_list('pk', 'user__first_name', 'user__last_name', 'user__username')
+        }
+        managers = {}
+        for pk, count, total in zip(manager_ids.tolist(), manager_counts.tolist(), manager_cents.tolist()):
+            totals = managers.setdefault(names[pk], {'num_orders': 0, 'revenue': Decimal('0.00')})
+            totals['num_orders'] += count
+            totals['revenue'] += Decimal(total).scaleb(-2)
+
+        # An order is counted once per provider name, even with several services of that provider
+        service_orders, service_providers = column('orders', 'service_order'), column('orders', 'service_provider')
+        provider_ids = distinct_ids(service_providers)
+        provider_names = dict(ServiceProvider.objects.filter(pk__in=provider_ids.tolist()).values_list('pk', 'name'))
+        distinct_names = sorted(set(provider_names.values()))
+        name_codes = {name: code for code, name in enumerate(distinct_names)}
+        provider_codes = np.zeros(provider_ids[-1] + 1 if len(provider_ids) else 0, dtype='int64')
+        provider_codes[provider_ids] = [name_codes[provider_names[pk]] for pk in provider_ids.tolist()]
+        pairs = np.sort(service_orders * max(len(distinct_names), 1) + provider_codes[service_providers])
+        pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))] if len(pairs) else pairs
+        provider_counts = np.bincount(pairs % max(len(distinct_names), 1), minlength=len(distinct_names))
+
+        end_date = microseconds(get_quarter_bounds(last_quarter)[1])
+        ended = column('jobs', 'end_date') < end_date
+        completion_times = column('jobs', 'completion_time')[ended]
+        job_types = column('jobs', 'job_type')[ended]
+        states = np.bincount(column('jobs', 'state')[ended].astype('int64') + 1, minlength=len(Job.STATE_CHOICES) + 1)
+        times = {}
+        sketches = {}
+        for position, (job_type, _) in enumerate(Job.JOB_TYPE_CHOICES):
+            type_times = completion_times[job_types == position]
+            times[job_type] = (float(type_times.sum()), len(type_times))
+            if len(type_times):
+                positive = type_times[type_times > 0]
+                buckets = np.ceil(np.log(positive) / LOG_GAMMA).astype('int64')
+                lowest = int(buckets.min()) if len(buckets) else 0
+                counts = np.bincount(buckets - lowest)
+                rows = [(int(bucket) + lowest, int(counts[bucket])) for bucket in np.flatnonzero(counts)]
+                if len(positive) < len(type_times):
+                    rows.append((None, len(type_times) - len(positive)))
+                sketches[job_type] = QuantileSketch.from_bucket_rows(rows).to_dict()
+
+        return partial_stats({
+            'total_orders': len(values),
+            'total_revenue': Decimal(int(values.sum(dtype='int64'))).scaleb(-2),
+            'providers': {name: count for name, count in zip(distinct_names, provider_counts.tolist()) if count},
+            'managers': managers,
+            'customers': distinct_ids(column('orders', 'customer')),
+            'new_customers': len(column('customers', 'id')),
+            'total_jobs': int(ended.sum()),
+            # Position 0 counts the unknown states
+            'states': {state: count for (state, _), count in zip(Job.STATE_CHOICES, states[1:].tolist())},
+            'completion_times': times,
+            'sketches': sketches,
+        })
+
+
+def mark_dirty(table, ids):
+    """Record the rows `ids` of `table` as changed once the current transaction commits.
+
+    `ids` may be a lazy queryset, it is only evaluated while there is a store.
+    """
+    store = ColumnStore()
+    if not store.manifest_path.exists():
+        return
+    ids = list(ids)
+    transaction.on_commit(lambda: store.record_dirty(table, ids))
+
+
+def refresh_store(wait=REFRESH_WAIT):
+    """Bring the column store up to date for computing statistics. Returns whether it can be used.
+
+    It is not used when it is not built, without NumPy, inside a
+    transaction, whose writes it would not see, or when a running
+    refresh does not finish within `wait` seconds.
+    """
+    if np is None or not getattr(settings, 'REPORTS_USE_COLUMNAR', True):
+        return False
+    store = ColumnStore()
+    if not store.is_built():
+        return False
+    if any(connection.in_atomic_block for connection in connections.all(initialized_only=True)):
+        return False
+    try:
+        store.refresh(wait=wait)
+    except LockTimeout:
+        return False
+    return True
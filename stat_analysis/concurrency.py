@@ -0,0 +1,214 @@
+"""stat_analysis.concurrency.py
+
+This module benchmarks the SQLite profiles (see `pitc_project.sqlite`)
+under concurrent order entry and report computation.
+
+For every profile `writers` processes enter orders with their
+services, as the admin does, while `readers` processes compute the
+order and job statistics from the raw rows, as the report worker does
+without the rollups. The processes are forked, so they run in
+parallel like separate web and worker processes, and each has its own
+connection to a scratch database file seeded with synthetic data (see
+`stat_analysis.datagen`).
+
+Before the concurrent run each operation is timed alone. The lock
+wait of an operation under load is estimated as its latency beyond
+that uncontended median. Operations failing with "database is locked"
+are counted as errors.
+"""
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import time
+from statistics import median
+
+import django
+from django.db import OperationalError, connection, connections, transaction
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.utils import timezone
+
+from core.models import Customer, Order, Service
+from execution.models import Job
+from pitc_project.sqlite import sqlite_options
+from stat_analysis.aggregation import aggregate_job_stats, aggregate_order_stats
+from stat_analysis.datagen import generate_data
+
+
+# Uncontended runs of each operation before the concurrent run
+CALIBRATION_RUNS = 5
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(latencies, baseline, errors, duration):
+    """Throughput, latency and lock wait (latency beyond `baseline`) of the operations of one role."""
+    summary = {'operations': len(latencies), 'errors': errors, 'throughput': len(latencies) / duration}
+    if not latencies:
+        return summary
+    waits = [max(0.0, latency - baseline) for latency in latencies]
+    for name, fraction in [('p50', 0.5), ('p95', 0.95), ('p99', 0.99)]:
+        summary[f'latency_{name}'] = _percentile(latencies, fraction)
+        summary[f'lock_wait_{name}'] = _percentile(waits, fraction)
+    summary['latency_max'] = max(latencies)
+    return summary
+
+
+def _is_lock_error(error):
+    return 'locked' in str(error) or 'busy' in str(error)
+
+
+class OrderEntry:
+    """Enter an order of a random customer with services of its manager's providers."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.customers = list(Customer.objects.values_list('pk', flat=True))
+        services = {}
+        for manager_id, service_id in Service.objects.values_list('provider__account_managers', 'pk'):
+            if manager_id is not None:
+                services.setdefault(manager_id, []).append(service_id)
+        self.services = list(services.items())
+
+    def __call__(self):
+        manager_id, service_ids = self.rng.choice(self.services)
+        with transaction.atomic():
+            order = Order.objects.create(customer_id=self.rng.choice(self.customers), account_manager_id=manager_id)
+            order.services.set(self.rng.sample(service_ids, min(len(service_ids), self.rng.randint(1, 3))))
+
+
+def compute_statistics():
+    """Order and job statistics over all rows, without rollups or caches."""
+    aggregate_order_stats(Order.objects.all())
+    aggregate_job_stats(Job.objects.all())
+
+
+def _timed(operation):
+    started = time.perf_counter()
+    operation()
+    return time.perf_counter() - started
+
+
+def _run_role(role, operation, duration, start, results):
+    # Runs in a forked process, which opens its own connection
+    latencies, errors = [], 0
+    try:
+        start.wait()
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                operation()
+            except OperationalError as error:
+                if not _is_lock_error(error):
+                    raise
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+    finally:
+        connection.close()
+        results.put((role, latencies, errors))
+
+
+def use_profile(profile):
+    """Connect the following connections of all SQLite databases with `profile`."""
+    connections.close_all()
+    for alias in connections:
+        if connections[alias].vendor == 'sqlite':
+            connections[alias].settings_dict['OPTIONS'] = sqlite_options(profile)
+    # Switch the journal mode while no other connection is open
+    connection.ensure_connection()
+
+
+def run_profile(profile, writers, readers, duration, seed=0):
+    """Run `writers` order entry and `readers` statistics processes for `duration` seconds."""
+    use_profile(profile)
+    entries = [OrderEntry(seed + index) for index in range(max(writers, 1))]
+    baselines = {
+        'writers': median(_timed(entries[0]) for _ in range(CALIBRATION_RUNS)),
+        'readers': median(_timed(compute_statistics) for _ in range(CALIBRATION_RUNS)),
+    }
+    # The forked processes must not share the connection of this one
+    connections.close_all()
+
+    context = multiprocessing.get_context('fork')
+    start = context.Barrier(writers + readers)
+    queue = context.Queue()
+    roles = [('writers', entry) for entry in entries[:writers]] + [('readers', compute_statistics)] * readers
+    processes = [context.Process(target=_run_role, args=(role, operation, duration, start, queue))
+                 for role, operation in roles]
+    for process in processes:
+        process.start()
+    results = {role: ([], 0) for role in baselines}
+    for _ in processes:
+        role, latencies, errors = queue.get()
+        results[role] = (results[role][0] + latencies, results[role][1] + errors)
+    for process in processes:
+        process.join()
+
+    return {
+        'profile': profile,
+        **{role: summarize(latencies, baselines[role], errors, duration)
+           for role, (latencies, errors) in results.items()},
+    }
+
+
+def run_concurrency_benchmark(profiles, writers=4, readers=2, duration=10.0, orders=20000, seed=0,
+                              progress=None):
+    """Benchmark each of `profiles` on a scratch database file with `orders` orders and jobs."""
+    def report(message):
+        if progress is not None:
+            progress(message)
+
+    settings_dict = connections['default'].settings_dict
+    old_options = {alias: connections[alias].settings_dict.get('OPTIONS', {}) for alias in connections}
+    old_test_name = settings_dict['TEST'].get('NAME')
+    directory = tempfile.mkdtemp(prefix='pitc-concurrency-')
+    settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+    results = []
+    try:
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(REPORTS_COMPUTE_IN_BACKGROUND=True):
+                generate_data(orders=orders, jobs=orders, customers=max(1, orders // 10),
+                              managers=max(1, orders // 1000), providers=max(1, orders // 1000),
+                              services=max(1, orders // 100), seed=seed, prefix='C')
+                report(f"Generated {orders} orders and jobs")
+                for profile in profiles:
+                    result = run_profile(profile, writers, readers, duration, seed=seed)
+                    results.append(result)
+                    for role in ['writers', 'readers']:
+                        summary = result[role]
+                        report(f"{profile} {role}: {summary['throughput']:.1f} ops/s, "
+                               f"p95 latency {summary.get('latency_p95', 0) * 1000:.1f} ms, "
+                               f"p95 lock wait {summary.get('lock_wait_p95', 0) * 1000:.1f} ms, "
+                               f"{summary['errors']} locked")
+        finally:
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0)
+    finally:
+        for alias, options in old_options.items():
+            connections[alias].settings_dict['OPTIONS'] = options
+        settings_dict['TEST']['NAME'] = old_test_name
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    return {
+        'created_at': timezone.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+        },
+        'writers': writers,
+        'readers': readers,
+        'duration': duration,
+        'orders': orders,
+        'results': results,
+    }
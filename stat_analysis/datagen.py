@@ -0,0 +1,153 @@
+"""stat_analysis.datagen.py
+
+This module generates synthetic orders, jobs and customers.
+
+The rows are written with `bulk_create` in batches, so millions of
+rows can be generated in bounded memory. Since `bulk_create` does not
+send model signals, the order totals are computed per batch and the
+rollups and the search index are rebuilt and the data versions are
+bumped at the end.
+"""
+import datetime
+import random
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Order, Customer, AccountManager, ServiceProvider, Service
+from core.totals import update_order_totals
+from execution.models import Job
+from search.backends import get_backend
+from search.documents import DOCUMENTS
+from stat_analysis.cache import bump_data_version
+from stat_analysis.models import DataVersion
+from stat_analysis.rollups import rebuild_rollups
+
+
+FIRST_NAMES = ['Anna', 'Ben', 'Clara', 'David', 'Eva', 'Felix', 'Greta', 'Hans', 'Ida', 'Jonas']
+LAST_NAMES = ['Bauer', 'Fischer', 'Hoffmann', 'Koch', 'Meyer', 'Richter', 'Schmidt', 'Wagner', 'Weber']
+JOB_STATE_WEIGHTS = {'created': 1, 'active': 2, 'completed': 7}
+JOB_TYPE_WEIGHTS = {'regular': 4, 'wafer_run': 1}
+
+
+def _batches(total, batch_size):
+    for start in range(0, total, batch_size):
+        yield start, min(batch_size, total - start)
+
+
+def _random_datetime(rng, start, seconds):
+    return start + datetime.timedelta(seconds=rng.randrange(seconds))
+
+
+def generate_data(orders=10000, jobs=10000, customers=1000, managers=100, providers=50, services=500,
+                  max_services_per_order=4, year_from=2020, year_to=2025, batch_size=5000, seed=None,
+                  prefix='G', progress=None):
+    """Generate synthetic data spread evenly over the years `year_from` to `year_to`.
+
+    `progress` is called with a message after each batch. Returns a
+    dict with the number of generated rows per model.
+    """
+    rng = random.Random(seed)
+    start = timezone.make_aware(datetime.datetime(year_from, 1, 1))
+    seconds = int((timezone.make_aware(datetime.datetime(year_to + 1, 1, 1)) - start).total_seconds())
+
+    def report(message):
+        if progress is not None:
+            progress(message)
+
+    with transaction.atomic():
+        username_prefix = f"{prefix.lower()}manager"
+        user_offset = User.objects.filter(username__startswith=username_prefix).count()
+        users = User.objects.bulk_create([
+            User(username=f"{username_prefix}{user_offset + index}", first_name=rng.choice(FIRST_NAMES),
+                 last_name=rng.choice(LAST_NAMES))
+            for index in range(managers)
+        ], batch_size=batch_size)
+        manager_objects = AccountManager.objects.bulk_create(
+            [AccountManager(user=user) for user in users], batch_size=batch_size
+        )
+        provider_objects = ServiceProvider.objects.bulk_create(
+            [ServiceProvider(name=f"{prefix} Provider {index}") for index in range(providers)], batch_size=batch_size
+        )
+        service_objects = Service.objects.bulk_create([
+            Service(name=f"{prefix} Service {index}", price=Decimal(rng.randrange(1000, 500000)) / 100,
+                    provider=rng.choice(provider_objects))
+            for index in range(services)
+        ], batch_size=batch_size)
+
+        # Every manager may sell the services of a few providers
+        services_by_provider = {}
+        for service in service_objects:
+            services_by_provider.setdefault(service.provider_id, []).append(service.pk)
+        ManagerProviders = AccountManager.service_providers.through
+        manager_providers = []
+        allowed_services = {}
+        for manager in manager_objects:
+            chosen = rng.sample(provider_objects, min(len(provider_objects), 5))
+            manager_providers += [ManagerProviders(accountmanager_id=manager.pk, serviceprovider_id=provider.pk)
+                                  for provider in chosen]
+            allowed_services[manager.pk] = [service_id for provider in chosen
+                                            for service_id in services_by_provider.get(provider.pk, [])]
+        ManagerProviders.objects.bulk_create(manager_providers, batch_size=batch_size)
+        report(f"Created {managers} managers, {providers} providers and {services} services")
+
+        customer_ids = []
+        for offset, size in _batches(customers, batch_size):
+            customer_ids += [customer.pk for customer in Customer.objects.bulk_create([
+                Customer(name=f"{prefix} Customer {offset + index}", created_by=rng.choice(manager_objects),
+                         created_at=_random_datetime(rng, start, seconds))
+                for index in range(size)
+            ])]
+        report(f"Created {customers} customers")
+
+        OrderServices = Order.services.through
+        manager_ids = [manager.pk for manager in manager_objects]
+        for offset, size in _batches(orders, batch_size):
+            order_objects = Order.objects.bulk_create([
+                Order(customer_id=rng.choice(customer_ids), account_manager_id=rng.choice(manager_ids),
+                      created_at=_random_datetime(rng, start, seconds))
+                for _ in range(size)
+            ])
+            links = []
+            for order in order_objects:
+                choices = allowed_services[order.account_manager_id]
+                count = min(len(choices), rng.randint(1, max_services_per_order))
+                links += [OrderServices(order_id=order.pk, service_id=service_id)
+                          for service_id in rng.sample(choices, count)]
+            OrderServices.objects.bulk_create(links)
+            update_order_totals(Order.objects.filter(pk__gte=order_objects[0].pk, pk__lte=order_objects[-1].pk))
+            report(f"Created {offset + size}/{orders} orders")
+
+        job_offset = Job.objects.filter(job_id__startswith=prefix).count()
+        states, state_weights = zip(*JOB_STATE_WEIGHTS.items())
+        job_types, type_weights = zip(*JOB_TYPE_WEIGHTS.items())
+        for offset, size in _batches(jobs, batch_size):
+            job_objects = []
+            for index in range(offset, offset + size):
+                starting_date = _random_datetime(rng, start, seconds)
+                completion_time = round(rng.lognormvariate(2.5, 0.6), 2)
+                job_objects.append(Job(
+                    job_id=f"{prefix}{job_offset + index:0{10 - len(prefix)}d}",
+                    job_name=f"{prefix} Job {job_offset + index}",
+                    state=rng.choices(states, state_weights)[0],
+                    job_type=rng.choices(job_types, type_weights)[0],
+                    starting_date=starting_date,
+                    end_date=starting_date + datetime.timedelta(days=completion_time),
+                    completion_time=completion_time,
+                ))
+            Job.objects.bulk_create(job_objects)
+            report(f"Created {offset + size}/{jobs} jobs")
+
+        rebuild_rollups()
+        for source, _ in DataVersion.SOURCE_CHOICES:
+            bump_data_version(source)
+        report("Rebuilt rollups")
+
+        for document in DOCUMENTS.values():
+            get_backend().rebuild(document)
+        report("Rebuilt search index")
+
+    return {'managers': managers, 'providers': providers, 'services': services,
+            'customers': customers, 'orders': orders, 'jobs': jobs}
@@ -0,0 +1,147 @@
+"""stat_analysis.exports.py
+
+This module exports the Orders and Jobs behind a report as CSV or
+NDJSON.
+
+The rows are read with server-side chunked iteration and every
+output line is yielded as soon as it is formatted, so the memory
+needed does not depend on the number of exported rows. The services
+of the orders are fetched with one query per chunk of orders. The
+reporting range is resolved with `get_report_range`, i.e. the same
+way the statistics are computed. The rows are read from the
+`REPORTS_READ_DATABASE`, see `stat_analysis.routers`.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from core.models import Order
+from execution.models import Job
+from stat_analysis.aggregation import manager_display_name
+from stat_analysis.routers import iterate_analytics
+from stat_analysis.stat_utils import get_report_range
+
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+CHUNK_SIZE = 2000
+
+ORDER_FIELDS = ['id', 'created_at', 'customer_id', 'customer', 'account_manager', 'job_id',
+                'services', 'providers', 'total_value']
+JOB_FIELDS = ['id', 'job_id', 'job_name', 'state', 'job_type', 'starting_date', 'end_date', 'completion_time']
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def export_orders(start_date, end_date, chunk_size=CHUNK_SIZE):
+    """Yield one dict per Order created in [start_date, end_date) with its services."""
+    orders = (
+        Order.objects
+        .filter(created_at__gte=start_date, created_at__lt=end_date)
+        .order_by('pk')
+        .values_list('pk', 'created_at', 'customer_id', 'customer__name', 'account_manager__user__first_name',
+                     'account_manager__user__last_name', 'account_manager__user__username', 'job__job_id',
+                     'total_value')
+    )
+    OrderServices = Order.services.through
+    for chunk in _chunks(orders.iterator(chunk_size=chunk_size), chunk_size):
+        services = {}
+        service_rows = (
+            OrderServices.objects
+            .filter(order_id__in=[row[0] for row in chunk])
+            .order_by('order_id', 'service_id')
+            .values_list('order_id', 'service_id', 'service__name', 'service__price', 'service__provider__name')
+        )
+        for order_id, service_id, name, price, provider in service_rows:
+            services.setdefault(order_id, []).append(
+                {'id': service_id, 'name': name, 'price': price, 'provider': provider}
+            )
+
+        for pk, created_at, customer_id, customer, first_name, last_name, username, job_id, total_value in chunk:
+            yield {
+                'id': pk,
+                'created_at': created_at,
+                'customer_id': customer_id,
+                'customer': customer,
+                'account_manager': manager_display_name(first_name, last_name, username),
+                'job_id': job_id,
+                'services': services.get(pk, []),
+                'total_value': total_value,
+            }
+
+
+def export_jobs(start_date, end_date, chunk_size=CHUNK_SIZE):
+    """Yield one dict per Job starting and ending in [start_date, end_date)."""
+    jobs = (
+        Job.objects
+        .filter(starting_date__gte=start_date, end_date__lt=end_date)
+        .order_by('pk')
+        .values(*JOB_FIELDS)
+    )
+    yield from jobs.iterator(chunk_size=chunk_size)
+
+
+EXPORTS = {
+    'orders': (export_orders, ORDER_FIELDS),
+    'jobs': (export_jobs, JOB_FIELDS),
+}
+
+
+class Echo:
+    """File-like object returning what is written, for `csv.writer`."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(row, field):
+    if field == 'services':
+        return '; '.join(f"{service['name']} ({service['provider']})" for service in row['services'])
+    if field == 'providers':
+        return '; '.join(sorted({service['provider'] for service in row['services']}))
+    value = row[field]
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def format_csv(rows, fields):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([_csv_value(row, field) for field in fields])
+
+
+def format_ndjson(rows, fields):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+FORMATTERS = {
+    'csv': format_csv,
+    'ndjson': format_ndjson,
+}
+
+
+def export_report_data(kind, export_format, quarter_from, year_from, quarter_to, year_to, chunk_size=CHUNK_SIZE):
+    """Yield the lines of the `kind` ('orders' or 'jobs') export of a reporting range."""
+    if kind not in EXPORTS:
+        raise ValueError(f"Unknown export '{kind}', use one of: {', '.join(EXPORTS)}.")
+    if export_format not in FORMATTERS:
+        raise ValueError(f"Unknown format '{export_format}', use one of: {', '.join(FORMATTERS)}.")
+
+    start_date, end_date = get_report_range(quarter_from, year_from, quarter_to, year_to)
+    export, fields = EXPORTS[kind]
+    return FORMATTERS[export_format](iterate_analytics(export(start_date, end_date, chunk_size)), fields)
+
+
+def export_filename(report, kind, export_format):
+    return (f"{kind}_{report.quarter_from}_{report.year_from}_{report.quarter_to}_{report.year_to}"
+            f".{export_format}")
@@ -0,0 +1,285 @@
+"""stat_analysis.fanout.py
+
+This module computes the statistics of a multi-quarter range in parallel.
+
+The range is split into its quarters and a pool of worker processes,
+each with its own database connection, computes the partial aggregates
+of one quarter at a time: counts, sums, the (sum, count) pairs behind
+the averages, the tallies per provider, account manager and customer
+and the completion time sketches. The partials are merged in quarter
+order, so the result does not depend on which worker finished first,
+and turned into the same statistics `stat_analysis.aggregation`
+computes with one scan of the whole range.
+
+A Job belongs to the quarter it starts in and is only counted when it
+ends before the end of the whole range, as in the single scan.
+
+SQLite sums the order values as floats and returns them with 15
+significant digits. The sums of single quarters are small enough to
+be rounded back to exact cents, so the merged revenue is exact even
+where the sum over a long range is not.
+
+The workers are forked from a single-threaded calling process, e.g.
+a management command, for every fanout. A fork copies the locks other
+threads hold at that moment, e.g. of logging or of their database
+connections, into the child, where nobody releases them. From the
+threads of the report worker, the recomputation or a web server the
+workers are therefore spawned as fresh interpreters, which set up
+Django, and that takes seconds. They are spawned once per process: the
+pool is kept and shared by all its threads, and its workers keep
+their database connections between quarters. Spawned workers cannot
+see an in-memory database, e.g. of the tests, nor can an open
+transaction be carried over to the workers, so in both cases the
+quarters are computed one after another in the calling process.
+"""
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from decimal import Decimal
+from functools import partial
+
+import django
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models import Count, Q, Sum
+
+from core.models import AccountManager, Customer, Order
+from execution.models import Job
+from stat_analysis.aggregation import aggregate_manager_totals, job_distribution_stats
+from stat_analysis.routers import analytics_reads, primary_reads
+from stat_analysis.sketches import QuantileSketch, bucket_expression
+from stat_analysis.stat_utils import get_quarter_bounds
+
+
+# Decimal places of `Order.total_value`
+CENTS = Decimal('0.01')
+
+# The pools of spawned worker processes of this process by their number of workers
+_spawned_pools = {}
+_spawned_pools_lock = threading.Lock()
+
+
+def quarter_partial(quarter, range_end):
+    """Partial aggregates of the rows of `quarter`, counting the jobs ending before `range_end`."""
+    start_date, end_date = get_quarter_bounds(quarter)
+    orders = Order.objects.filter(created_at__gte=start_date, created_at__lt=end_date)
+    jobs = Job.objects.filter(starting_date__gte=start_date, starting_date__lt=end_date, end_date__lt=range_end)
+
+    order_totals = orders.aggregate(count=Count('pk'), revenue=Sum('total_value'))
+    # An order is counted once per provider, even with several services of that provider
+    provider_rows = (
+        Order.services.through.objects
+        .filter(order__in=orders.values('pk'))
+        .values('service__provider__name')
+        .annotate(num_orders=Count('order', distinct=True))
+        .order_by()
+    )
+
+    job_types = [job_type for job_type, _ in Job.JOB_TYPE_CHOICES]
+    job_totals = jobs.aggregate(
+        count=Count('pk'),
+        **{f'sum_{job_type}': Sum('completion_time', filter=Q(job_type=job_type)) for job_type in job_types},
+        **{f'count_{job_type}': Count('completion_time', filter=Q(job_type=job_type)) for job_type in job_types},
+        **{f'num_{state}': Count('pk', filter=Q(state=state)) for state, _ in Job.STATE_CHOICES},
+    )
+    bucket_rows = (
+        jobs
+        .annotate(bucket=bucket_expression('completion_time'))
+        .values_list('job_type', 'bucket')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+    sketches = {}
+    for job_type, bucket, count in bucket_rows:
+        sketches.setdefault(job_type, QuantileSketch()).merge(QuantileSketch.from_bucket_rows([(bucket, count)]))
+
+    managers = aggregate_manager_totals(orders)
+    for totals in managers.values():
+        totals['revenue'] = totals['revenue'].quantize(CENTS)
+
+    return {
+        'total_orders': order_totals['count'],
+        'total_revenue': (order_totals['revenue'] or Decimal('0.00')).quantize(CENTS),
+        'providers': {row['service__provider__name']: row['num_orders'] for row in provider_rows},
+        'managers': managers,
+        'customers': set(orders.values_list('customer', flat=True).distinct()),
+        'new_customers': Customer.objects.filter(created_at__gte=start_date, created_at__lt=end_date).count(),
+        'total_jobs': job_totals['count'],
+        'states': {state: job_totals[f'num_{state}'] for state, _ in Job.STATE_CHOICES},
+        'completion_times': {job_type: (job_totals[f'sum_{job_type}'] or 0.0, job_totals[f'count_{job_type}'])
+                             for job_type in job_types},
+        'sketches': {job_type: sketch.to_dict() for job_type, sketch in sketches.items()},
+    }
+
+
+def merge_partials(partials):
+    """Merge the partial aggregates of consecutive quarters, in the given order."""
+    merged = {
+        'total_orders': 0,
+        'total_revenue': Decimal('0.00'),
+        'providers': {},
+        'managers': {},
+        'customers': set(),
+        'new_customers': 0,
+        'total_jobs': 0,
+        'states': {},
+        'completion_times': {},
+        'sketches': {},
+    }
+    time_sums = {}
+    for part in partials:
+        for name in ['total_orders', 'total_revenue', 'new_customers', 'total_jobs']:
+            merged[name] += part[name]
+        for name, count in part['providers'].items():
+            merged['providers'][name] = merged['providers'].get(name, 0) + count
+        for name, totals in part['managers'].items():
+            merged_totals = merged['managers'].setdefault(name, {'num_orders': 0, 'revenue': Decimal('0.00')})
+            merged_totals['num_orders'] += totals['num_orders']
+            merged_totals['revenue'] += totals['revenue']
+        merged['customers'] |= part['customers']
+        for state, count in part['states'].items():
+            merged['states'][state] = merged['states'].get(state, 0) + count
+        for job_type, (time_sum, time_count) in part['completion_times'].items():
+            sums, count = time_sums.get(job_type, ([], 0))
+            time_sums[job_type] = (sums + [time_sum], count + time_count)
+        for job_type, buckets in part['sketches'].items():
+            merged['sketches'][job_type] = (
+                QuantileSketch(merged['sketches'].get(job_type)).merge(QuantileSketch(buckets)).to_dict()
+            )
+    # Correctly rounded, independent of how the float sums are grouped
+    merged['completion_times'] = {job_type: (math.fsum(sums), count)
+                                  for job_type, (sums, count) in time_sums.items()}
+    return merged
+
+
+def partial_stats(merged):
+    """The job, order and user statistics and the manager totals of merged partial aggregates."""
+    total_orders = merged['total_orders']
+    total_revenue = merged['total_revenue']
+    if total_orders > 0:
+        average_order_value = total_revenue / total_orders
+    else:
+        average_order_value = Decimal('0.00')
+    managers = merged['managers']
+
+    avg_times = {job_type: time_sum / time_count
+                 for job_type, (time_sum, time_count) in merged['completion_times'].items() if time_count}
+
+    customers_with_orders = len(merged['customers'])
+    manager_performance = sorted(
+        ((name, float(totals['revenue'])) for name, totals in managers.items()),
+        key=lambda item: (-item[1], item[0])
+    )
+
+    return {
+        'managers': managers,
+        'jobs': {
+            'total_jobs': merged['total_jobs'],
+            'avg_completion_time_regular': avg_times.get('regular'),
+            'avg_completion_time_wafer_run': avg_times.get('wafer_run'),
+            'num_created': merged['states'].get('created', 0),
+            'num_active': merged['states'].get('active', 0),
+            'num_completed': merged['states'].get('completed', 0),
+            **job_distribution_stats({job_type: QuantileSketch(buckets)
+                                      for job_type, buckets in merged['sketches'].items()}),
+        },
+        'orders': {
+            'total_orders': total_orders,
+            'total_revenue': total_revenue,
+            'average_order_value': average_order_value,
+            'orders_per_service_provider': merged['providers'],
+            'orders_per_account_manager': {name: totals['num_orders'] for name, totals in managers.items()},
+        },
+        'users': {
+            'total_customers': Customer.objects.count(),
+            'new_customers': merged['new_customers'],
+            'total_account_managers': AccountManager.objects.count(),
+            'customers_with_orders': customers_with_orders,
+            'avg_orders_per_customer': total_orders / customers_with_orders if customers_with_orders else 0.0,
+            'top_performing_managers': dict(manager_performance[:5]),
+        },
+    }
+
+
+def _compute_partial(quarter, range_end, read_primary, databases):
+    # Runs in a worker process, which connects on its first query. A spawned worker reads the database
+    # names from the settings module, while the caller may have switched to others, e.g. test databases.
+    for alias, name in databases.items():
+        if connections[alias].settings_dict['NAME'] != name:
+            connections[alias].close()
+            connections[alias].settings_dict['NAME'] = name
+    # The connections of a spawned worker are kept between quarters
+    close_old_connections()
+    with primary_reads() if read_primary else analytics_reads():
+        return quarter_partial(quarter, range_end)
+
+
+def spawned_pool(workers):
+    """The pool of `workers` spawned worker processes of this process.
+
+    The pool is started on first use and shared by all threads, so
+    Django is set up once per worker and not once per fanout.
+    """
+    with _spawned_pools_lock:
+        pool = _spawned_pools.get(workers)
+        if pool is None:
+            pool = _spawned_pools[workers] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+            )
+        return pool
+
+
+def _map_spawned(compute, quarters, workers):
+    pool = spawned_pool(workers)
+    try:
+        return list(pool.map(compute, quarters))
+    except BrokenProcessPool:
+        # A worker died, the next fanout starts a new pool
+        with _spawned_pools_lock:
+            if _spawned_pools.get(workers) is pool:
+                del _spawned_pools[workers]
+        raise
+
+
+def fanout_stats(first_quarter, last_quarter, workers=None, read_primary=False):
+    """Compute the statistics of the quarter range with `workers` processes.
+
+    `workers` defaults to the `REPORTS_FANOUT_WORKERS` setting. The rows
+    are read from the `REPORTS_READ_DATABASE`, or from the primary with
+    `read_primary`. Returns a dict with the 'jobs', 'orders' and 'users'
+    statistics and the 'managers' totals.
+    """
+    if workers is None:
+        workers = getattr(settings, 'REPORTS_FANOUT_WORKERS', 1)
+    quarters = range(first_quarter, last_quarter + 1)
+    range_end = get_quarter_bounds(last_quarter)[1]
+    databases = {alias: connections[alias].settings_dict['NAME'] for alias in connections}
+    compute = partial(_compute_partial, range_end=range_end, read_primary=read_primary, databases=databases)
+
+    in_transaction = any(connection.in_atomic_block for connection in connections.all(initialized_only=True))
+    forked = threading.active_count() == 1
+    in_memory = any(connections[alias].vendor == 'sqlite' and connections[alias].is_in_memory_db()
+                    for alias in connections)
+    if workers <= 1 or len(quarters) <= 1 or in_transaction or (in_memory and not forked):
+        with primary_reads() if read_primary else analytics_reads():
+            partials = [quarter_partial(quarter, range_end) for quarter in quarters]
+    elif forked:
+        # Forked processes must not share the connections of this one
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=min(workers, len(quarters)),
+                                 mp_context=multiprocessing.get_context('fork')) as pool:
+            partials = list(pool.map(compute, quarters))
+    else:
+        partials = _map_spawned(compute, quarters, workers)
+    return partial_stats(merge_partials(partials))
+
+
+def shutdown_spawned_pools():
+    """Stop the spawned worker processes of this process, e.g. before its databases are removed."""
+    with _spawned_pools_lock:
+        pools = list(_spawned_pools.values())
+        _spawned_pools.clear()
+    for pool in pools:
+        pool.shutdown()
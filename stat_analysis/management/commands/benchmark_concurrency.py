@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pitc_project.sqlite import PROFILES
+from stat_analysis.concurrency import run_concurrency_benchmark
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the SQLite profiles with parallel order entry and report computation "
+            "in a separate database file.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default=','.join(PROFILES),
+                            help=f"Comma separated profiles, of: {', '.join(PROFILES)}.")
+        parser.add_argument('--writers', type=int, default=4, help="Processes entering orders.")
+        parser.add_argument('--readers', type=int, default=2, help="Processes computing statistics.")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds per profile.")
+        parser.add_argument('--orders', type=int, default=20000, help="Orders and jobs generated up front.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'].split(',')
+        unknown = [profile for profile in profiles if profile not in PROFILES]
+        if unknown:
+            raise CommandError(f"Unknown profile(s) {', '.join(unknown)}, use one of: {', '.join(PROFILES)}.")
+        if options['writers'] < 0 or options['readers'] < 0 or options['writers'] + options['readers'] == 0:
+            raise CommandError("Run at least one writer or reader.")
+
+        results = run_concurrency_benchmark(
+            profiles, writers=options['writers'], readers=options['readers'], duration=options['duration'],
+            orders=options['orders'], seed=options['seed'], progress=self.stdout.write,
+        )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}.")
@@ -0,0 +1,29 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from stat_analysis.benchmarks import run_fanout_benchmark
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the fanout of a report range to forked and spawned worker processes against "
+            "the single scan of the range in a separate database file.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=20000, help="Orders and jobs generated up front.")
+        parser.add_argument('--workers', type=int, default=4, help="Worker processes of the fanout.")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement, the fastest is kept.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 2:
+            raise CommandError("--workers must be at least 2.")
+
+        results = run_fanout_benchmark(orders=options['orders'], workers=options['workers'],
+                                       repeat=options['repeat'], seed=options['seed'], progress=self.stdout.write)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}.")
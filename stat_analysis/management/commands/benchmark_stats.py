@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from stat_analysis.benchmarks import compare_results, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = "Benchmark the statistics calculators at several data volumes in a separate test database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='1000,10000,100000',
+                            help="Comma separated numbers of orders and jobs.")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement, the fastest is kept.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--rollups', action='store_true', help="Merge the statistics from the rollups.")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--baseline', help="Compare the results with this JSON file.")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed relative growth of wall time and memory.")
+
+    def handle(self, *args, **options):
+        try:
+            scales = [int(scale) for scale in options['scales'].split(',')]
+        except ValueError:
+            raise CommandError("--scales must be a comma separated list of integers.")
+
+        results = run_benchmarks(scales, use_rollups=options['rollups'], repeat=options['repeat'],
+                                 seed=options['seed'], progress=self.stdout.write)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}.")
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+            regressions = compare_results(results, baseline, tolerance=options['tolerance'])
+            for regression in regressions:
+                self.stderr.write(regression)
+            if regressions:
+                raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}.")
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
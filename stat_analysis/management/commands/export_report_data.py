@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from stat_analysis.exports import CHUNK_SIZE, EXPORTS, FORMATTERS, export_report_data
+from stat_analysis.models import Report
+
+
+class Command(BaseCommand):
+    help = "Stream the orders or jobs of a report's quarter range as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORTS))
+        range_group = parser.add_mutually_exclusive_group(required=True)
+        range_group.add_argument('--report', type=int, help="Export the range of the report with this id.")
+        range_group.add_argument('--range', nargs=4, metavar=('QUARTER_FROM', 'YEAR_FROM', 'QUARTER_TO', 'YEAR_TO'),
+                                 help="Export a quarter range, e.g. Q1 2024 Q4 2024.")
+        parser.add_argument('--format', dest='export_format', choices=list(FORMATTERS), default='csv')
+        parser.add_argument('--output', help="File to write to, default: stdout.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['report'] is not None:
+            try:
+                report = Report.objects.get(pk=options['report'])
+            except Report.DoesNotExist:
+                raise CommandError(f"Report {options['report']} does not exist.")
+            report_range = (report.quarter_from, report.year_from, report.quarter_to, report.year_to)
+        else:
+            quarter_from, year_from, quarter_to, year_to = options['range']
+            try:
+                report_range = (quarter_from, int(year_from), quarter_to, int(year_to))
+            except ValueError:
+                raise CommandError("Years must be numbers.")
+
+        try:
+            lines = export_report_data(options['kind'], options['export_format'], *report_range,
+                                       chunk_size=options['chunk_size'])
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from stat_analysis.datagen import generate_data
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate synthetic orders, jobs and customers for benchmarking the statistics."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=100000)
+        parser.add_argument('--jobs', type=int, default=100000)
+        parser.add_argument('--customers', type=int, default=10000)
+        parser.add_argument('--managers', type=int, default=1000)
+        parser.add_argument('--providers', type=int, default=1000)
+        parser.add_argument('--services', type=int, default=10000)
+        parser.add_argument('--max-services-per-order', type=int, default=4)
+        parser.add_argument('--year-from', type=int, default=2020)
+        parser.add_argument('--year-to', type=int, default=2025)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--prefix', default='G', help="Prefix of generated names and job ids.")
+
+    def handle(self, *args, **options):
+        counts = generate_data(
+            orders=options['orders'],
+            jobs=options['jobs'],
+            customers=options['customers'],
+            managers=options['managers'],
+            providers=options['providers'],
+            services=options['services'],
+            max_services_per_order=options['max_services_per_order'],
+            year_from=options['year_from'],
+            year_to=options['year_to'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            progress=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        summary = ', '.join(f"{count} {name}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Generated {summary}."))
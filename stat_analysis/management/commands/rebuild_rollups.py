@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from stat_analysis.models import JobRollup, OrderCustomerRollup, OrderManagerRollup
+from stat_analysis.rollups import rebuild_rollups, verify_rollups
+
+
+class Command(BaseCommand):
+    help = "Regenerate the per-quarter rollups from the raw orders, jobs and customers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help="Compare the rollups with the raw-scan statistics after the rebuild.")
+        parser.add_argument('--verify-only', action='store_true',
+                            help="Only compare the current rollups with the raw-scan statistics.")
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            rebuild_rollups()
+            self.stdout.write(self.style.SUCCESS("Rollups rebuilt."))
+
+        if options['verify'] or options['verify_only']:
+            quarters = set()
+            quarters.update(OrderManagerRollup.objects.values_list('quarter', flat=True))
+            quarters.update(OrderCustomerRollup.objects.values_list('quarter', flat=True))
+            quarters.update(JobRollup.objects.values_list('start_quarter', flat=True))
+            quarters.update(JobRollup.objects.values_list('end_quarter', flat=True))
+
+            mismatches = verify_rollups(sorted(quarters))
+            for (first_quarter, last_quarter), names in mismatches:
+                self.stderr.write(f"Quarters {first_quarter}-{last_quarter}: {', '.join(names)} differ")
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} range(s) differ from the raw data.")
+            self.stdout.write(self.style.SUCCESS(f"Rollups verified for {len(quarters)} quarter(s)."))
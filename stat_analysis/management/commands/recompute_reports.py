@@ -0,0 +1,80 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from stat_analysis.cache import bump_data_version
+from stat_analysis.models import DataVersion, Report
+from stat_analysis.recompute import Checkpoint, group_by_range, recompute_reports, select_reports
+from stat_analysis.stat_utils import get_report_quarters
+
+
+class Command(BaseCommand):
+    help = ("Recompute the statistics of the selected reports, each distinct quarter range once "
+            "and in parallel. An interrupted run resumes when started again with the same filters.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--range', nargs=4, metavar=('QUARTER_FROM', 'YEAR_FROM', 'QUARTER_TO', 'YEAR_TO'),
+                            help="Only reports overlapping this quarter range, e.g. Q1 2024 Q4 2024.")
+        parser.add_argument('--created-by', metavar='USERNAME', help="Only reports created by this user.")
+        parser.add_argument('--older-than', type=float, metavar='HOURS',
+                            help="Only reports not computed within the last HOURS hours.")
+        parser.add_argument('--status', action='append', choices=[status for status, _ in Report.STATUS_CHOICES],
+                            help="Only reports with this status, may be repeated.")
+        parser.add_argument('--workers', type=int, default=4, help="Number of threads computing ranges.")
+        parser.add_argument('--batch-size', type=int, default=100, help="Reports written per transaction.")
+        parser.add_argument('--checkpoint', default='recompute_reports.checkpoint',
+                            help="File recording the written reports for resuming.")
+        parser.add_argument('--invalidate', action='store_true',
+                            help="Do not reuse cached statistics, e.g. after a correction made directly "
+                                 "in the database.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the selected reports and ranges.")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError("The workers and the batch size must be at least 1.")
+        overlapping = None
+        if options['range']:
+            quarter_from, year_from, quarter_to, year_to = options['range']
+            try:
+                overlapping = get_report_quarters(quarter_from, int(year_from), quarter_to, int(year_to))
+            except ValueError as error:
+                raise CommandError(f"Invalid range: {error}")
+        computed_before = None
+        if options['older_than'] is not None:
+            computed_before = timezone.now() - datetime.timedelta(hours=options['older_than'])
+
+        reports = select_reports(overlapping=overlapping, created_by=options['created_by'],
+                                 computed_before=computed_before, statuses=options['status'])
+        if options['dry_run']:
+            self.stdout.write(f"Selected {len(reports)} report(s) over {len(group_by_range(reports))} range(s).")
+            return
+
+        selection = {name: options[name] for name in ['range', 'created_by', 'older_than', 'status']}
+        try:
+            checkpoint = Checkpoint(options['checkpoint'], selection)
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        if options['invalidate']:
+            for source, _ in DataVersion.SOURCE_CHOICES:
+                bump_data_version(source)
+
+        try:
+            totals = recompute_reports(reports, workers=options['workers'], batch_size=options['batch_size'],
+                                       checkpoint=checkpoint, progress=self.stdout.write)
+        except KeyboardInterrupt:
+            self.stdout.write(f"Interrupted after {len(checkpoint.done)} report(s), "
+                              f"run the command again to resume.")
+            return
+
+        seconds = totals['seconds']
+        summary = (f"Recomputed {totals['reports']} report(s) over {totals['ranges']} range(s) in {seconds:.1f}s "
+                   f"({totals['reports'] / seconds if seconds else 0:.1f} reports/s, "
+                   f"{totals['ranges'] / seconds if seconds else 0:.1f} ranges/s)")
+        if totals['skipped']:
+            summary += f", skipped {totals['skipped']} already recomputed"
+        if totals['failed']:
+            self.stdout.write(self.style.ERROR(f"{summary}, {totals['failed']} failed, see the report errors."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{summary}."))
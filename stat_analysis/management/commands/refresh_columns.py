@@ -0,0 +1,27 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from stat_analysis.columnar import ColumnStore
+
+
+class Command(BaseCommand):
+    help = ("Append the new orders, jobs and customers to the column store and reload the quarters of "
+            "changed ones, building the store on the first run.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Load all rows again, e.g. after writes that bypass the model signals.")
+
+    def handle(self, *args, **options):
+        store = ColumnStore()
+        started = time.perf_counter()
+        try:
+            loaded = store.refresh(rebuild=options['rebuild'], progress=self.stdout.write)
+        except ImproperlyConfigured as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(
+            f"Column store refreshed in {time.perf_counter() - started:.1f}s: "
+            f"{sum(loaded.values())} row(s) loaded, {store.size() / 2 ** 20:.1f} MiB in {store.path}."
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from stat_analysis.worker import run_worker
+
+
+class Command(BaseCommand):
+    help = "Compute queued reports in a local thread pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help="Number of worker threads.")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to wait between polls of an empty queue.")
+        parser.add_argument('--stale-timeout', type=int, default=3600,
+                            help="Requeue tasks claimed longer than this many seconds ago.")
+        parser.add_argument('--once', action='store_true', help="Drain the queue and exit.")
+
+    def handle(self, *args, **options):
+        try:
+            processed = run_worker(
+                workers=options['workers'],
+                poll_interval=options['poll_interval'],
+                once=options['once'],
+                stale_timeout=options['stale_timeout'],
+            )
+        except KeyboardInterrupt:
+            self.stdout.write("Worker stopped.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} report(s)."))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from stat_analysis.routers import read_database
+
+
+class Command(BaseCommand):
+    help = ("Copy the default SQLite database to the SQLite file of the REPORTS_READ_DATABASE, "
+            "standing in for the replication to a read replica.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', help="Alias of the replica, the REPORTS_READ_DATABASE by default.")
+
+    def handle(self, *args, **options):
+        alias = options['database'] or read_database()
+        if alias == DEFAULT_DB_ALIAS:
+            raise CommandError("No replica configured, set REPORTS_READ_DATABASE or pass --database.")
+        if alias not in connections:
+            raise CommandError(f"Unknown database '{alias}'.")
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError("Only SQLite databases can be copied, use the replication of the database server.")
+
+        started = time.perf_counter()
+        primary.ensure_connection()
+        replica.ensure_connection()
+        # Online backup, consistent even while the primary is written to
+        primary.connection.backup(replica.connection)
+        self.stdout.write(self.style.SUCCESS(
+            f"Copied {primary.settings_dict['NAME']} to {replica.settings_dict['NAME']} "
+            f"in {time.perf_counter() - started:.1f}s."
+        ))
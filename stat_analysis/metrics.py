@@ -0,0 +1,333 @@
+"""stat_analysis.metrics.py
+
+This module holds the registry of report metrics and evaluates them.
+
+A Metric declares the source it is computed from ('orders', 'jobs' or
+'customers'), the fields of the source it reads and an accumulator
+class. An accumulator receives the field values of one row at a time
+and partial accumulators of disjoint rows, e.g. of two quarters, can
+be merged. Adding a statistic is a `register` call; its values are
+stored as MetricValue rows, so no migration is needed.
+
+`evaluate_metrics` plans the evaluation: the metrics are grouped by
+source, the union of their fields is fetched with one `values_list`
+query per source and every metric of the source is fed from the same
+streaming pass over its rows.
+
+The rows of a source in a reporting range are those of the job, order
+and user statistics: orders and customers created in the range and
+jobs starting in it and ending before its end. A report evaluates the
+quarters of its range separately and merges their accumulators with
+`merge_results`, so the partials of a quarter are shared by all
+reports including it.
+"""
+import hashlib
+
+from django.utils import timezone
+
+from core.models import Customer, Order
+from execution.models import Job
+
+
+# Rows fetched from the database at once
+CHUNK_SIZE = 2000
+
+
+# Accumulators
+
+class Accumulator:
+    """Mergeable state of a metric over the rows added so far.
+
+    `add` takes the values of the fields of the metric for one row.
+    NULL values are skipped, as by SQL aggregates.
+    """
+
+    def add(self, value):
+        raise NotImplementedError
+
+    def merge(self, other):
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+
+class Count(Accumulator):
+    def __init__(self):
+        self.count = 0
+
+    def add(self, value):
+        if value is not None:
+            self.count += 1
+
+    def merge(self, other):
+        self.count += other.count
+
+    def result(self):
+        return self.count
+
+
+class Sum(Accumulator):
+    def __init__(self):
+        self.total = None
+
+    def add(self, value):
+        if value is not None:
+            self.total = value if self.total is None else self.total + value
+
+    def merge(self, other):
+        if other.total is not None:
+            self.add(other.total)
+
+    def result(self):
+        return self.total
+
+
+class Mean(Accumulator):
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+
+    def add(self, value):
+        if value is not None:
+            self.total += value
+            self.count += 1
+
+    def merge(self, other):
+        self.total += other.total
+        self.count += other.count
+
+    def result(self):
+        return self.total / self.count if self.count else None
+
+
+class Minimum(Accumulator):
+    def __init__(self):
+        self.value = None
+
+    def add(self, value):
+        if value is not None and (self.value is None or value < self.value):
+            self.value = value
+
+    def merge(self, other):
+        self.add(other.value)
+
+    def result(self):
+        return self.value
+
+
+class Maximum(Accumulator):
+    def __init__(self):
+        self.value = None
+
+    def add(self, value):
+        if value is not None and (self.value is None or value > self.value):
+            self.value = value
+
+    def merge(self, other):
+        self.add(other.value)
+
+    def result(self):
+        return self.value
+
+
+class CountDistinct(Accumulator):
+    def __init__(self):
+        self.values = set()
+
+    def add(self, value):
+        if value is not None:
+            self.values.add(value)
+
+    def merge(self, other):
+        self.values |= other.values
+
+    def result(self):
+        return len(self.values)
+
+
+class Tally(Accumulator):
+    """Number of rows per value."""
+
+    def __init__(self):
+        self.counts = {}
+
+    def add(self, value):
+        if value is not None:
+            self.counts[value] = self.counts.get(value, 0) + 1
+
+    def merge(self, other):
+        for value, count in other.counts.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+
+    def result(self):
+        return dict(sorted(self.counts.items()))
+
+
+# Registry
+
+def order_rows(start_date, end_date, range_end):
+    return Order.objects.filter(created_at__gte=start_date, created_at__lt=end_date)
+
+
+def job_rows(start_date, end_date, range_end):
+    return Job.objects.filter(starting_date__gte=start_date, starting_date__lt=end_date, end_date__lt=range_end)
+
+
+def customer_rows(start_date, end_date, range_end):
+    return Customer.objects.filter(created_at__gte=start_date, created_at__lt=end_date)
+
+
+# Rows of each source in a part of a reporting range ending at `range_end`
+SOURCES = {
+    'orders': order_rows,
+    'jobs': job_rows,
+    'customers': customer_rows,
+}
+
+
+class Metric:
+    """A statistic computed by an `accumulator` class from the `fields` of the rows of `source`.
+
+    The accumulator gets the value of the only field, or with `value`
+    the result of calling it with the values of all fields.
+    """
+
+    def __init__(self, name, source, fields, accumulator, value=None, description=''):
+        if source not in SOURCES:
+            raise ValueError(f"Unknown source {source!r}, expected one of {', '.join(SOURCES)}.")
+        if value is None and len(fields) != 1:
+            raise ValueError(f"Metric {name} reads several fields and needs a value function.")
+        self.name = name
+        self.source = source
+        self.fields = list(fields)
+        self.accumulator = accumulator
+        self.value = value
+        self.description = description
+
+    def __repr__(self):
+        return f"<Metric {self.name}>"
+
+
+METRICS = {}
+
+
+def register(name, source, fields, accumulator, value=None, description=''):
+    """Add a metric to the registry, replacing one of the same name. Returns the Metric."""
+    metric = Metric(name, source, fields, accumulator, value=value, description=description)
+    METRICS[name] = metric
+    return metric
+
+
+def get_metrics(names=None):
+    """The registered metrics with `names`, all of them by default, in the order of registration."""
+    if names is None:
+        return list(METRICS.values())
+    unknown = set(names) - set(METRICS)
+    if unknown:
+        raise KeyError(f"Unknown metric(s): {', '.join(sorted(unknown))}")
+    return [metric for name, metric in METRICS.items() if name in names]
+
+
+def qualified_name(function):
+    return f"{function.__module__}.{function.__qualname__}"
+
+
+def metrics_key(metrics):
+    """Short digest of the definitions of `metrics`, part of the cache key of their values.
+
+    A metric registered again under its name with other fields, another
+    accumulator or value function gets a new key.
+    """
+    definitions = [
+        (metric.name, metric.source, metric.fields, qualified_name(metric.accumulator),
+         qualified_name(metric.value) if metric.value else None)
+        for metric in metrics
+    ]
+    return hashlib.md5(repr(definitions).encode()).hexdigest()[:12]
+
+
+# Evaluation
+
+def plan(metrics):
+    """Group `metrics` by source with the union of the fields they read.
+
+    Returns a list of (source, fields, metrics) with every field once.
+    """
+    groups = {}
+    for metric in metrics:
+        fields, source_metrics = groups.setdefault(metric.source, ([], []))
+        fields.extend(field for field in metric.fields if field not in fields)
+        source_metrics.append(metric)
+    return [(source, fields, source_metrics) for source, (fields, source_metrics) in groups.items()]
+
+
+def evaluate(metrics, start_date, end_date, range_end=None):
+    """Feed the rows of the range to new accumulators of `metrics`, one pass per source.
+
+    The range may be part of a reporting range ending at `range_end`,
+    which the jobs must end before. Returns the accumulators by metric
+    name, which can be merged with those of other rows.
+    """
+    accumulators = {}
+    for source, fields, source_metrics in plan(metrics):
+        rows = SOURCES[source]
+        # Per metric its accumulator, the position of its fields in a row and its value function
+        feeds = []
+        for metric in source_metrics:
+            accumulator = accumulators[metric.name] = metric.accumulator()
+            feeds.append((accumulator.add, [fields.index(field) for field in metric.fields], metric.value))
+
+        queryset = rows(start_date, end_date, range_end or end_date).order_by().values_list(*fields)
+        for row in queryset.iterator(chunk_size=CHUNK_SIZE):
+            for add, positions, value in feeds:
+                if value is None:
+                    add(row[positions[0]])
+                else:
+                    add(value(*[row[position] for position in positions]))
+    return accumulators
+
+
+def merge_results(metrics, partials):
+    """The values of `metrics` from the accumulators of disjoint rows, merged in the given order."""
+    totals = {metric.name: metric.accumulator() for metric in metrics}
+    for accumulators in partials:
+        for name, accumulator in accumulators.items():
+            totals[name].merge(accumulator)
+    return {name: accumulator.result() for name, accumulator in totals.items()}
+
+
+def evaluate_metrics(start_date, end_date, names=None):
+    """The values of the registered metrics, or of those with `names`, over the range."""
+    accumulators = evaluate(get_metrics(names), start_date, end_date)
+    return {name: accumulator.result() for name, accumulator in accumulators.items()}
+
+
+# Metrics
+
+def weekday(moment):
+    return timezone.localtime(moment).strftime('%A')
+
+
+def month(moment):
+    return timezone.localtime(moment).strftime('%Y-%m')
+
+
+def days_between(start, end):
+    return (end - start).total_seconds() / (24 * 60 * 60)
+
+
+register('largest_order_value', 'orders', ['total_value'], Maximum,
+         description="Value of the largest order")
+register('average_services_per_order', 'orders', ['service_count'], Mean,
+         description="Average number of services of an order")
+register('orders_per_weekday', 'orders', ['created_at'], Tally, value=weekday,
+         description="Number of orders per weekday they were placed on")
+register('jobs_per_type', 'jobs', ['job_type'], Tally,
+         description="Number of jobs per job type")
+register('longest_completion_time', 'jobs', ['completion_time'], Maximum,
+         description="Longest completion time of a job in days")
+register('average_job_duration', 'jobs', ['starting_date', 'end_date'], Mean, value=days_between,
+         description="Average days from the start to the end date of a job")
+register('new_customers_per_month', 'customers', ['created_at'], Tally, value=month,
+         description="Number of new customers per month")
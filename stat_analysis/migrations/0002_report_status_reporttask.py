@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:57
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def mark_existing_reports_done(apps, schema_editor):
+    # Reports created before the worker existed were computed synchronously
+    Report = apps.get_model('stat_analysis', 'Report')
+    Report.objects.update(status='done', progress=100)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stat_analysis', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='error',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Computation progress in percent'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='started_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', editable=False, max_length=10),
+        ),
+        migrations.RunPython(mark_existing_reports_done, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='ReportTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to='stat_analysis.report')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+            },
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_empty_rollups_valid(apps, schema_editor):
+    # Without data the empty rollups are exact, otherwise `manage.py rebuild_rollups` has to run first
+    has_data = any(
+        apps.get_model(app_label, model_name).objects.exists()
+        for app_label, model_name in [('core', 'Order'), ('core', 'Customer'), ('execution', 'Job')]
+    )
+    if not has_data:
+        apps.get_model('stat_analysis', 'RollupState').objects.create(pk=1, is_valid=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('execution', '0001_initial'),
+        ('stat_analysis', '0002_report_status_reporttask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quarter', models.IntegerField(unique=True)),
+                ('new_customers', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_valid', models.BooleanField(default=False)),
+                ('rebuilt_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='JobRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_quarter', models.IntegerField()),
+                ('end_quarter', models.IntegerField()),
+                ('job_type', models.CharField(max_length=20)),
+                ('state', models.CharField(max_length=100)),
+                ('job_count', models.IntegerField(default=0)),
+                ('completion_time_sum', models.FloatField(default=0.0)),
+                ('completion_time_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('start_quarter', 'end_quarter', 'job_type', 'state'), name='unique_job_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderCustomerRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quarter', models.IntegerField()),
+                ('order_count', models.IntegerField(default=0)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.customer')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('quarter', 'customer'), name='unique_order_customer_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderManagerRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quarter', models.IntegerField()),
+                ('order_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('account_manager', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.accountmanager')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('quarter', 'account_manager'), name='unique_order_manager_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderProviderRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quarter', models.IntegerField()),
+                ('order_count', models.IntegerField(default=0)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.serviceprovider')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('quarter', 'provider'), name='unique_order_provider_rollup')],
+            },
+        ),
+        migrations.RunPython(mark_empty_rollups_valid, migrations.RunPython.noop),
+    ]
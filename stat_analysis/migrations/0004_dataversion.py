@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:02
+
+import stat_analysis.models.versions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stat_analysis', '0003_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('orders', 'Orders'), ('jobs', 'Jobs'), ('customers', 'Customers')], max_length=20, unique=True)),
+                ('version', models.CharField(default=stat_analysis.models.versions.new_version, max_length=32)),
+            ],
+        ),
+    ]
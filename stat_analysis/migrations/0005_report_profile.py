@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stat_analysis', '0004_dataversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='profile',
+            field=models.JSONField(blank=True, editable=False, help_text='Wall time, queries, SQL time and rows fetched per computation stage', null=True),
+        ),
+    ]
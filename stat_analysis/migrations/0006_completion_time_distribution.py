@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:05
+
+from django.db import migrations, models
+
+
+def invalidate_job_rollups(apps, schema_editor):
+    # Existing job rollups have no sketches yet, `manage.py rebuild_rollups` fills them
+    if apps.get_model('stat_analysis', 'JobRollup').objects.exists():
+        apps.get_model('stat_analysis', 'RollupState').objects.update(is_valid=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stat_analysis', '0005_report_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobreportresult',
+            name='completion_time_histogram',
+            field=models.JSONField(blank=True, help_text='Number of jobs per completion time range (days) and job type', null=True),
+        ),
+        migrations.AddField(
+            model_name='jobreportresult',
+            name='median_completion_time_regular',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='jobreportresult',
+            name='median_completion_time_wafer_run',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='jobreportresult',
+            name='p90_completion_time_regular',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='jobreportresult',
+            name='p90_completion_time_wafer_run',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='jobreportresult',
+            name='p99_completion_time_regular',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='jobreportresult',
+            name='p99_completion_time_wafer_run',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='jobrollup',
+            name='completion_time_sketch',
+            field=models.JSONField(default=dict, help_text='Bucket counts of a QuantileSketch'),
+        ),
+        migrations.RunPython(invalidate_job_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stat_analysis', '0006_completion_time_distribution'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['quarter_from', 'year_from', 'quarter_to', 'year_to'], name='report_range_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stat_analysis', '0007_report_range_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
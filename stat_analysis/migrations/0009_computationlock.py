@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stat_analysis', '0008_report_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComputationLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=200, unique=True)),
+                ('owner', models.CharField(max_length=32)),
+                ('acquired_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:20
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stat_analysis', '0009_computationlock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('value', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metric_values', to='stat_analysis.report')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('report', 'name'), name='metric_value_report_name_unique')],
+            },
+        ),
+    ]
@@ -9,7 +9,29 @@ The Report model defines the reporting range.
 Each Report has results of statistical analysis,
 i.e. statistics of orders and jobs, which are stored in
 OrderReportResult and JobReportResult models.
+
+Reports waiting to be computed in the background are queued
+as ReportTask instances.
+
+The *Rollup models hold per-quarter tallies from which the
+statistics of whole quarters are merged.
+
+DataVersion tracks changes of the source data for the report
+result cache.
+
+ComputationLock rows are the advisory locks coalescing concurrent
+computations of the same statistics.
+
+MetricValue rows hold the values of the registered metrics of a
+Report, see `stat_analysis.metrics`.
 """
 
 from .report import Report
-from .statistics import JobReportResult, OrderReportResult, UserReportResult
\ No newline at end of file
+from .statistics import JobReportResult, OrderReportResult, UserReportResult
+from .tasks import ReportTask
+from .rollups import (
+    OrderManagerRollup, OrderProviderRollup, OrderCustomerRollup, JobRollup, CustomerRollup, RollupState
+)
+from .versions import DataVersion
+from .locks import ComputationLock
+from .metrics import MetricValue
@@ -0,0 +1,21 @@
+"""stat_analysis.models.locks.py
+
+"""
+from django.db import models
+from django.utils import timezone
+
+
+class ComputationLock(models.Model):
+    """Advisory lock held while the row of its key exists, see `stat_analysis.singleflight`.
+
+    The key is unique, so of concurrent inserts of the same key exactly
+    one succeeds, also across processes. A lock past `expires_at` was
+    left behind by a dead holder and may be taken over.
+    """
+    key = models.CharField(max_length=200, unique=True)
+    owner = models.CharField(max_length=32)
+    acquired_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.key
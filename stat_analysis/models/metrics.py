@@ -0,0 +1,25 @@
+"""stat_analysis.models.metrics.py
+
+"""
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+from .report import Report
+
+
+class MetricValue(models.Model):
+    """Value of a registered metric for a Report, see `stat_analysis.metrics`.
+
+    One row per report and metric, so a new metric needs no migration.
+    """
+    report = models.ForeignKey(Report, on_delete=models.CASCADE, related_name='metric_values')
+    name = models.CharField(max_length=100)
+    value = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['report', 'name'], name='metric_value_report_name_unique'),
+        ]
@@ -1,14 +1,29 @@
 """stat_analysis.models.report.py
 
 """
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
 
 
 class Report(models.Model):
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
     # metadata
     title = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also set by the queryset updates of the worker and the pipeline, validator of the API responses
+    updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
 
     # Report settings 
@@ -20,18 +35,74 @@ class Report(models.Model):
     # PDF report attachment
     pdf_report = models.FileField(upload_to='reports/', null=True, blank=True)
 
+    # Computation lifecycle, maintained by the report worker
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, editable=False)
+    progress = models.PositiveSmallIntegerField(default=0, editable=False, help_text="Computation progress in percent")
+    started_at = models.DateTimeField(null=True, blank=True, editable=False)
+    finished_at = models.DateTimeField(null=True, blank=True, editable=False)
+    error = models.TextField(blank=True, editable=False)
+    profile = models.JSONField(null=True, blank=True, editable=False,
+                               help_text="Wall time, queries, SQL time and rows fetched per computation stage")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['quarter_from', 'year_from', 'quarter_to', 'year_to'], name='report_range_idx'),
+        ]
+
+    # Fields the statistics depend on
+    RANGE_FIELDS = ('quarter_from', 'year_from', 'quarter_to', 'year_to')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_range = instance.get_range()
+        return instance
+
+    def get_range(self):
+        return tuple(self.__dict__.get(field) for field in self.RANGE_FIELDS)
+
+    def range_has_changed(self):
+        """Whether a range field was modified since the report was loaded or last saved."""
+        return getattr(self, '_loaded_range', None) != self.get_range()
+
     def __str__(self):
         return f"{self.title} ({self.quarter_from}/{self.year_from} - {self.quarter_to}/{self.year_to})"
 
     def save(self, *args, **kwargs):
-        """Override save to trigger statistics calculation on creation/update"""
-        is_new = self.pk is None
+        """Override save to trigger statistics calculation on creation/update
+
+        The statistics are only calculated for new reports, when a
+        range field changed or when the last calculation failed, i.e.
+        not when only the title or the PDF changed.
+
+        By default the calculation is queued for the report worker
+        (`manage.py run_report_worker`) and save returns immediately.
+        """
+        update_fields = kwargs.get('update_fields')
+        needs_stats = (
+            self._state.adding
+            or self.status == self.STATUS_FAILED
+            or self.range_has_changed() and (update_fields is None or set(self.RANGE_FIELDS) & set(update_fields))
+        )
         super().save(*args, **kwargs)
+        self._loaded_range = self.get_range()
+
+        if needs_stats:
+            self.compute_statistics()
+
+    def compute_statistics(self):
+        """Queue the calculation of the statistics, or run it in the foreground.
 
+        Returns whether the calculation was queued.
+        """
         # Import here to avoid circular import
-        from stat_analysis.stat_utils import calculate_job_stats, calculate_order_stats, calculate_user_stats
+        from stat_analysis.pipeline import ReportPipeline
+        from stat_analysis.worker import enqueue_report
 
-        # Calculate statistics for this report
-        calculate_job_stats(self.quarter_from, self.year_from, self.quarter_to, self.year_to, self.created_by)
-        calculate_order_stats(self.quarter_from, self.year_from, self.quarter_to, self.year_to, self.created_by)
-        calculate_user_stats(self.quarter_from, self.year_from, self.quarter_to, self.year_to, self.created_by)
\ No newline at end of file
+        if getattr(settings, 'REPORTS_COMPUTE_IN_BACKGROUND', True):
+            enqueue_report(self)
+            return True
+        # Calculate all statistics for this report in one transaction, including
+        # the data just written, which the replica may not have yet
+        ReportPipeline(self, read_primary=True).run()
+        return False
@@ -0,0 +1,87 @@
+"""stat_analysis.models.rollups.py
+
+Per-quarter tallies of Orders, Jobs and Customers.
+
+Quarters are stored as consecutive indices (`year * 4 + quarter - 1`),
+see `stat_analysis.stat_utils.get_quarter_index`. The tallies are
+kept up to date by the signal receivers in `stat_analysis.signals`
+and can be regenerated with `manage.py rebuild_rollups`.
+"""
+from django.db import models
+
+from core.models import AccountManager, Customer, ServiceProvider
+
+
+class OrderManagerRollup(models.Model):
+    """Number and value of the orders of an account manager in a quarter."""
+    quarter = models.IntegerField()
+    account_manager = models.ForeignKey(AccountManager, on_delete=models.CASCADE, related_name='+')
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['quarter', 'account_manager'], name='unique_order_manager_rollup'),
+        ]
+
+
+class OrderProviderRollup(models.Model):
+    """Number of orders in a quarter with at least one service of a provider."""
+    quarter = models.IntegerField()
+    provider = models.ForeignKey(ServiceProvider, on_delete=models.CASCADE, related_name='+')
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['quarter', 'provider'], name='unique_order_provider_rollup'),
+        ]
+
+
+class OrderCustomerRollup(models.Model):
+    """Number of orders of a customer in a quarter."""
+    quarter = models.IntegerField()
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='+')
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['quarter', 'customer'], name='unique_order_customer_rollup'),
+        ]
+
+
+class JobRollup(models.Model):
+    """Jobs by starting quarter, ending quarter, job type and state.
+
+    A report covers a job if the job starts and ends within the
+    reporting range, so jobs are keyed by both quarters.
+    """
+    start_quarter = models.IntegerField()
+    end_quarter = models.IntegerField()
+    job_type = models.CharField(max_length=20)
+    state = models.CharField(max_length=100)
+    job_count = models.IntegerField(default=0)
+    completion_time_sum = models.FloatField(default=0.0)
+    completion_time_count = models.IntegerField(default=0)
+    completion_time_sketch = models.JSONField(default=dict, help_text="Bucket counts of a QuantileSketch")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['start_quarter', 'end_quarter', 'job_type', 'state'],
+                                    name='unique_job_rollup'),
+        ]
+
+
+class CustomerRollup(models.Model):
+    """Number of customers created in a quarter."""
+    quarter = models.IntegerField(unique=True)
+    new_customers = models.IntegerField(default=0)
+
+
+class RollupState(models.Model):
+    """Single row recording whether the rollups match the raw data.
+
+    Reports are answered from the rollups only while `is_valid` is
+    set, i.e. after the rollups were built by `manage.py rebuild_rollups`.
+    """
+    is_valid = models.BooleanField(default=False)
+    rebuilt_at = models.DateTimeField(null=True, blank=True)
@@ -20,6 +20,17 @@ class JobReportResult(models.Model):
     num_active = models.IntegerField(default=0)
     num_completed = models.IntegerField(default=0)
 
+    # Approximate distribution of the completion time, see `stat_analysis.sketches`
+    median_completion_time_regular = models.FloatField(null=True, blank=True)
+    p90_completion_time_regular = models.FloatField(null=True, blank=True)
+    p99_completion_time_regular = models.FloatField(null=True, blank=True)
+    median_completion_time_wafer_run = models.FloatField(null=True, blank=True)
+    p90_completion_time_wafer_run = models.FloatField(null=True, blank=True)
+    p99_completion_time_wafer_run = models.FloatField(null=True, blank=True)
+    completion_time_histogram = models.JSONField(null=True, blank=True,
+                                                 help_text="Number of jobs per completion time range (days) "
+                                                           "and job type")
+
 
 class OrderReportResult(models.Model):
     """Model to store analysis results for the customer Orders.
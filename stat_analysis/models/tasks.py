@@ -0,0 +1,24 @@
+"""stat_analysis.models.tasks.py
+
+"""
+from django.db import models
+from django.utils import timezone
+
+from .report import Report
+
+
+class ReportTask(models.Model):
+    """Queue entry for a Report waiting to be computed by the report worker.
+
+    A task is claimed by setting `claimed_at` and removed once the
+    computation has finished.
+    """
+    report = models.ForeignKey(Report, on_delete=models.CASCADE, related_name='tasks')
+    created_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+
+    def __str__(self):
+        return f"Task #{self.id} for {self.report}"
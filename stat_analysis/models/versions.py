@@ -0,0 +1,33 @@
+"""stat_analysis.models.versions.py
+
+"""
+import uuid
+
+from django.db import models
+
+
+def new_version():
+    return uuid.uuid4().hex
+
+
+class DataVersion(models.Model):
+    """Version of a data source the report statistics are computed from.
+
+    The version is replaced on every write to the source, so cached
+    statistics keyed on it are never served for changed data, also
+    not after the database was recreated.
+    """
+    SOURCE_ORDERS = 'orders'
+    SOURCE_JOBS = 'jobs'
+    SOURCE_CUSTOMERS = 'customers'
+    SOURCE_CHOICES = [
+        (SOURCE_ORDERS, 'Orders'),
+        (SOURCE_JOBS, 'Jobs'),
+        (SOURCE_CUSTOMERS, 'Customers'),
+    ]
+
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, unique=True)
+    version = models.CharField(max_length=32, default=new_version)
+
+    def __str__(self):
+        return f"{self.source}: {self.version}"
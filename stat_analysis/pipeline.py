@@ -0,0 +1,295 @@
+"""stat_analysis.pipeline.py
+
+This module computes all statistics of one Report.
+
+The ReportPipeline resolves the reporting range once, shares
+the filtered querysets and intermediate aggregates between the
+job, order and user stages and writes every result row with a
+single upsert inside one transaction. The statistics are computed
+before the transaction is opened so the write lock is held only for
+the upserts.
+
+Once the per-quarter rollups are built the statistics are merged
+from them instead of scanning the raw rows. Until then they are
+computed from the column store once it is built, see
+`stat_analysis.columnar`, or else the quarters of a multi-quarter
+range are scanned in parallel, see `stat_analysis.fanout`. Computed
+statistics are cached per quarter range until the underlying data
+changes.
+
+With the `REPORTS_COMPUTE_METRICS` setting the values of the
+registered metrics, see `stat_analysis.metrics`, are computed and
+stored alongside as MetricValue rows. They are evaluated per quarter
+of the range, the cached partials of a quarter are merged into every
+report including it.
+
+The statistics are read from the `REPORTS_READ_DATABASE`, see
+`stat_analysis.routers`, unless the pipeline must read the writes
+just made on the primary.
+"""
+import os
+from functools import cached_property, partial
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Order, Customer
+from execution.models import Job
+from stat_analysis.aggregation import (
+    aggregate_job_stats, aggregate_manager_totals, aggregate_order_stats, aggregate_user_stats
+)
+from stat_analysis.cache import get_or_compute_stats
+from stat_analysis.columnar import ColumnStore, refresh_store
+from stat_analysis.fanout import fanout_stats
+from stat_analysis.metrics import evaluate, get_metrics, merge_results, metrics_key
+from stat_analysis.models import Report, JobReportResult, MetricValue, OrderReportResult, UserReportResult
+from stat_analysis.profiling import Profiler
+from stat_analysis.rollups import (
+    rollup_job_stats, rollup_manager_totals, rollup_order_stats, rollup_user_stats, rollups_are_valid
+)
+from stat_analysis.routers import analytics_reads, primary_reads
+from stat_analysis.stat_utils import get_quarter_bounds, get_report_quarters, get_report_range
+
+
+def upsert_result(model, report, values):
+    """Insert or update the result row of `model` for `report` in one query."""
+    return upsert_results(model, [report], values)[0]
+
+
+def upsert_results(model, reports, values, batch_size=500):
+    """Insert or update the result rows of `model` with the same `values` for all `reports`."""
+    results = [model(report=report, **values) for report in reports]
+    model.objects.bulk_create(
+        results,
+        update_conflicts=True,
+        unique_fields=['report'],
+        update_fields=list(values),
+        batch_size=batch_size,
+    )
+    return results
+
+
+def upsert_metric_values(reports, values, batch_size=500):
+    """Store the metric `values` by name for all `reports`, removing those of other metrics."""
+    rows = [MetricValue(report=report, name=name, value=value) for report in reports for name, value in values.items()]
+    MetricValue.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['report', 'name'],
+        update_fields=['value'],
+        batch_size=batch_size,
+    )
+    # e.g. of a metric no longer registered
+    MetricValue.objects.filter(report__in=reports).exclude(name__in=list(values)).delete()
+    return rows
+
+
+class ReportPipeline:
+    """Compute and store the job, order and user statistics of `report`.
+
+    With `read_primary` the statistics are read from the primary
+    instead of the `REPORTS_READ_DATABASE`.
+    """
+
+    def __init__(self, report, profiler=None, read_primary=False):
+        self.report = report
+        self.profiler = profiler or Profiler()
+        self.read_primary = read_primary
+
+    def reads(self):
+        """Context of the statistics queries."""
+        return primary_reads() if self.read_primary else analytics_reads()
+
+    @cached_property
+    def date_range(self):
+        return get_report_range(self.report.quarter_from, self.report.year_from,
+                                self.report.quarter_to, self.report.year_to)
+
+    @cached_property
+    def quarters(self):
+        return get_report_quarters(self.report.quarter_from, self.report.year_from,
+                                   self.report.quarter_to, self.report.year_to)
+
+    @cached_property
+    def use_rollups(self):
+        """Merge the per-quarter rollups instead of scanning the raw rows."""
+        with self.reads():
+            return getattr(settings, 'REPORTS_USE_ROLLUPS', True) and rollups_are_valid()
+
+    @cached_property
+    def use_columnar(self):
+        """Compute the statistics from the column store, brought up to date from the primary first."""
+        if self.use_rollups:
+            return False
+        return refresh_store()
+
+    @cached_property
+    def use_fanout(self):
+        """Scan the quarters of the range in parallel instead of the whole range at once.
+
+        With a single CPU the workers would take turns, which is slower
+        than the single scan.
+        """
+        first_quarter, last_quarter = self.quarters
+        return (not self.use_rollups and not self.use_columnar and last_quarter > first_quarter
+                and getattr(settings, 'REPORTS_FANOUT_WORKERS', 1) > 1 and (os.cpu_count() or 1) > 1)
+
+    @cached_property
+    def use_metrics(self):
+        """Compute and store the values of the registered metrics."""
+        return getattr(settings, 'REPORTS_COMPUTE_METRICS', False)
+
+    @cached_property
+    def quarter_stats(self):
+        # All statistics at once, the stages take their part
+        with self.reads():
+            if self.use_columnar:
+                return ColumnStore().stats(*self.quarters)
+            return fanout_stats(*self.quarters, read_primary=self.read_primary)
+
+    @cached_property
+    def jobs(self):
+        start_date, end_date = self.date_range
+        return Job.objects.filter(starting_date__gte=start_date, end_date__lt=end_date)
+
+    @cached_property
+    def orders(self):
+        start_date, end_date = self.date_range
+        return Order.objects.filter(created_at__gte=start_date, created_at__lt=end_date)
+
+    @cached_property
+    def new_customers(self):
+        start_date, end_date = self.date_range
+        return Customer.objects.filter(created_at__gte=start_date, created_at__lt=end_date)
+
+    @cached_property
+    def manager_totals(self):
+        # Shared between the order and user stages
+        with self.reads():
+            if self.use_rollups:
+                return rollup_manager_totals(*self.quarters)
+            if self.use_columnar or self.use_fanout:
+                return self.quarter_stats['managers']
+            return aggregate_manager_totals(self.orders)
+
+    @cached_property
+    def job_stats(self):
+        with self.reads():
+            return get_or_compute_stats('jobs', self.quarters, self.compute_job_stats)
+
+    @cached_property
+    def order_stats(self):
+        with self.reads():
+            return get_or_compute_stats('orders', self.quarters, self.compute_order_stats)
+
+    @cached_property
+    def user_stats(self):
+        with self.reads():
+            return get_or_compute_stats('users', self.quarters, self.compute_user_stats)
+
+    @cached_property
+    def metric_values(self):
+        metrics = get_metrics()
+        with self.reads():
+            # The registered metrics are part of the key, a new one is computed at once
+            return get_or_compute_stats('metrics', self.quarters, partial(self.compute_metric_values, metrics),
+                                        variant=metrics_key(metrics))
+
+    def compute_job_stats(self):
+        if self.use_rollups:
+            return rollup_job_stats(*self.quarters)
+        if self.use_columnar or self.use_fanout:
+            return self.quarter_stats['jobs']
+        return aggregate_job_stats(self.jobs)
+
+    def compute_order_stats(self):
+        if self.use_rollups:
+            return rollup_order_stats(*self.quarters, managers=self.manager_totals)
+        if self.use_columnar or self.use_fanout:
+            return self.quarter_stats['orders']
+        return aggregate_order_stats(self.orders, managers=self.manager_totals)
+
+    def compute_user_stats(self):
+        if self.use_rollups:
+            return rollup_user_stats(*self.quarters, total_orders=self.order_stats['total_orders'],
+                                     managers=self.manager_totals)
+        if self.use_columnar or self.use_fanout:
+            return self.quarter_stats['users']
+        return aggregate_user_stats(self.orders, self.new_customers,
+                                    total_orders=self.order_stats['total_orders'],
+                                    managers=self.manager_totals)
+
+    def compute_metric_values(self, metrics):
+        first_quarter, last_quarter = self.quarters
+        range_end = get_quarter_bounds(last_quarter)[1]
+        # Orders and customers belong to a single quarter, the jobs counted also depend on the end of the range
+        groups = [
+            ([metric for metric in metrics if metric.source != 'jobs'], False),
+            ([metric for metric in metrics if metric.source == 'jobs'], True),
+        ]
+        partials = []
+        for quarter in range(first_quarter, last_quarter + 1):
+            for group, until_range_end in groups:
+                if group:
+                    # One pass over the rows of each source of the quarter for all metrics of the group
+                    partials.append(get_or_compute_stats(
+                        'metric_partials', (quarter, last_quarter if until_range_end else quarter),
+                        partial(evaluate, group, *get_quarter_bounds(quarter), range_end), variant=metrics_key(group),
+                    ))
+        return merge_results(metrics, partials)
+
+    def save_job_stats(self):
+        return upsert_result(JobReportResult, self.report, self.job_stats)
+
+    def save_order_stats(self):
+        return upsert_result(OrderReportResult, self.report, self.order_stats)
+
+    def save_user_stats(self):
+        return upsert_result(UserReportResult, self.report, self.user_stats)
+
+    def save_metric_values(self):
+        return upsert_metric_values([self.report], self.metric_values)
+
+    def compute(self, on_progress=None):
+        """Compute all statistics, without writing them.
+
+        `on_progress` is called with the completed percentage after
+        each stage, leaving the last step for the write.
+        """
+        with self.profiler.stage('date_resolution'):
+            # Resolve the lazily computed range and data source up front
+            self.date_range, self.quarters, self.use_rollups, self.use_columnar, self.use_fanout
+
+        stages = ['job_stats', 'order_stats', 'user_stats']
+        if self.use_metrics:
+            stages.append('metric_values')
+        for done, stage in enumerate(stages, start=1):
+            with self.profiler.stage(stage):
+                getattr(self, stage)
+            if on_progress is not None:
+                # Leave the last step for the write
+                on_progress(done * 100 // (len(stages) + 1))
+
+    def run(self, on_progress=None):
+        """Compute all statistics and store them in a single transaction.
+
+        `on_progress` is called with the completed percentage after
+        each stage. The timing and query statistics of every stage are
+        stored in `Report.profile`. Returns the `JobReportResult`,
+        `OrderReportResult` and `UserReportResult` instances, the metric
+        values are stored as MetricValue rows.
+        """
+        self.compute(on_progress=on_progress)
+
+        with transaction.atomic():
+            with self.profiler.stage('write'):
+                results = self.save_job_stats(), self.save_order_stats(), self.save_user_stats()
+                if self.use_metrics:
+                    self.save_metric_values()
+            self.report.profile = self.profiler.as_dict()
+            # Also marks the results as changed for the API, see `stat_analysis.api`
+            self.report.updated_at = timezone.now()
+            Report.objects.filter(pk=self.report.pk).update(profile=self.report.profile,
+                                                            updated_at=self.report.updated_at)
+        return results
@@ -0,0 +1,213 @@
+"""stat_analysis.profiling.py
+
+This module measures where the time of a report computation or a
+request goes.
+
+A Profiler records, per named stage, the wall time, the number of
+SQL queries, the time spent in SQL and the number of rows fetched.
+The queries are captured with a database execute wrapper, so no
+DEBUG query log is needed. Besides the `using` database the wrapper
+is installed on the `REPORTS_READ_DATABASE`, where the statistics
+queries go.
+
+SlowRequestMiddleware uses the same Profiler to log slow requests
+together with their query breakdown.
+"""
+import heapq
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .routers import read_database
+
+
+logger = logging.getLogger(__name__)
+
+
+class RowCountingCursor:
+    """Proxy of a DB-API cursor counting the fetched rows into `stats`."""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._stats.rows += 1
+            yield row
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+
+class StageStats:
+
+    def __init__(self, name):
+        self.name = name
+        self.wall_time = 0.0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.rows = 0
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'wall_time': round(self.wall_time, 6),
+            'queries': self.queries,
+            'sql_time': round(self.sql_time, 6),
+            'rows': self.rows,
+        }
+
+
+class Profiler:
+    """Collect timing and query statistics per stage.
+
+    The `keep_slowest` slowest queries over all stages are kept for
+    reporting.
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS, keep_slowest=10):
+        self.using = using
+        self.keep_slowest = keep_slowest
+        self.stages = []
+        self.slowest_queries = []
+        self._current = None
+
+    @contextmanager
+    def stage(self, name):
+        stats = StageStats(name)
+        self.stages.append(stats)
+        previous, self._current = self._current, stats
+        started = time.perf_counter()
+        try:
+            with ExitStack() as wrappers:
+                for alias in dict.fromkeys([self.using, read_database()]):
+                    wrappers.enter_context(connections[alias].execute_wrapper(self._execute))
+                yield stats
+        finally:
+            stats.wall_time = time.perf_counter() - started
+            self._current = previous
+
+    def _execute(self, execute, sql, params, many, context):
+        stats = self._current
+        cursor = context['cursor']
+        if isinstance(cursor.cursor, RowCountingCursor):
+            cursor.cursor._stats = stats
+        else:
+            cursor.cursor = RowCountingCursor(cursor.cursor, stats)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            stats.queries += 1
+            stats.sql_time += duration
+            entry = (duration, stats.name, sql)
+            if len(self.slowest_queries) < self.keep_slowest:
+                heapq.heappush(self.slowest_queries, entry)
+            else:
+                heapq.heappushpop(self.slowest_queries, entry)
+
+    def total(self):
+        total = StageStats('total')
+        for stats in self.stages:
+            total.wall_time += stats.wall_time
+            total.queries += stats.queries
+            total.sql_time += stats.sql_time
+            total.rows += stats.rows
+        return total
+
+    def as_dict(self):
+        return {
+            'stages': [stats.as_dict() for stats in self.stages],
+            'total': self.total().as_dict(),
+        }
+
+    def query_breakdown(self):
+        """Lines describing the stages and the slowest queries, for logging."""
+        lines = [
+            f"{stats.name}: {stats.wall_time * 1000:.1f} ms, {stats.queries} queries "
+            f"({stats.sql_time * 1000:.1f} ms), {stats.rows} rows"
+            for stats in self.stages
+        ]
+        for duration, stage, sql in sorted(self.slowest_queries, reverse=True):
+            lines.append(f"  {duration * 1000:.1f} ms [{stage}] {sql}")
+        return lines
+
+
+class SlowRequestMiddleware:
+    """Log requests slower than `SLOW_REQUEST_THRESHOLD` seconds with their queries.
+
+    Only paths starting with one of `SLOW_REQUEST_PATH_PREFIXES`
+    (default: the admin) are profiled. Under ASGI the middleware runs
+    async, so the async views are not adapted to the sync thread. The
+    stage of a profiled request is entered in that thread, where the
+    sync views and their queries run.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.is_profiled(request):
+            return self.get_response(request)
+
+        profiler = Profiler()
+        with profiler.stage('request'):
+            response = self.get_response(request)
+        self.log(request, profiler)
+        return response
+
+    async def __acall__(self, request):
+        if not self.is_profiled(request):
+            return await self.get_response(request)
+
+        profiler = Profiler()
+        stage = profiler.stage('request')
+        await sync_to_async(stage.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stage.__exit__)(None, None, None)
+        self.log(request, profiler)
+        return response
+
+    def is_profiled(self, request):
+        prefixes = tuple(getattr(settings, 'SLOW_REQUEST_PATH_PREFIXES', ['/admin/']))
+        return request.path.startswith(prefixes)
+
+    def log(self, request, profiler):
+        total = profiler.total()
+        if total.wall_time >= getattr(settings, 'SLOW_REQUEST_THRESHOLD', 1.0):
+            logger.warning(
+                "Slow request %s %s: %.1f ms, %s queries (%.1f ms), %s rows\n%s",
+                request.method, request.path, total.wall_time * 1000, total.queries, total.sql_time * 1000,
+                total.rows, '\n'.join(profiler.query_breakdown()),
+            )
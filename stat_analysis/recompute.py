@@ -0,0 +1,207 @@
+"""stat_analysis.recompute.py
+
+This module recomputes the statistics of many Reports at once, e.g.
+after a data correction.
+
+Reports of the same quarter range have the same statistics, so each
+distinct range is computed once by a ReportPipeline in a thread pool,
+as in the report worker, and its results are written for all of its
+reports. The writes are collected into batches, each written in one
+transaction.
+
+The ids of the written reports are appended to a checkpoint file. When
+a run is interrupted, running it again with the same selection skips
+them. The file is removed once a run completes without failures.
+"""
+import json
+import logging
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from stat_analysis.models import Report, ReportTask, JobReportResult, OrderReportResult, UserReportResult
+from stat_analysis.pipeline import ReportPipeline, upsert_metric_values, upsert_results
+from stat_analysis.stat_utils import get_report_quarters
+
+
+logger = logging.getLogger(__name__)
+
+# Result model of each statistics stage of the pipeline
+RESULT_STAGES = [
+    (JobReportResult, 'job_stats'),
+    (OrderReportResult, 'order_stats'),
+    (UserReportResult, 'user_stats'),
+]
+
+
+def report_quarters(report):
+    return get_report_quarters(report.quarter_from, report.year_from, report.quarter_to, report.year_to)
+
+
+def select_reports(overlapping=None, created_by=None, computed_before=None, statuses=None):
+    """The reports matching all given filters, oldest first.
+
+    `overlapping` is a (first, last) pair of quarter indexes the range
+    of a report must overlap. `computed_before` selects the reports not
+    computed since then, including those never computed.
+    """
+    reports = Report.objects.order_by('pk')
+    if created_by is not None:
+        reports = reports.filter(created_by__username=created_by)
+    if computed_before is not None:
+        reports = reports.filter(Q(finished_at__isnull=True) | Q(finished_at__lt=computed_before))
+    if statuses:
+        reports = reports.filter(status__in=statuses)
+    reports = list(reports.defer('profile', 'error'))
+    if overlapping is not None:
+        first_quarter, last_quarter = overlapping
+        reports = [report for report in reports
+                   if report_quarters(report)[0] <= last_quarter and report_quarters(report)[1] >= first_quarter]
+    return reports
+
+
+def group_by_range(reports):
+    """Map every distinct quarter range to its reports, in the order of `reports`."""
+    groups = {}
+    for report in reports:
+        groups.setdefault(report_quarters(report), []).append(report)
+    return groups
+
+
+class Checkpoint:
+    """Append-only file of the ids of the reports written by a run of `selection`.
+
+    The first line holds the selection, the ids of a run of another
+    selection are not reused. Without a `path` nothing is recorded.
+    """
+
+    def __init__(self, path=None, selection=None):
+        self.path = path
+        self.selection = json.dumps(selection, sort_keys=True, default=str)
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path) as checkpoint:
+                if checkpoint.readline().rstrip('\n') != self.selection:
+                    raise ValueError(f"The checkpoint {path} is of a run with other filters, "
+                                     f"remove it to start over.")
+                self.done = {int(line) for line in checkpoint if line.strip()}
+
+    def add(self, report_ids):
+        if not self.path:
+            return
+        new = not os.path.exists(self.path)
+        with open(self.path, 'a') as checkpoint:
+            if new:
+                checkpoint.write(self.selection + '\n')
+            checkpoint.writelines(f"{report_id}\n" for report_id in report_ids)
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+        self.done.update(report_ids)
+
+    def remove(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def compute_range(report):
+    """Compute the statistics of the range of `report`. Returns the pipeline holding them."""
+    # Runs in a pool thread, which has its own database connection
+    close_old_connections()
+    try:
+        pipeline = ReportPipeline(report)
+        pipeline.compute()
+        return pipeline
+    finally:
+        connection.close()
+
+
+def write_batch(batch):
+    """Store the statistics of a list of (reports, pipeline) pairs in one transaction."""
+    with transaction.atomic():
+        for model, stage in RESULT_STAGES:
+            for reports, pipeline in batch:
+                upsert_results(model, reports, getattr(pipeline, stage))
+        for reports, pipeline in batch:
+            if pipeline.use_metrics:
+                upsert_metric_values(reports, pipeline.metric_values)
+        finished_at = timezone.now()
+        for reports, pipeline in batch:
+            Report.objects.filter(pk__in=[report.pk for report in reports]).update(
+                status=Report.STATUS_DONE, progress=100, finished_at=finished_at, error='',
+                profile=pipeline.profiler.as_dict(), updated_at=finished_at,
+            )
+        # Queued computations of the same reports are done now
+        ReportTask.objects.filter(
+            report__in=[report.pk for reports, _ in batch for report in reports], claimed_at__isnull=True
+        ).delete()
+
+
+def mark_failed(reports, error):
+    finished_at = timezone.now()
+    Report.objects.filter(pk__in=[report.pk for report in reports]).update(
+        status=Report.STATUS_FAILED, finished_at=finished_at, error=error, updated_at=finished_at,
+    )
+
+
+def recompute_reports(reports, workers=4, batch_size=100, checkpoint=None, progress=None):
+    """Recompute `reports`, each distinct quarter range once with `workers` threads.
+
+    Results are written in batches of at least `batch_size` reports.
+    Reports listed in the `checkpoint` are skipped. `progress` is
+    called with a message after every batch. Returns the number of
+    recomputed, skipped and failed reports and ranges and the seconds
+    taken.
+    """
+    def notify(message):
+        if progress is not None:
+            progress(message)
+
+    checkpoint = checkpoint or Checkpoint()
+    pending = [report for report in reports if report.pk not in checkpoint.done]
+    groups = group_by_range(pending)
+    totals = {'reports': 0, 'ranges': 0, 'skipped': len(reports) - len(pending), 'failed': 0, 'seconds': 0.0}
+    started = time.perf_counter()
+
+    batch = []
+
+    def flush():
+        write_batch(batch)
+        written = [report.pk for reports, _ in batch for report in reports]
+        checkpoint.add(written)
+        totals['reports'] += len(written)
+        totals['ranges'] += len(batch)
+        batch.clear()
+        elapsed = time.perf_counter() - started
+        notify(f"Recomputed {totals['reports']}/{len(pending)} reports, {totals['ranges']}/{len(groups)} ranges, "
+               f"{totals['reports'] / elapsed:.1f} reports/s")
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {pool.submit(compute_range, group[0]): group for group in groups.values()}
+        for future in as_completed(futures):
+            group = futures[future]
+            try:
+                pipeline = future.result()
+            except Exception:
+                logger.exception("Computation of the range %s-%s failed", *report_quarters(group[0]))
+                mark_failed(group, traceback.format_exc())
+                totals['failed'] += len(group)
+                continue
+            batch.append((group, pipeline))
+            if sum(len(reports) for reports, _ in batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    finally:
+        # On an interrupt, drop the queued ranges instead of computing them
+        pool.shutdown(cancel_futures=True)
+
+    if not totals['failed']:
+        checkpoint.remove()
+    totals['seconds'] = time.perf_counter() - started
+    return totals
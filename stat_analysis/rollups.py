@@ -0,0 +1,390 @@
+"""stat_analysis.rollups.py
+
+This module maintains and reads the per-quarter rollups.
+
+Every change is applied as the difference of the contribution of
+the affected rows before and after the change: the contribution is
+read before a write and, once the write succeeded, subtracted while
+the new one is added in the same transaction. The contribution of any
+set of rows is computed with grouped queries, which is also how the
+rollups are rebuilt from scratch.
+
+Writes that bypass model signals (`bulk_create`, `QuerySet.update`)
+must call `add_orders`/`add_jobs`/`add_customers` themselves or be
+followed by `rebuild_rollups`.
+"""
+import math
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, ExpressionWrapper, F, IntegerField, Sum
+from django.db.models.functions import ExtractQuarter, ExtractYear
+from django.utils import timezone
+
+from core.models import Order, Customer, AccountManager
+from execution.models import Job
+from stat_analysis.aggregation import (
+    aggregate_job_stats, aggregate_manager_totals, aggregate_order_stats, aggregate_user_stats,
+    job_distribution_stats, manager_display_name
+)
+from stat_analysis.models import (
+    CustomerRollup, JobRollup, OrderCustomerRollup, OrderManagerRollup, OrderProviderRollup, RollupState
+)
+from stat_analysis.sketches import QuantileSketch, bucket_expression
+from stat_analysis.stat_utils import get_quarter_bounds
+
+
+def quarter_of(field):
+    """SQL expression of the quarter index of the datetime `field`."""
+    return ExpressionWrapper(ExtractYear(field) * 4 + ExtractQuarter(field) - 1, output_field=IntegerField())
+
+
+# Contributions
+
+def order_contribution(orders):
+    """Return the rollup rows contributed by `orders`, keyed by rollup model."""
+    orders = Order.objects.filter(pk__in=orders.values('pk'))
+    order_services = Order.services.through.objects.filter(order__in=orders.values('pk'))
+
+    manager_rows = (
+        orders
+        .annotate(quarter=quarter_of('created_at'))
+        .values('quarter', 'account_manager')
+        .annotate(order_count=Count('pk'), revenue=Sum('total_value'))
+        .order_by()
+    )
+    provider_rows = (
+        order_services
+        .annotate(quarter=quarter_of('order__created_at'))
+        .values('quarter', provider=F('service__provider'))
+        .annotate(order_count=Count('order', distinct=True))
+        .order_by()
+    )
+    customer_rows = (
+        orders
+        .annotate(quarter=quarter_of('created_at'))
+        .values('quarter', 'customer')
+        .annotate(order_count=Count('pk'))
+        .order_by()
+    )
+    return {
+        OrderManagerRollup: [dict(row, revenue=row['revenue'] or Decimal('0.00')) for row in manager_rows],
+        OrderProviderRollup: list(provider_rows),
+        OrderCustomerRollup: list(customer_rows),
+    }
+
+
+def job_contribution(jobs):
+    jobs = jobs.annotate(start_quarter=quarter_of('starting_date'), end_quarter=quarter_of('end_date'))
+    key_fields = ['start_quarter', 'end_quarter', 'job_type', 'state']
+    rows = (
+        jobs
+        .values(*key_fields)
+        .annotate(job_count=Count('pk'), completion_time_sum=Sum('completion_time'),
+                  completion_time_count=Count('completion_time'))
+        .order_by()
+    )
+    bucket_rows = (
+        jobs
+        .annotate(bucket=bucket_expression('completion_time'))
+        .values(*key_fields, 'bucket')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+    sketches = {}
+    for row in bucket_rows:
+        sketch = sketches.setdefault(tuple(row[field] for field in key_fields), QuantileSketch())
+        sketch.merge(QuantileSketch.from_bucket_rows([(row['bucket'], row['count'])]))
+
+    return {JobRollup: [
+        dict(row, completion_time_sum=row['completion_time_sum'] or 0.0,
+             completion_time_sketch=sketches[tuple(row[field] for field in key_fields)].to_dict())
+        for row in rows
+    ]}
+
+
+def customer_contribution(customers):
+    rows = (
+        customers
+        .annotate(quarter=quarter_of('created_at'))
+        .values('quarter')
+        .annotate(new_customers=Count('pk'))
+        .order_by()
+    )
+    return {CustomerRollup: list(rows)}
+
+
+ROLLUP_KEYS = {
+    OrderManagerRollup: (['quarter', 'account_manager'], 'order_count'),
+    OrderProviderRollup: (['quarter', 'provider'], 'order_count'),
+    OrderCustomerRollup: (['quarter', 'customer'], 'order_count'),
+    JobRollup: (['start_quarter', 'end_quarter', 'job_type', 'state'], 'job_count'),
+    CustomerRollup: (['quarter'], 'new_customers'),
+}
+
+
+# Values merged in Python instead of incremented in SQL
+SKETCH_FIELDS = {JobRollup: ['completion_time_sketch']}
+
+
+def apply_contribution(contribution, sign):
+    """Add (`sign=1`) or subtract (`sign=-1`) a contribution from the rollups."""
+    with transaction.atomic():
+        for model, rows in contribution.items():
+            key_fields, count_field = ROLLUP_KEYS[model]
+            sketch_fields = SKETCH_FIELDS.get(model, [])
+            for row in rows:
+                keys = {field: row[field] for field in key_fields}
+                values = {field: value * sign for field, value in row.items()
+                          if field not in keys and field not in sketch_fields}
+                updated = model.objects.filter(**keys).update(
+                    **{field: F(field) + value for field, value in values.items()}
+                )
+                if not updated:
+                    model.objects.create(**_as_model_fields(model, {**keys, **values}))
+                if sketch_fields:
+                    # Rows are locked by the update above
+                    rollup = model.objects.get(**keys)
+                    for field in sketch_fields:
+                        sketch = QuantileSketch(getattr(rollup, field)).merge(QuantileSketch(row[field]), sign)
+                        setattr(rollup, field, sketch.to_dict())
+                    rollup.save(update_fields=sketch_fields)
+                # Keep only the rows which still count anything
+                model.objects.filter(**keys, **{count_field: 0}).delete()
+
+
+def replace_contribution(previous, current):
+    """Subtract the `previous` contribution of rows and add their `current` one in one transaction."""
+    with transaction.atomic():
+        if previous:
+            apply_contribution(previous, -1)
+        apply_contribution(current, 1)
+
+
+def add_orders(orders):
+    apply_contribution(order_contribution(orders), 1)
+
+
+def remove_orders(orders):
+    apply_contribution(order_contribution(orders), -1)
+
+
+def add_jobs(jobs):
+    apply_contribution(job_contribution(jobs), 1)
+
+
+def remove_jobs(jobs):
+    apply_contribution(job_contribution(jobs), -1)
+
+
+def add_customers(customers):
+    apply_contribution(customer_contribution(customers), 1)
+
+
+def remove_customers(customers):
+    apply_contribution(customer_contribution(customers), -1)
+
+
+# Rebuild
+
+def rebuild_rollups():
+    """Regenerate all rollups from the raw Orders, Jobs and Customers."""
+    contribution = {}
+    contribution.update(order_contribution(Order.objects.all()))
+    contribution.update(job_contribution(Job.objects.all()))
+    contribution.update(customer_contribution(Customer.objects.all()))
+
+    with transaction.atomic():
+        for model, rows in contribution.items():
+            model.objects.all().delete()
+            model.objects.bulk_create([model(**_as_model_fields(model, row)) for row in rows], batch_size=1000)
+        RollupState.objects.update_or_create(pk=1, defaults={'is_valid': True, 'rebuilt_at': timezone.now()})
+
+
+def _as_model_fields(model, row):
+    # values() returns foreign keys by field name, the constructor needs the attname
+    return {model._meta.get_field(field).attname: value for field, value in row.items()}
+
+
+def rollups_are_valid():
+    return RollupState.objects.filter(pk=1, is_valid=True).exists()
+
+
+# Reading
+
+def rollup_manager_totals(first_quarter, last_quarter):
+    """Rollup counterpart of `aggregation.aggregate_manager_totals`."""
+    rows = (
+        OrderManagerRollup.objects
+        .filter(quarter__gte=first_quarter, quarter__lte=last_quarter)
+        .values('account_manager', 'account_manager__user__first_name',
+                'account_manager__user__last_name', 'account_manager__user__username')
+        .annotate(num_orders=Sum('order_count'), revenue=Sum('revenue'))
+        .order_by()
+    )
+    managers = {}
+    for row in rows:
+        manager_name = manager_display_name(row['account_manager__user__first_name'],
+                                            row['account_manager__user__last_name'],
+                                            row['account_manager__user__username'])
+        totals = managers.setdefault(manager_name, {'num_orders': 0, 'revenue': Decimal('0.00')})
+        totals['num_orders'] += row['num_orders']
+        totals['revenue'] += row['revenue']
+    return managers
+
+
+def rollup_order_stats(first_quarter, last_quarter, managers=None):
+    """Rollup counterpart of `aggregation.aggregate_order_stats`."""
+    if managers is None:
+        managers = rollup_manager_totals(first_quarter, last_quarter)
+
+    total_orders = sum(totals['num_orders'] for totals in managers.values())
+    total_revenue = sum((totals['revenue'] for totals in managers.values()), Decimal('0.00'))
+    if total_orders > 0:
+        average_order_value = total_revenue / total_orders
+    else:
+        average_order_value = Decimal('0.00')
+
+    provider_rows = (
+        OrderProviderRollup.objects
+        .filter(quarter__gte=first_quarter, quarter__lte=last_quarter)
+        .values('provider__name')
+        .annotate(num_orders=Sum('order_count'))
+        .order_by()
+    )
+
+    return {
+        'total_orders': total_orders,
+        'total_revenue': total_revenue,
+        'average_order_value': average_order_value,
+        'orders_per_service_provider': {row['provider__name']: row['num_orders'] for row in provider_rows},
+        'orders_per_account_manager': {name: totals['num_orders'] for name, totals in managers.items()},
+    }
+
+
+def rollup_job_stats(first_quarter, last_quarter):
+    """Rollup counterpart of `aggregation.aggregate_job_stats`."""
+    rows = JobRollup.objects.filter(start_quarter__gte=first_quarter, end_quarter__lte=last_quarter)
+
+    total_jobs = 0
+    state_map = {}
+    time_sums = {}
+    sketches = {}
+    for row in rows.values('job_type', 'state', 'job_count', 'completion_time_sum', 'completion_time_count',
+                           'completion_time_sketch'):
+        total_jobs += row['job_count']
+        state_map[row['state']] = state_map.get(row['state'], 0) + row['job_count']
+        time_sum, time_count = time_sums.get(row['job_type'], (0.0, 0))
+        time_sums[row['job_type']] = (time_sum + row['completion_time_sum'],
+                                      time_count + row['completion_time_count'])
+        sketches.setdefault(row['job_type'], QuantileSketch()).merge(QuantileSketch(row['completion_time_sketch']))
+
+    avg_times = {job_type: time_sum / time_count for job_type, (time_sum, time_count) in time_sums.items()
+                 if time_count}
+
+    return {
+        'total_jobs': total_jobs,
+        'avg_completion_time_regular': avg_times.get('regular'),
+        'avg_completion_time_wafer_run': avg_times.get('wafer_run'),
+        'num_created': state_map.get('created', 0),
+        'num_active': state_map.get('active', 0),
+        'num_completed': state_map.get('completed', 0),
+        **job_distribution_stats(sketches),
+    }
+
+
+def rollup_user_stats(first_quarter, last_quarter, total_orders=None, managers=None):
+    """Rollup counterpart of `aggregation.aggregate_user_stats`."""
+    if managers is None:
+        managers = rollup_manager_totals(first_quarter, last_quarter)
+    if total_orders is None:
+        total_orders = sum(totals['num_orders'] for totals in managers.values())
+
+    customers_with_orders = (
+        OrderCustomerRollup.objects
+        .filter(quarter__gte=first_quarter, quarter__lte=last_quarter)
+        .values('customer').distinct().count()
+    )
+    avg_orders = total_orders / customers_with_orders if customers_with_orders > 0 else 0.0
+
+    new_customers = CustomerRollup.objects.filter(
+        quarter__gte=first_quarter, quarter__lte=last_quarter
+    ).aggregate(total=Sum('new_customers'))['total'] or 0
+
+    manager_performance = sorted(
+        ((name, float(totals['revenue'])) for name, totals in managers.items()),
+        key=lambda item: (-item[1], item[0])
+    )
+
+    return {
+        'total_customers': Customer.objects.count(),
+        'new_customers': new_customers,
+        'total_account_managers': AccountManager.objects.count(),
+        'customers_with_orders': customers_with_orders,
+        'avg_orders_per_customer': avg_orders,
+        'top_performing_managers': dict(manager_performance[:5]),
+    }
+
+
+# Verification
+
+def compare_stats(expected, actual):
+    """Return the names of the statistics which differ between two result dicts."""
+    mismatches = []
+    for name, value in expected.items():
+        other = actual.get(name)
+        if isinstance(value, float) or isinstance(other, float):
+            equal = value is None and other is None or (
+                value is not None and other is not None and math.isclose(value, other, rel_tol=1e-9)
+            )
+        elif isinstance(value, dict):
+            equal = isinstance(other, dict) and value.keys() == other.keys() and not compare_stats(value, other)
+        else:
+            equal = value == other
+        if not equal:
+            mismatches.append(name)
+    return mismatches
+
+
+def raw_stats(first_quarter, last_quarter):
+    """Compute the report statistics of a quarter range by scanning the raw rows."""
+    start_date, end_date = get_quarter_bounds(first_quarter)[0], get_quarter_bounds(last_quarter)[1]
+    orders = Order.objects.filter(created_at__gte=start_date, created_at__lt=end_date)
+    new_customers = Customer.objects.filter(created_at__gte=start_date, created_at__lt=end_date)
+    managers = aggregate_manager_totals(orders)
+    return {
+        'jobs': aggregate_job_stats(Job.objects.filter(starting_date__gte=start_date, end_date__lt=end_date)),
+        'orders': aggregate_order_stats(orders, managers=managers),
+        'users': aggregate_user_stats(orders, new_customers, managers=managers),
+    }
+
+
+def merged_stats(first_quarter, last_quarter):
+    """Compute the report statistics of a quarter range from the rollups."""
+    managers = rollup_manager_totals(first_quarter, last_quarter)
+    return {
+        'jobs': rollup_job_stats(first_quarter, last_quarter),
+        'orders': rollup_order_stats(first_quarter, last_quarter, managers=managers),
+        'users': rollup_user_stats(first_quarter, last_quarter, managers=managers),
+    }
+
+
+def verify_rollups(quarters):
+    """Compare rollup and raw-scan statistics for every quarter and the whole span.
+
+    Returns a list of ((first_quarter, last_quarter), names) for every
+    range whose statistics differ.
+    """
+    ranges = [(quarter, quarter) for quarter in quarters]
+    if len(quarters) > 1:
+        ranges.append((quarters[0], quarters[-1]))
+
+    mismatches = []
+    for quarter_range in ranges:
+        expected, actual = raw_stats(*quarter_range), merged_stats(*quarter_range)
+        names = [
+            f"{stage}.{name}" for stage in expected for name in compare_stats(expected[stage], actual[stage])
+        ]
+        if names:
+            mismatches.append((quarter_range, names))
+    return mismatches
@@ -0,0 +1,99 @@
+"""stat_analysis.routers.py
+
+Database routing of the report statistics and exports to a replica.
+
+The queries of the statistics and exports run inside `analytics_reads`
+and are read from the database alias of the `REPORTS_READ_DATABASE`
+setting, so the heavy scans do not compete with the order entry on the
+primary. All other reads and all writes use the default database.
+
+A replica lags behind the primary, so reading a row right after
+writing it may fail there. The Reports, their results and tasks are
+therefore always read from the primary, and `primary_reads` sends the
+analytics reads of a block back to the primary, e.g. for a report that
+must include the data just entered.
+
+Locally a second SQLite file stands in for the replica, copied from
+the primary with `manage.py sync_replica`.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+_analytics = ContextVar('stat_analysis_analytics_reads', default=False)
+_primary = ContextVar('stat_analysis_primary_reads', default=False)
+
+# Models read back right after they are written or used for locking, never read from the replica
+PRIMARY_MODELS = {
+    'stat_analysis.report',
+    'stat_analysis.jobreportresult',
+    'stat_analysis.orderreportresult',
+    'stat_analysis.userreportresult',
+    'stat_analysis.reporttask',
+    'stat_analysis.computationlock',
+}
+
+
+def read_database():
+    """Alias of the database the analytics reads go to."""
+    return getattr(settings, 'REPORTS_READ_DATABASE', None) or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def analytics_reads():
+    """Read from the `REPORTS_READ_DATABASE` in this block."""
+    token = _analytics.set(True)
+    try:
+        yield
+    finally:
+        _analytics.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary in this block, also inside `analytics_reads`."""
+    token = _primary.set(True)
+    try:
+        yield
+    finally:
+        _primary.reset(token)
+
+
+def iterate_analytics(iterable):
+    """Yield from `iterable`, reading from the `REPORTS_READ_DATABASE` while producing each item.
+
+    Unlike a `with analytics_reads()` around the loop of a generator,
+    the routing does not leak to the consumer between the items.
+    """
+    iterator = iter(iterable)
+    while True:
+        with analytics_reads():
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+class AnalyticsRouter:
+    """Route the reads inside `analytics_reads` to the `REPORTS_READ_DATABASE`."""
+
+    def db_for_read(self, model, **hints):
+        if _analytics.get() and not _primary.get() and model._meta.label_lower not in PRIMARY_MODELS:
+            return read_database()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Also for objects read from the replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema with the data from the primary
+        return db == DEFAULT_DB_ALIAS or db != read_database()
@@ -0,0 +1,273 @@
+"""stat_analysis.signals.py
+
+Signal receivers keeping the per-quarter rollups up to date.
+
+Before a write the contribution of the affected rows is read. After
+the save of a model the old contribution is removed from the rollups
+and the new one added in one transaction, so a failed save leaves the
+rollups alone, see `stat_analysis.rollups`. Deletes, job upserts and
+changes of the services of orders run in a transaction of their own,
+so there the contribution is removed before and added back after the
+write.
+
+After a write the DataVersion of the changed source is replaced,
+which invalidates the cached report statistics.
+
+Changes to rows of the column store are recorded as dirty, see
+`stat_analysis.columnar`. New rows are appended by its next refresh.
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from django.contrib.auth.models import User
+
+from core.models import Order, Customer, AccountManager, ServiceProvider, Service
+# Importing core.signals first connects its receivers before the ones
+# below, so the order totals are updated before the rollups read them
+from core.signals import orders_bulk_created
+from core.totals import order_totals_post_repair, order_totals_pre_repair
+from execution.models import Job
+from execution.signals import jobs_post_upsert, jobs_pre_upsert
+from stat_analysis import columnar, rollups
+from stat_analysis.cache import bump_data_version
+from stat_analysis.models import DataVersion
+
+
+@receiver(pre_save, sender=Order)
+def read_order_before_save(sender, instance, raw=False, **kwargs):
+    instance._rollup_contribution = None
+    if not raw and instance.pk:
+        instance._rollup_contribution = rollups.order_contribution(Order.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Order)
+def update_order_after_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rollups.replace_contribution(getattr(instance, '_rollup_contribution', None),
+                                     rollups.order_contribution(Order.objects.filter(pk=instance.pk)))
+
+
+@receiver(pre_delete, sender=Order)
+def remove_order_before_delete(sender, instance, **kwargs):
+    rollups.remove_orders(Order.objects.filter(pk=instance.pk))
+
+
+@receiver(m2m_changed, sender=Order.services.through)
+def update_orders_on_services_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('pre_add', 'post_add', 'pre_remove', 'post_remove', 'pre_clear', 'post_clear'):
+        return
+
+    if not reverse:
+        order_ids = [instance.pk]
+    elif action == 'post_clear':
+        order_ids = getattr(instance, '_rollup_order_ids', [])
+    elif action == 'pre_clear':
+        # The cleared orders are not known any more after the clear
+        order_ids = instance._rollup_order_ids = list(instance.orders.values_list('pk', flat=True))
+    else:
+        order_ids = list(pk_set or [])
+
+    if not order_ids:
+        return
+    if action.startswith('pre_'):
+        rollups.remove_orders(Order.objects.filter(pk__in=order_ids))
+    else:
+        rollups.add_orders(Order.objects.filter(pk__in=order_ids))
+
+
+@receiver(orders_bulk_created)
+def add_orders_after_bulk_create(sender, order_ids, **kwargs):
+    rollups.add_orders(Order.objects.filter(pk__in=order_ids))
+    bump_data_version(DataVersion.SOURCE_ORDERS)
+
+
+@receiver(order_totals_pre_repair)
+def remove_orders_before_repair(sender, order_ids, **kwargs):
+    rollups.remove_orders(Order.objects.filter(pk__in=order_ids))
+
+
+@receiver(order_totals_post_repair)
+def add_orders_after_repair(sender, order_ids, **kwargs):
+    rollups.add_orders(Order.objects.filter(pk__in=order_ids))
+    bump_data_version(DataVersion.SOURCE_ORDERS)
+
+
+@receiver(pre_save, sender=Service)
+def read_service_orders_before_save(sender, instance, raw=False, **kwargs):
+    instance._rollup_order_ids = []
+    if raw or not instance.pk:
+        return
+    previous = Service.objects.filter(pk=instance.pk).values('price', 'provider_id').first()
+    if previous is None or (previous['price'] == instance.price and previous['provider_id'] == instance.provider_id):
+        return
+    instance._rollup_order_ids = list(instance.orders.values_list('pk', flat=True))
+    instance._rollup_contribution = rollups.order_contribution(Order.objects.filter(pk__in=instance._rollup_order_ids))
+
+
+@receiver(post_save, sender=Service)
+def update_service_orders_after_save(sender, instance, raw=False, **kwargs):
+    if not raw and getattr(instance, '_rollup_order_ids', None):
+        orders = Order.objects.filter(pk__in=instance._rollup_order_ids)
+        rollups.replace_contribution(instance._rollup_contribution, rollups.order_contribution(orders))
+
+
+@receiver(pre_delete, sender=Service)
+def remove_service_orders_before_delete(sender, instance, **kwargs):
+    instance._rollup_order_ids = list(instance.orders.values_list('pk', flat=True))
+    rollups.remove_orders(Order.objects.filter(pk__in=instance._rollup_order_ids))
+
+
+@receiver(post_delete, sender=Service)
+def add_service_orders_after_delete(sender, instance, **kwargs):
+    # The orders remain, without the deleted service
+    if getattr(instance, '_rollup_order_ids', None):
+        rollups.add_orders(Order.objects.filter(pk__in=instance._rollup_order_ids))
+
+
+@receiver(pre_save, sender=Job)
+def read_job_before_save(sender, instance, raw=False, **kwargs):
+    instance._rollup_contribution = None
+    if not raw and instance.pk:
+        instance._rollup_contribution = rollups.job_contribution(Job.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Job)
+def update_job_after_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rollups.replace_contribution(getattr(instance, '_rollup_contribution', None),
+                                     rollups.job_contribution(Job.objects.filter(pk=instance.pk)))
+
+
+@receiver(pre_delete, sender=Job)
+def remove_job_before_delete(sender, instance, **kwargs):
+    rollups.remove_jobs(Job.objects.filter(pk=instance.pk))
+
+
+@receiver(jobs_pre_upsert)
+def remove_jobs_before_upsert(sender, job_ids, **kwargs):
+    rollups.remove_jobs(Job.objects.filter(job_id__in=job_ids))
+
+
+@receiver(jobs_post_upsert)
+def add_jobs_after_upsert(sender, job_ids, **kwargs):
+    rollups.add_jobs(Job.objects.filter(job_id__in=job_ids))
+    bump_data_version(DataVersion.SOURCE_JOBS)
+
+
+@receiver(pre_save, sender=Customer)
+def read_customer_before_save(sender, instance, raw=False, **kwargs):
+    instance._rollup_contribution = None
+    if not raw and instance.pk:
+        instance._rollup_contribution = rollups.customer_contribution(Customer.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Customer)
+def update_customer_after_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rollups.replace_contribution(getattr(instance, '_rollup_contribution', None),
+                                     rollups.customer_contribution(Customer.objects.filter(pk=instance.pk)))
+
+
+@receiver(pre_delete, sender=Customer)
+def remove_customer_before_delete(sender, instance, **kwargs):
+    rollups.remove_customers(Customer.objects.filter(pk=instance.pk))
+
+
+# Column store
+
+@receiver(post_save, sender=Order)
+def mark_order_dirty_after_save(sender, instance, created=False, raw=False, **kwargs):
+    if not raw and not created:
+        columnar.mark_dirty('orders', [instance.pk])
+
+
+@receiver(post_delete, sender=Order)
+def mark_order_dirty_after_delete(sender, instance, **kwargs):
+    columnar.mark_dirty('orders', [instance.pk])
+
+
+@receiver(m2m_changed, sender=Order.services.through)
+def mark_orders_dirty_on_services_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        columnar.mark_dirty('orders', [instance.pk])
+    elif action == 'post_clear':
+        # Collected before the clear, see update_orders_on_services_change
+        columnar.mark_dirty('orders', getattr(instance, '_rollup_order_ids', []))
+    else:
+        columnar.mark_dirty('orders', pk_set or [])
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def mark_service_orders_dirty(sender, instance, raw=False, **kwargs):
+    # Orders of a changed price or provider, collected for the rollups before the write
+    if not raw and getattr(instance, '_rollup_order_ids', None):
+        columnar.mark_dirty('orders', instance._rollup_order_ids)
+
+
+@receiver(order_totals_post_repair)
+def mark_orders_dirty_after_repair(sender, order_ids, **kwargs):
+    columnar.mark_dirty('orders', order_ids)
+
+
+@receiver(post_save, sender=Job)
+def mark_job_dirty_after_save(sender, instance, created=False, raw=False, **kwargs):
+    if not raw and not created:
+        columnar.mark_dirty('jobs', [instance.pk])
+
+
+@receiver(post_delete, sender=Job)
+def mark_job_dirty_after_delete(sender, instance, **kwargs):
+    columnar.mark_dirty('jobs', [instance.pk])
+
+
+@receiver(jobs_post_upsert)
+def mark_jobs_dirty_after_upsert(sender, job_ids, **kwargs):
+    columnar.mark_dirty('jobs', Job.objects.filter(job_id__in=job_ids).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Customer)
+def mark_customer_dirty_after_save(sender, instance, created=False, raw=False, **kwargs):
+    if not raw and not created:
+        columnar.mark_dirty('customers', [instance.pk])
+
+
+@receiver(post_delete, sender=Customer)
+def mark_customer_dirty_after_delete(sender, instance, **kwargs):
+    columnar.mark_dirty('customers', [instance.pk])
+
+
+# Data versions
+
+VERSIONED_MODELS = {
+    Order: DataVersion.SOURCE_ORDERS,
+    Service: DataVersion.SOURCE_ORDERS,
+    ServiceProvider: DataVersion.SOURCE_ORDERS,
+    # Account manager names and counts are part of the statistics
+    AccountManager: DataVersion.SOURCE_ORDERS,
+    User: DataVersion.SOURCE_ORDERS,
+    Job: DataVersion.SOURCE_JOBS,
+    Customer: DataVersion.SOURCE_CUSTOMERS,
+}
+
+USER_REPORT_FIELDS = {'first_name', 'last_name', 'username'}
+
+
+def bump_version_after_write(sender, instance, update_fields=None, **kwargs):
+    # e.g. the last_login update on every login does not change any statistics
+    if sender is User and update_fields and not USER_REPORT_FIELDS.intersection(update_fields):
+        return
+    bump_data_version(VERSIONED_MODELS[sender])
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_version_after_write, sender=model, dispatch_uid=f'bump_version_save_{model.__name__}')
+    post_delete.connect(bump_version_after_write, sender=model, dispatch_uid=f'bump_version_delete_{model.__name__}')
+
+
+@receiver(m2m_changed, sender=Order.services.through)
+def bump_version_on_services_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_data_version(DataVersion.SOURCE_ORDERS)
@@ -0,0 +1,119 @@
+"""stat_analysis.singleflight.py
+
+This module coalesces concurrent computations of the same statistics.
+
+`advisory_lock` holds a lock across processes by inserting the row of
+its key into the ComputationLock table, which succeeds for exactly one
+caller as the key is unique. The others poll until the row is deleted.
+A lock not released within `REPORTS_LOCK_TIMEOUT` seconds, e.g. of a
+killed worker, is taken over.
+
+`single_flight` computes a value under the lock of its key: the first
+caller computes and stores it, callers arriving meanwhile wait for the
+lock and then find the stored value instead of computing it again.
+
+Inside a transaction no lock is taken: the others would only see it
+once the transaction commits, and waiting there for another holder
+could deadlock, as on SQLite the open transaction keeps the holder
+from deleting its row. The IMMEDIATE transactions of SQLite (see
+`pitc_project.sqlite`) already exclude all other writers meanwhile.
+
+Connections to a shared in-memory SQLite database, as in the tests,
+fail with "database table is locked" instead of waiting, so lock
+operations failing that way are retried.
+"""
+import datetime
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connection
+from django.utils import timezone
+
+from stat_analysis.models import ComputationLock
+
+
+# Seconds between two attempts to acquire a lock
+POLL_INTERVAL = 0.05
+
+
+class LockTimeout(Exception):
+    pass
+
+
+def _is_locked(error):
+    return 'locked' in str(error)
+
+
+def _retry_locked(operation):
+    while True:
+        try:
+            return operation()
+        except OperationalError as error:
+            if not _is_locked(error):
+                raise
+            time.sleep(POLL_INTERVAL)
+
+
+def try_acquire(key, owner, timeout):
+    """Take the lock of `key` if it is free or expired. Returns whether it was taken."""
+    now = timezone.now()
+    try:
+        ComputationLock.objects.filter(key=key, expires_at__lt=now).delete()
+        ComputationLock.objects.create(key=key, owner=owner, acquired_at=now,
+                                       expires_at=now + datetime.timedelta(seconds=timeout))
+    except IntegrityError:
+        return False
+    except OperationalError as error:
+        if not _is_locked(error):
+            raise
+        return False
+    return True
+
+
+def release(key, owner):
+    # Only our own lock, it may have expired and been taken over
+    _retry_locked(lambda: ComputationLock.objects.filter(key=key, owner=owner).delete())
+
+
+@contextmanager
+def advisory_lock(key, timeout=None, wait=None):
+    """Hold the lock of `key` in this block, waiting for it at most `wait` seconds (forever by default).
+
+    The lock expires after `timeout` seconds, by default the
+    `REPORTS_LOCK_TIMEOUT` setting. Raises LockTimeout when it could
+    not be taken in time.
+    """
+    if connection.in_atomic_block:
+        yield
+        return
+    if timeout is None:
+        timeout = getattr(settings, 'REPORTS_LOCK_TIMEOUT', 600)
+    owner = uuid.uuid4().hex
+    started = time.monotonic()
+    while not try_acquire(key, owner, timeout):
+        if wait is not None and time.monotonic() - started > wait:
+            raise LockTimeout(f"Lock {key} not acquired within {wait}s.")
+        time.sleep(POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        release(key, owner)
+
+
+def single_flight(key, lookup, compute):
+    """Return `lookup()`, or if it is None the result of `compute()`, computing it once at a time per `key`.
+
+    `compute` must store its result where `lookup` finds it, callers
+    waiting for the same key then return that instead of computing.
+    """
+    value = lookup()
+    if value is not None:
+        return value
+    with advisory_lock(key):
+        # Computed by the holder we waited for
+        value = lookup()
+        if value is None:
+            value = compute()
+    return value
@@ -0,0 +1,129 @@
+"""stat_analysis.sketches.py
+
+This module approximates the distribution of Job completion times.
+
+QuantileSketch counts values in logarithmically sized buckets, so
+every quantile is returned with a relative error of at most
+`RELATIVE_ACCURACY` while the memory only grows with the logarithm
+of the value range. Sketches are merged by adding the bucket counts,
+which makes them suitable for the per-quarter rollups.
+
+The bucket of a value can be computed in the database with
+`bucket_expression`, so the job rows never have to be fetched.
+"""
+import math
+
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.functions import Cast, Ceil, Ln
+
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+
+# Bucket of zero and negative values
+ZERO_BUCKET = 'z'
+
+# Lower edges of the histogram bins in days
+HISTOGRAM_EDGES = [0, 1, 2, 5, 10, 20, 50, 100]
+
+
+def bucket_of(value):
+    if value <= 0:
+        return ZERO_BUCKET
+    return str(math.ceil(math.log(value) / LOG_GAMMA))
+
+
+def bucket_expression(field):
+    """SQL expression of the bucket index of `field`, NULL for non-positive values."""
+    return Case(
+        When(**{f'{field}__gt': 0}, then=Cast(Ceil(Ln(field) / Value(LOG_GAMMA)), IntegerField())),
+        default=None,
+        output_field=IntegerField(),
+    )
+
+
+def histogram_labels():
+    labels = [f"{low}-{high}" for low, high in zip(HISTOGRAM_EDGES, HISTOGRAM_EDGES[1:])]
+    return labels + [f"{HISTOGRAM_EDGES[-1]}+"]
+
+
+class QuantileSketch:
+    """Mergeable sketch of a distribution of non-negative values."""
+
+    def __init__(self, buckets=None):
+        self.buckets = dict(buckets or {})
+
+    @classmethod
+    def from_bucket_rows(cls, rows):
+        """Build a sketch from (bucket index or None, count) pairs, e.g. from a grouped query."""
+        sketch = cls()
+        for bucket, count in rows:
+            key = ZERO_BUCKET if bucket is None else str(bucket)
+            sketch.buckets[key] = sketch.buckets.get(key, 0) + count
+        return sketch
+
+    def add(self, value, count=1):
+        key = bucket_of(value)
+        self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def merge(self, other, sign=1):
+        """Add (or with `sign=-1` remove) the counts of `other`."""
+        for key, count in other.buckets.items():
+            total = self.buckets.get(key, 0) + sign * count
+            if total:
+                self.buckets[key] = total
+            else:
+                self.buckets.pop(key, None)
+        return self
+
+    @property
+    def count(self):
+        return sum(self.buckets.values())
+
+    def _sorted_buckets(self):
+        # The zero bucket holds the smallest values
+        keys = sorted((int(key) for key in self.buckets if key != ZERO_BUCKET))
+        if ZERO_BUCKET in self.buckets:
+            yield 0.0, self.buckets[ZERO_BUCKET]
+        for key in keys:
+            yield 2 * GAMMA ** key / (GAMMA + 1), self.buckets[str(key)]
+
+    def quantile(self, q):
+        """Approximate `q`-quantile (0 <= q <= 1), or None for an empty sketch."""
+        total = self.count
+        if total <= 0:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for value, count in self._sorted_buckets():
+            seen += count
+            if seen > rank:
+                return value
+        return value
+
+    def histogram(self):
+        """Number of values per bin of `HISTOGRAM_EDGES`, keyed by bin label."""
+        labels = histogram_labels()
+        counts = dict.fromkeys(labels, 0)
+        # A bin holds the buckets from the one of its lower edge on, so values on an edge are counted above it
+        edge_keys = [int(bucket_of(edge)) for edge in HISTOGRAM_EDGES[1:]]
+        for key, count in self.buckets.items():
+            index = 0
+            if key != ZERO_BUCKET:
+                while index < len(edge_keys) and int(key) >= edge_keys[index]:
+                    index += 1
+            counts[labels[index]] += count
+        return counts
+
+    def to_dict(self):
+        return dict(self.buckets)
+
+    def summary(self):
+        """Median, p90, p99 and histogram of the sketch."""
+        return {
+            'median': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'histogram': self.histogram(),
+        }
@@ -0,0 +1,45 @@
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from stat_analysis.models import Report, JobReportResult, OrderReportResult, UserReportResult
+
+
+@override_settings(REPORTS_COMPUTE_IN_BACKGROUND=True)
+class ReportChangelistQueryCountTest(TestCase):
+    """The report changelists render with the same number of queries for 5 and 120 rows."""
+
+    changelists = ['stat_analysis_report', 'stat_analysis_jobreportresult', 'stat_analysis_orderreportresult',
+                   'stat_analysis_userreportresult']
+
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser("admin")
+        self.rows = 0
+
+    def create_reports(self, count):
+        for index in range(self.rows, self.rows + count):
+            user = User.objects.create(username=f"user{index}")
+            report = Report.objects.create(title=f"Report {index}", quarter_from="Q1", year_from=2000 + index,
+                                           quarter_to="Q1", year_to=2000 + index, created_by=user)
+            JobReportResult.objects.create(report=report, total_jobs=1, num_completed=1)
+            OrderReportResult.objects.create(report=report, total_orders=1, total_revenue=Decimal("10.00"),
+                                             average_order_value=Decimal("10.00"))
+            UserReportResult.objects.create(report=report, total_customers=1, new_customers=1)
+        self.rows += count
+
+    def changelist_queries(self, changelist):
+        self.client.force_login(self.admin_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:{changelist}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries.captured_queries)
+
+    def test_query_count_does_not_depend_on_rows(self):
+        self.create_reports(5)
+        few = {changelist: self.changelist_queries(changelist) for changelist in self.changelists}
+        self.create_reports(115)
+        for changelist in self.changelists:
+            with self.subTest(changelist=changelist):
+                self.assertEqual(self.changelist_queries(changelist), few[changelist])
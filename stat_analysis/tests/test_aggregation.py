@@ -0,0 +1,61 @@
+import datetime
+from decimal import Decimal
+from django.test import TestCase
+from django.contrib.auth.models import User
+from stat_analysis.aggregation import aggregate_order_stats
+from core.models import Order, Customer, AccountManager, ServiceProvider, Service
+
+
+class AggregateOrderStatsTest(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username="manager1", first_name="John", last_name="Doe")
+        self.manager1 = AccountManager.objects.create(user=self.user1)
+        self.user2 = User.objects.create(username="manager2")
+        self.manager2 = AccountManager.objects.create(user=self.user2)
+
+        self.customer = Customer.objects.create(name="Customer", created_by=self.manager1)
+
+        provider1 = ServiceProvider.objects.create(name="Provider 1")
+        provider2 = ServiceProvider.objects.create(name="Provider 2")
+        self.service1 = Service.objects.create(name="Service 1", price=Decimal('100.00'), provider=provider1)
+        self.service2 = Service.objects.create(name="Service 2", price=Decimal('200.00'), provider=provider1)
+        self.service3 = Service.objects.create(name="Service 3", price=Decimal('50.00'), provider=provider2)
+
+        self.base_date = datetime.datetime(2024, 1, 15, tzinfo=datetime.timezone.utc)
+
+    def create_orders(self, count, manager, services):
+        for _ in range(count):
+            order = Order.objects.create(customer=self.customer, account_manager=manager, created_at=self.base_date)
+            order.services.add(*services)
+
+    def test_order_statistics_are_aggregated_correctly(self):
+        self.create_orders(2, self.manager1, [self.service1, self.service2])
+        self.create_orders(1, self.manager2, [self.service3])
+        self.create_orders(1, self.manager2, [])
+
+        stats = aggregate_order_stats(Order.objects.all())
+
+        self.assertEqual(stats['total_orders'], 4)
+        self.assertEqual(stats['total_revenue'], Decimal('650.00'))  # 2 * 300 + 50
+        self.assertEqual(stats['average_order_value'], Decimal('162.50'))
+        # Orders with two services of one provider are counted once
+        self.assertEqual(stats['orders_per_service_provider'], {'Provider 1': 2, 'Provider 2': 1})
+        self.assertEqual(stats['orders_per_account_manager'], {'John Doe': 2, 'manager2': 2})
+
+    def test_empty_queryset(self):
+        stats = aggregate_order_stats(Order.objects.none())
+
+        self.assertEqual(stats['total_orders'], 0)
+        self.assertEqual(stats['total_revenue'], Decimal('0.00'))
+        self.assertEqual(stats['average_order_value'], Decimal('0.00'))
+
+    def test_query_count_does_not_depend_on_order_volume(self):
+        self.create_orders(3, self.manager1, [self.service1, self.service3])
+        with self.assertNumQueries(3):
+            aggregate_order_stats(Order.objects.all())
+
+        self.create_orders(50, self.manager2, [self.service2, self.service3])
+        with self.assertNumQueries(3):
+            stats = aggregate_order_stats(Order.objects.all())
+
+        self.assertEqual(stats['total_orders'], 53)
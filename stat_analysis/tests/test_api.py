@@ -0,0 +1,117 @@
+import datetime
+from decimal import Decimal
+from django.contrib.auth.models import Permission, User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from core.models import AccountManager, Customer, Order, Service, ServiceProvider
+from stat_analysis.models import Report, ReportTask
+from stat_analysis.worker import process_next_task
+
+
+@override_settings(
+    CACHES={'stats': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    REPORTS_CACHE='stats',
+    REPORTS_COMPUTE_IN_BACKGROUND=True,
+    REPORTS_COMPUTE_METRICS=True,
+)
+class ReportApiTest(TestCase):
+    def setUp(self):
+        user = User.objects.create(username="manager", first_name="Anna", last_name="Bauer")
+        manager = AccountManager.objects.create(user=user)
+        customer = Customer.objects.create(name="Acme", created_by=manager)
+        provider = ServiceProvider.objects.create(name="Fab")
+        service = Service.objects.create(name="Etch", price=Decimal("10.00"), provider=provider)
+        order = Order.objects.create(customer=customer, account_manager=manager,
+                                     created_at=datetime.datetime(2024, 2, 1, tzinfo=datetime.timezone.utc))
+        order.services.add(service)
+        self.reports = [
+            Report.objects.create(title=f"Report {index}", quarter_from="Q1", year_from=2024,
+                                  quarter_to="Q1", year_to=2024)
+            for index in range(3)
+        ]
+        self.client.force_login(User.objects.create_superuser("admin"))
+
+    def detail_url(self, report):
+        return reverse('stat_analysis:api_report', args=[report.pk])
+
+    def test_list_pages(self):
+        response = self.client.get(reverse('stat_analysis:api_reports'), {'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([report['id'] for report in data['reports']], [self.reports[2].pk, self.reports[1].pk])
+
+        response = self.client.get(reverse('stat_analysis:api_reports'), {'limit': 2, 'before': data['next']})
+        data = response.json()
+        self.assertEqual([report['id'] for report in data['reports']], [self.reports[0].pk])
+        self.assertIsNone(data['next'])
+
+        self.assertEqual(self.client.get(reverse('stat_analysis:api_reports'), {'limit': 0}).status_code, 400)
+
+    def test_list_is_revalidated(self):
+        url = reverse('stat_analysis:api_reports')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+        self.reports[0].delete()
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['reports']), 2)
+
+    async def test_detail_with_results(self):
+        await self.async_client.aforce_login(await User.objects.aget(username="admin"))
+        response = await self.async_client.get(self.detail_url(self.reports[0]))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['status'], Report.STATUS_PENDING)
+        self.assertEqual(data['results'], {'jobs': None, 'orders': None, 'users': None})
+        self.assertEqual(data['metrics'], {})
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertTrue(response.has_header('Last-Modified'))
+
+    def test_unchanged_report_is_not_modified(self):
+        response = self.client.get(self.detail_url(self.reports[0]))
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        response = self.client.get(self.detail_url(self.reports[0]), headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+        response = self.client.get(self.detail_url(self.reports[0]), headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+
+        # Computing the report changes it
+        while process_next_task():
+            pass
+        response = self.client.get(self.detail_url(self.reports[0]), headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['status'], Report.STATUS_DONE)
+        self.assertEqual(data['results']['orders']['total_orders'], 1)
+        self.assertEqual(data['results']['orders']['total_revenue'], "10.00")
+        self.assertEqual(data['metrics']['largest_order_value'], "10.00")
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_of_unknown_report(self):
+        self.assertEqual(self.client.get(reverse('stat_analysis:api_report', args=[0])).status_code, 404)
+
+    async def test_recompute_queues_report(self):
+        await self.async_client.aforce_login(await User.objects.aget(username="admin"))
+        report = self.reports[0]
+        await ReportTask.objects.filter(report=report).adelete()
+        await Report.objects.filter(pk=report.pk).aupdate(status=Report.STATUS_DONE, progress=100)
+
+        response = await self.async_client.post(reverse('stat_analysis:api_recompute_report', args=[report.pk]))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], Report.STATUS_PENDING)
+        self.assertTrue(await ReportTask.objects.filter(report=report).aexists())
+
+    def test_recompute_requires_post_and_permission(self):
+        url = reverse('stat_analysis:api_recompute_report', args=[self.reports[0].pk])
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+        staff = User.objects.create_user("staff", is_staff=True)
+        staff.user_permissions.add(Permission.objects.get(codename='view_report'))
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(self.detail_url(self.reports[0])).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 403)
@@ -0,0 +1,40 @@
+from django.test import TestCase
+from core.models import Order, AccountManager
+from execution.models import Job
+from stat_analysis.benchmarks import compare_results
+from stat_analysis.datagen import generate_data
+from stat_analysis.rollups import verify_rollups
+from stat_analysis.stat_utils import get_quarter_index
+
+
+class GenerateDataTest(TestCase):
+    def test_generated_rows_respect_provider_permissions(self):
+        generate_data(orders=200, jobs=100, customers=20, managers=5, providers=10, services=40,
+                      year_from=2024, year_to=2024, batch_size=64, seed=1)
+        generate_data(orders=10, jobs=10, customers=2, managers=1, providers=1, services=1,
+                      year_from=2024, year_to=2024, seed=2)
+
+        self.assertEqual(Order.objects.count(), 210)
+        self.assertEqual(Job.objects.count(), 110)
+        for manager in AccountManager.objects.prefetch_related('service_providers'):
+            allowed = {provider.pk for provider in manager.service_providers.all()}
+            used = set(Order.services.through.objects.filter(order__account_manager=manager)
+                       .values_list('service__provider', flat=True))
+            self.assertLessEqual(used, allowed)
+
+        # Rollups were rebuilt after the bulk inserts
+        quarters = list(range(get_quarter_index('Q1', 2024), get_quarter_index('Q4', 2024) + 1))
+        self.assertEqual(verify_rollups(quarters), [])
+
+
+class CompareResultsTest(TestCase):
+    def result(self, wall_time=1.0, peak_memory=1000, queries=5):
+        return {'results': [{'scale': 1000, 'calculator': 'calculate_job_stats',
+                             'wall_time': wall_time, 'peak_memory': peak_memory, 'queries': queries}]}
+
+    def test_regressions_are_flagged(self):
+        baseline = self.result()
+
+        self.assertEqual(compare_results(self.result(wall_time=1.1, peak_memory=1100), baseline), [])
+        self.assertEqual(len(compare_results(self.result(wall_time=2.0), baseline)), 1)
+        self.assertEqual(len(compare_results(self.result(peak_memory=5000, queries=6), baseline)), 2)
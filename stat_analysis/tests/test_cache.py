@@ -0,0 +1,66 @@
+import datetime
+from unittest import mock
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from execution.models import Job
+from stat_analysis.models import Report, ReportTask
+from stat_analysis.pipeline import ReportPipeline
+
+
+@override_settings(
+    CACHES={'reports': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-reports'}},
+    REPORTS_CACHE='reports',
+    REPORTS_COMPUTE_IN_BACKGROUND=False,
+)
+class ReportCacheTest(TestCase):
+    def setUp(self):
+        caches['reports'].clear()
+        self.base_date = datetime.datetime(2024, 1, 15, tzinfo=datetime.timezone.utc)
+        self.create_job("J1")
+
+    def create_job(self, job_id):
+        Job.objects.create(
+            job_id=job_id, job_name=job_id, state="completed", job_type="regular",
+            starting_date=self.base_date, end_date=self.base_date + datetime.timedelta(days=2),
+            completion_time=2
+        )
+
+    def create_report(self, title="Q1"):
+        return Report.objects.create(title=title, quarter_from="Q1", year_from=2024,
+                                     quarter_to="Q1", year_to=2024)
+
+    def test_same_range_is_computed_once(self):
+        self.create_report()
+        with mock.patch.object(ReportPipeline, 'compute_job_stats') as compute:
+            report = self.create_report("Same range")
+        compute.assert_not_called()
+        self.assertEqual(report.jobreportresult.total_jobs, 1)
+
+    def test_data_change_invalidates_cached_stats(self):
+        self.create_report()
+        self.create_job("J2")
+
+        report = self.create_report("After new job")
+        self.assertEqual(report.jobreportresult.total_jobs, 2)
+
+    def test_only_range_changes_trigger_a_recompute(self):
+        report = self.create_report()
+
+        with mock.patch.object(ReportPipeline, 'run') as run:
+            report.title = "Renamed"
+            report.save()
+            Report.objects.get(pk=report.pk).save()
+            run.assert_not_called()
+
+            report.quarter_to = "Q2"
+            report.save()
+            run.assert_called_once()
+
+    @override_settings(REPORTS_COMPUTE_IN_BACKGROUND=True)
+    def test_unchanged_range_is_not_queued(self):
+        report = self.create_report()
+        ReportTask.objects.all().delete()
+
+        report.title = "Renamed"
+        report.save()
+        self.assertFalse(ReportTask.objects.exists())
@@ -0,0 +1,143 @@
+import datetime
+import json
+import shutil
+import tempfile
+from unittest import mock, skipUnless
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from core.models import Order, Service
+from execution.models import Job
+from stat_analysis.columnar import ColumnStore, np, refresh_store
+from stat_analysis.datagen import generate_data
+from stat_analysis.models import Report, OrderReportResult
+from stat_analysis.pipeline import ReportPipeline
+from stat_analysis.rollups import compare_stats, raw_stats
+from stat_analysis.routers import analytics_reads
+from stat_analysis.stat_utils import get_quarter_index
+
+
+def temporary_store(test):
+    path = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, path)
+    store_settings = override_settings(REPORTS_COLUMNAR_DIR=path)
+    store_settings.enable()
+    test.addCleanup(store_settings.disable)
+    return ColumnStore()
+
+
+@skipUnless(np, "NumPy is not installed")
+@override_settings(
+    CACHES={'stats': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    REPORTS_CACHE='stats',
+    REPORTS_COMPUTE_IN_BACKGROUND=True,
+    REPORTS_USE_ROLLUPS=False,
+)
+class ColumnStoreTest(TransactionTestCase):
+    """Outside of a transaction, so the changed rows are recorded on commit."""
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.store = temporary_store(self)
+        generate_data(orders=300, jobs=300, customers=30, managers=5, providers=6, services=30,
+                      year_from=2023, year_to=2024, seed=5)
+        self.quarters = get_quarter_index('Q1', 2023), get_quarter_index('Q3', 2024)
+        self.store.refresh()
+
+    def assertMatchesRawScan(self):
+        expected = raw_stats(*self.quarters)
+        actual = self.store.stats(*self.quarters)
+        for stage in ['jobs', 'orders', 'users']:
+            self.assertEqual(compare_stats(expected[stage], actual[stage]), [], stage)
+        self.assertEqual(actual['orders']['total_revenue'], expected['orders']['total_revenue'])
+
+    def test_parity_with_single_scan(self):
+        self.assertMatchesRawScan()
+        # Jobs ending after the range are left out
+        self.assertLess(self.store.stats(*self.quarters)['jobs']['total_jobs'], 300)
+
+    def test_new_rows_are_appended(self):
+        order = Order.objects.create(customer_id=Order.objects.first().customer_id,
+                                     account_manager_id=Order.objects.first().account_manager_id,
+                                     created_at=datetime.datetime(2024, 2, 1, tzinfo=datetime.timezone.utc))
+        order.services.add(*Service.objects.all()[:2])
+
+        self.assertEqual(self.store.refresh(), {'orders': 1, 'jobs': 0, 'customers': 0})
+        self.assertMatchesRawScan()
+        self.assertEqual(self.store.refresh(), {'orders': 0, 'jobs': 0, 'customers': 0})
+
+    def test_changed_rows_reload_their_quarters(self):
+        moved = Order.objects.order_by('pk')[0]
+        moved.created_at = datetime.datetime(2024, 8, 1, tzinfo=datetime.timezone.utc)
+        moved.save()
+        Order.objects.order_by('pk')[1].services.clear()
+        service = Service.objects.filter(orders__isnull=False).first()
+        service.price += 1
+        service.save()
+        Order.objects.order_by('pk')[2].delete()
+        job = Job.objects.order_by('pk')[0]
+        job.state = 'completed' if job.state != 'completed' else 'active'
+        job.save()
+        Job.objects.order_by('pk')[1].delete()
+
+        loaded = self.store.refresh()
+        self.assertGreater(loaded['orders'], 0)
+        self.assertGreater(loaded['jobs'], 0)
+        self.assertMatchesRawScan()
+
+    @override_settings(REPORTS_READ_DATABASE='replica')
+    def test_refresh_reads_primary(self):
+        job = Job.objects.order_by('pk')[0]
+        job.state = 'completed' if job.state != 'completed' else 'active'
+        job.save()
+
+        with CaptureQueriesContext(connections['replica']) as replica, analytics_reads():
+            self.assertTrue(refresh_store())
+        self.assertEqual(replica.captured_queries, [])
+        self.assertMatchesRawScan()
+
+    def test_quarter_is_compacted(self):
+        order = Order.objects.order_by('pk').last()
+        quarter = str(get_quarter_index('Q1', 2024))
+        with mock.patch('stat_analysis.columnar.MAX_SEGMENTS', 3):
+            for _ in range(2):
+                Order.objects.create(customer_id=order.customer_id, account_manager_id=order.account_manager_id,
+                                     created_at=datetime.datetime(2024, 2, 1, tzinfo=datetime.timezone.utc))
+                self.store.refresh()
+        self.assertEqual(self.store.read_manifest()['tables']['orders']['quarters'][quarter][1], 1)
+        self.assertMatchesRawScan()
+
+    def test_rebuild_after_bypassing_writes(self):
+        Order.objects.filter(pk__in=Order.objects.order_by('pk').values('pk')[:10]).update(total_value=0)
+        self.assertEqual(self.store.refresh(), {'orders': 0, 'jobs': 0, 'customers': 0})
+
+        call_command('refresh_columns', '--rebuild', stdout=mock.Mock())
+        self.assertMatchesRawScan()
+
+    def test_pipeline_uses_store(self):
+        report = Report.objects.create(title="Long", quarter_from="Q1", year_from=2023,
+                                       quarter_to="Q3", year_to=2024)
+        pipeline = ReportPipeline(report)
+        pipeline.run()
+        self.assertTrue(pipeline.use_columnar)
+        self.assertFalse(pipeline.use_fanout)
+        self.assertEqual(OrderReportResult.objects.get(report=report).total_orders,
+                         raw_stats(*self.quarters)['orders']['total_orders'])
+
+    def test_store_of_other_database_is_not_used(self):
+        manifest = json.loads(self.store.manifest_path.read_text())
+        self.store.manifest_path.write_text(json.dumps(dict(manifest, database='other')))
+        self.assertFalse(refresh_store())
+
+
+class WithoutNumpyTest(TestCase):
+    def setUp(self):
+        self.store = temporary_store(self)
+
+    def test_store_is_not_used(self):
+        with mock.patch('stat_analysis.columnar.np', None):
+            self.assertFalse(refresh_store())
+            with self.assertRaises(CommandError):
+                call_command('refresh_columns')
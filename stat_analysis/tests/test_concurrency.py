@@ -0,0 +1,47 @@
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from pitc_project.sqlite import sqlite_options
+from stat_analysis.concurrency import summarize
+
+
+class SqliteOptionsTest(SimpleTestCase):
+    def test_profiles(self):
+        stock = sqlite_options('stock')
+        self.assertIsNone(stock['transaction_mode'])
+        self.assertIn('PRAGMA journal_mode=DELETE', stock['init_command'])
+
+        production = sqlite_options('production')
+        self.assertEqual(production['transaction_mode'], 'IMMEDIATE')
+        self.assertIn('PRAGMA busy_timeout=5000', production['init_command'].split(';'))
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            sqlite_options('fast')
+
+
+class ConnectionProfileTest(TestCase):
+    def test_connection_runs_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA temp_store')
+            # MEMORY
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+
+class SummarizeTest(SimpleTestCase):
+    def test_summary(self):
+        latencies = [0.01 * i for i in range(1, 101)]
+        summary = summarize(latencies, baseline=0.2, errors=3, duration=10)
+
+        self.assertEqual(summary['operations'], 100)
+        self.assertEqual(summary['errors'], 3)
+        self.assertEqual(summary['throughput'], 10)
+        self.assertAlmostEqual(summary['latency_p95'], 0.96)
+        self.assertAlmostEqual(summary['lock_wait_p95'], 0.76)
+        self.assertAlmostEqual(summary['lock_wait_p50'], 0.31)
+        self.assertEqual(summary['latency_max'], 1.0)
+
+    def test_without_operations(self):
+        self.assertEqual(summarize([], baseline=0.1, errors=2, duration=5),
+                         {'operations': 0, 'errors': 2, 'throughput': 0.0})
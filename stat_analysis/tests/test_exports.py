@@ -0,0 +1,105 @@
+import csv
+import datetime
+import io
+import json
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from core.models import AccountManager, Customer, Order, Service, ServiceProvider
+from execution.models import Job
+from stat_analysis.exports import export_report_data
+from stat_analysis.models import Report
+
+
+@override_settings(REPORTS_COMPUTE_IN_BACKGROUND=True)
+class ExportTest(TestCase):
+    def setUp(self):
+        user = User.objects.create(username="manager", first_name="Anna", last_name="Bauer")
+        self.manager = AccountManager.objects.create(user=user)
+        self.customer = Customer.objects.create(name="Acme", created_by=self.manager)
+        provider = ServiceProvider.objects.create(name="Fab")
+        self.services = [
+            Service.objects.create(name="Etch", price=Decimal("10.50"), provider=provider),
+            Service.objects.create(name="Dice", price=Decimal("4.50"), provider=provider),
+        ]
+        in_range = datetime.datetime(2024, 2, 1, tzinfo=datetime.timezone.utc)
+        out_of_range = datetime.datetime(2024, 5, 1, tzinfo=datetime.timezone.utc)
+        self.order = self.create_order(in_range, self.services)
+        self.create_order(out_of_range, self.services[:1])
+        self.create_job("J1", in_range)
+        self.create_job("J2", out_of_range)
+        self.report = Report.objects.create(title="Q1", quarter_from="Q1", year_from=2024,
+                                            quarter_to="Q1", year_to=2024)
+
+    def create_order(self, created_at, services):
+        order = Order.objects.create(customer=self.customer, account_manager=self.manager, created_at=created_at)
+        order.services.set(services)
+        return order
+
+    def create_job(self, job_id, starting_date):
+        Job.objects.create(job_id=job_id, job_name=f"Job {job_id}", state="completed", job_type="regular",
+                           starting_date=starting_date, end_date=starting_date + datetime.timedelta(days=2),
+                           completion_time=2)
+
+    def export(self, kind, export_format, **kwargs):
+        return ''.join(export_report_data(kind, export_format, 'Q1', 2024, 'Q1', 2024, **kwargs))
+
+    def test_orders_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('orders', 'csv'))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['id'], str(self.order.pk))
+        self.assertEqual(rows[0]['account_manager'], "Anna Bauer")
+        self.assertEqual(rows[0]['services'], "Etch (Fab); Dice (Fab)")
+        self.assertEqual(rows[0]['providers'], "Fab")
+        self.assertEqual(Decimal(rows[0]['total_value']), Decimal("15.00"))
+
+    def test_orders_ndjson(self):
+        lines = self.export('orders', 'ndjson').splitlines()
+        self.assertEqual(len(lines), 1)
+        order = json.loads(lines[0])
+        self.assertEqual(order['customer'], "Acme")
+        self.assertEqual([service['name'] for service in order['services']], ["Etch", "Dice"])
+
+    def test_jobs_in_range(self):
+        jobs = [json.loads(line) for line in self.export('jobs', 'ndjson').splitlines()]
+        self.assertEqual([job['job_id'] for job in jobs], ["J1"])
+        rows = list(csv.DictReader(io.StringIO(self.export('jobs', 'csv'))))
+        self.assertEqual([row['job_id'] for row in rows], ["J1"])
+
+    def test_services_are_fetched_per_chunk(self):
+        for day in range(1, 6):
+            self.create_order(datetime.datetime(2024, 3, day, tzinfo=datetime.timezone.utc), self.services)
+
+        with CaptureQueriesContext(connection) as queries:
+            lines = self.export('orders', 'ndjson', chunk_size=2).splitlines()
+        self.assertEqual(len(lines), 6)
+        # One order query and one service query for each of the three chunks
+        self.assertEqual(len(queries.captured_queries), 4)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            export_report_data('orders', 'xml', 'Q1', 2024, 'Q1', 2024)
+
+    def test_view_streams_export(self):
+        self.client.force_login(User.objects.create_superuser("admin"))
+        response = self.client.get(reverse('stat_analysis:export_report', args=[self.report.pk, 'jobs', 'csv']))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('jobs_Q1_2024_Q1_2024.csv', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(content.splitlines()), 2)
+
+    def test_view_requires_permission(self):
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        response = self.client.get(reverse('stat_analysis:export_report', args=[self.report.pk, 'orders', 'csv']))
+        self.assertEqual(response.status_code, 403)
+
+    def test_command_writes_export(self):
+        output = io.StringIO()
+        call_command('export_report_data', 'orders', '--report', str(self.report.pk), '--format', 'ndjson',
+                     stdout=output)
+        self.assertEqual(json.loads(output.getvalue())['id'], self.order.pk)
@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.test import TransactionTestCase, override_settings
+from stat_analysis.datagen import generate_data
+from stat_analysis.fanout import fanout_stats, shutdown_spawned_pools, spawned_pool
+from stat_analysis.models import Report, JobReportResult, OrderReportResult
+from stat_analysis.pipeline import ReportPipeline
+from stat_analysis.rollups import compare_stats, raw_stats
+from stat_analysis.stat_utils import get_quarter_index
+
+
+@override_settings(
+    CACHES={'stats': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    REPORTS_CACHE='stats',
+    REPORTS_COMPUTE_IN_BACKGROUND=True,
+    REPORTS_USE_ROLLUPS=False,
+)
+class FanoutTest(TransactionTestCase):
+    """Outside of a transaction, so the quarters are computed by forked worker processes."""
+
+    def setUp(self):
+        generate_data(orders=400, jobs=400, customers=40, managers=5, providers=6, services=30,
+                      year_from=2023, year_to=2024, seed=3)
+        self.quarters = get_quarter_index('Q1', 2023), get_quarter_index('Q3', 2024)
+
+    def test_parity_with_single_scan(self):
+        expected = raw_stats(*self.quarters)
+        actual = fanout_stats(*self.quarters, workers=3)
+        for stage in ['jobs', 'orders', 'users']:
+            self.assertEqual(compare_stats(expected[stage], actual[stage]), [], stage)
+        # Counts and money are exact
+        self.assertEqual(actual['orders']['total_revenue'], expected['orders']['total_revenue'])
+        self.assertEqual(actual['users']['customers_with_orders'], expected['users']['customers_with_orders'])
+        # Jobs ending after the range are left out by both
+        self.assertLess(actual['jobs']['total_jobs'], 400)
+
+    def test_deterministic(self):
+        parallel = fanout_stats(*self.quarters, workers=4)
+        self.assertEqual(parallel, fanout_stats(*self.quarters, workers=1))
+        self.assertEqual(parallel, fanout_stats(*self.quarters, workers=2))
+
+    @override_settings(REPORTS_FANOUT_WORKERS=2)
+    def test_pipeline_fans_out(self):
+        report = Report.objects.create(title="Long", quarter_from="Q1", year_from=2023,
+                                       quarter_to="Q3", year_to=2024)
+        pipeline = ReportPipeline(report)
+        with mock.patch('os.cpu_count', return_value=4):
+            pipeline.run()
+        self.assertTrue(pipeline.use_fanout)
+
+        expected = raw_stats(*self.quarters)
+        self.assertEqual(OrderReportResult.objects.get(report=report).total_orders,
+                         expected['orders']['total_orders'])
+        self.assertEqual(JobReportResult.objects.get(report=report).total_jobs, expected['jobs']['total_jobs'])
+
+    @override_settings(REPORTS_FANOUT_WORKERS=2)
+    def test_pipeline_scans_at_once_with_one_cpu(self):
+        report = Report.objects.create(title="Long", quarter_from="Q1", year_from=2023,
+                                       quarter_to="Q3", year_to=2024)
+        with mock.patch('os.cpu_count', return_value=1):
+            self.assertFalse(ReportPipeline(report).use_fanout)
+
+    def test_threads_share_one_spawned_pool(self):
+        self.addCleanup(shutdown_spawned_pools)
+        with ThreadPoolExecutor(max_workers=2) as threads:
+            first, second = [future.result() for future in [threads.submit(spawned_pool, 2) for _ in range(2)]]
+        self.assertIs(first, second)
+        self.assertIs(spawned_pool(2), first)
+        self.assertIsNot(spawned_pool(3), first)
+
+    def test_threads_scan_in_memory_databases_themselves(self):
+        # Spawned workers would open empty in-memory databases of their own
+        with mock.patch('stat_analysis.fanout.spawned_pool') as pool, ThreadPoolExecutor(max_workers=1) as threads:
+            parallel = threads.submit(fanout_stats, *self.quarters, workers=3).result()
+        pool.assert_not_called()
+        self.assertEqual(parallel, fanout_stats(*self.quarters, workers=1))
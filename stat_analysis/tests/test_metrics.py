@@ -0,0 +1,157 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+from django.db.models import Max
+from django.test import TestCase, override_settings
+from core.models import Order
+from execution.models import Job
+from stat_analysis import metrics
+from stat_analysis.datagen import generate_data
+from stat_analysis.metrics import (
+    Maximum, Mean, Metric, Minimum, Sum, Tally, evaluate, evaluate_metrics, get_metrics, metrics_key, plan, register
+)
+from stat_analysis.models import MetricValue, Report
+from stat_analysis.pipeline import ReportPipeline
+from stat_analysis.stat_utils import get_report_range
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        generate_data(orders=200, jobs=200, customers=20, managers=4, providers=5, services=20,
+                      year_from=2024, year_to=2024, seed=7)
+        self.date_range = get_report_range('Q1', 2024, 'Q4', 2024)
+
+    def register(self, *args, **kwargs):
+        # Registered for this test only
+        metric = register(*args, **kwargs)
+        self.addCleanup(metrics.METRICS.pop, metric.name)
+        return metric
+
+    def test_plan_fetches_each_field_once(self):
+        self.register('total_services', 'orders', ['service_count'], Sum)
+        groups = plan(get_metrics(['largest_order_value', 'average_services_per_order', 'total_services',
+                                   'average_job_duration', 'jobs_per_type']))
+        self.assertEqual([(source, fields) for source, fields, _ in groups], [
+            ('orders', ['total_value', 'service_count']),
+            ('jobs', ['job_type', 'starting_date', 'end_date']),
+        ])
+
+    def test_one_query_per_source(self):
+        with self.assertNumQueries(3):
+            values = evaluate_metrics(*self.date_range)
+        self.assertEqual(set(values), set(metrics.METRICS))
+
+    def test_values(self):
+        values = evaluate_metrics(*self.date_range)
+        start_date, end_date = self.date_range
+        orders = Order.objects.filter(created_at__gte=start_date, created_at__lt=end_date)
+        jobs = Job.objects.filter(starting_date__gte=start_date, end_date__lt=end_date)
+
+        self.assertEqual(values['largest_order_value'], orders.aggregate(value=Max('total_value'))['value'])
+        self.assertEqual(sum(values['orders_per_weekday'].values()), orders.count())
+        self.assertEqual(values['jobs_per_type'],
+                         {job_type: jobs.filter(job_type=job_type).count()
+                          for job_type in sorted(set(jobs.values_list('job_type', flat=True)))})
+        self.assertEqual(values['longest_completion_time'], jobs.aggregate(value=Max('completion_time'))['value'])
+
+    def test_partials_merge(self):
+        start_date, end_date = self.date_range
+        middle = datetime.datetime(2024, 7, 1, tzinfo=datetime.timezone.utc)
+        # Jobs of the first half ending in the second are only counted over the whole range
+        selected = [metric for metric in get_metrics() if metric.source != 'jobs']
+        merged = evaluate(selected, start_date, middle)
+        for name, accumulator in evaluate(selected, middle, end_date).items():
+            merged[name].merge(accumulator)
+
+        whole = evaluate_metrics(start_date, end_date, names=[metric.name for metric in selected])
+        for name, accumulator in merged.items():
+            if isinstance(accumulator, Mean):
+                self.assertAlmostEqual(accumulator.result(), whole[name], msg=name)
+            else:
+                self.assertEqual(accumulator.result(), whole[name], name)
+
+    def test_key_changes_with_definition(self):
+        key = metrics_key([Metric('total_services', 'orders', ['service_count'], Sum)])
+        self.assertEqual(metrics_key([Metric('total_services', 'orders', ['service_count'], Sum)]), key)
+        for changed in [Metric('total_services', 'orders', ['service_count'], Minimum),
+                        Metric('total_services', 'orders', ['total_value'], Sum),
+                        Metric('total_services', 'orders', ['service_count'], Sum, value=abs)]:
+            self.assertNotEqual(metrics_key([changed]), key)
+
+    def test_accumulators_skip_null(self):
+        maximum, tally = Maximum(), Tally()
+        for value in [Decimal('2.00'), None, Decimal('3.50')]:
+            maximum.add(value)
+            tally.add(value)
+        self.assertEqual(maximum.result(), Decimal('3.50'))
+        self.assertEqual(tally.result(), {Decimal('2.00'): 1, Decimal('3.50'): 1})
+        self.assertIsNone(Mean().result())
+
+    def test_invalid_metrics(self):
+        with self.assertRaises(ValueError):
+            register('unknown_source', 'invoices', ['total'], Sum)
+        with self.assertRaises(ValueError):
+            register('two_fields', 'jobs', ['starting_date', 'end_date'], Mean)
+        with self.assertRaises(KeyError):
+            get_metrics(['missing'])
+
+    @override_settings(
+        CACHES={'stats': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'metrics'}},
+        REPORTS_CACHE='stats',
+        REPORTS_COMPUTE_IN_BACKGROUND=True,
+        REPORTS_COMPUTE_METRICS=True,
+    )
+    def test_pipeline_merges_quarters(self):
+        report = Report.objects.create(title="2024", quarter_from="Q1", year_from=2024, quarter_to="Q4", year_to=2024)
+        pipeline = ReportPipeline(report)
+        pipeline.compute()
+
+        whole = evaluate_metrics(*self.date_range)
+        self.assertEqual(set(pipeline.metric_values), set(whole))
+        for name, value in pipeline.metric_values.items():
+            if isinstance(value, float):
+                self.assertAlmostEqual(value, whole[name], msg=name)
+            else:
+                self.assertEqual(value, whole[name], name)
+
+        # The quarters of the first report are not evaluated again, only the jobs depend on the end of the range
+        later = Report.objects.create(title="Q2-Q3", quarter_from="Q2", year_from=2024, quarter_to="Q3",
+                                      year_to=2024)
+        with mock.patch('stat_analysis.pipeline.evaluate', wraps=evaluate) as evaluated:
+            ReportPipeline(later).compute()
+        self.assertEqual([{metric.source for metric in call.args[0]} for call in evaluated.call_args_list],
+                         [{'jobs'}, {'jobs'}])
+
+    @override_settings(REPORTS_COMPUTE_IN_BACKGROUND=True)
+    def test_metrics_are_opt_in(self):
+        report = Report.objects.create(title="2024", quarter_from="Q1", year_from=2024, quarter_to="Q4", year_to=2024)
+        ReportPipeline(report).run()
+        self.assertFalse(MetricValue.objects.filter(report=report).exists())
+        report.refresh_from_db()
+        self.assertNotIn('metric_values', [stage['name'] for stage in report.profile['stages']])
+
+    @override_settings(
+        CACHES={'stats': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'metrics'}},
+        REPORTS_CACHE='stats',
+        REPORTS_COMPUTE_IN_BACKGROUND=True,
+        REPORTS_COMPUTE_METRICS=True,
+    )
+    def test_new_metric_is_stored_without_migration(self):
+        report = Report.objects.create(title="2024", quarter_from="Q1", year_from=2024, quarter_to="Q4", year_to=2024)
+        ReportPipeline(report).run()
+        self.assertEqual(set(MetricValue.objects.filter(report=report).values_list('name', flat=True)),
+                         set(metrics.METRICS))
+
+        # Computed although the other statistics of the range are cached
+        self.register('total_services', 'orders', ['service_count'], Sum)
+        ReportPipeline(report).run()
+        start_date, end_date = self.date_range
+        self.assertEqual(MetricValue.objects.get(report=report, name='total_services').value,
+                         sum(Order.objects.filter(created_at__gte=start_date, created_at__lt=end_date)
+                             .values_list('service_count', flat=True)))
+
+        # Values of metrics no longer registered are removed
+        metrics.METRICS.pop('total_services')
+        self.addCleanup(metrics.METRICS.setdefault, 'total_services', None)
+        ReportPipeline(report).run()
+        self.assertFalse(MetricValue.objects.filter(report=report, name='total_services').exists())
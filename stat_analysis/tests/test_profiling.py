@@ -0,0 +1,86 @@
+import datetime
+import re
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from execution.models import Job
+from stat_analysis.models import Report
+from stat_analysis.pipeline import ReportPipeline
+from stat_analysis.profiling import Profiler, SlowRequestMiddleware
+
+
+class ProfilerTest(TestCase):
+    def setUp(self):
+        for index in range(3):
+            User.objects.create(username=f"user{index}")
+
+    def test_stage_counts_queries_and_rows(self):
+        profiler = Profiler()
+        with profiler.stage('users'):
+            list(User.objects.all())
+            User.objects.count()
+        with profiler.stage('idle'):
+            pass
+
+        users, idle = profiler.as_dict()['stages']
+        self.assertEqual(users['queries'], 2)
+        self.assertEqual(users['rows'], 4)  # three users and the count
+        self.assertEqual(idle['queries'], 0)
+        self.assertEqual(profiler.as_dict()['total']['queries'], 2)
+
+    @override_settings(REPORTS_COMPUTE_METRICS=True)
+    def test_pipeline_stores_profile_on_report(self):
+        base_date = datetime.datetime(2024, 1, 15, tzinfo=datetime.timezone.utc)
+        Job.objects.create(
+            job_id="J1", job_name="Job 1", state="completed", job_type="regular",
+            starting_date=base_date, end_date=base_date + datetime.timedelta(days=2), completion_time=2
+        )
+        with override_settings(REPORTS_COMPUTE_IN_BACKGROUND=True):
+            report = Report.objects.create(title="Q1", quarter_from="Q1", year_from=2024,
+                                           quarter_to="Q1", year_to=2024)
+        ReportPipeline(report).run()
+
+        report.refresh_from_db()
+        stages = [stage['name'] for stage in report.profile['stages']]
+        self.assertEqual(stages, ['date_resolution', 'job_stats', 'order_stats', 'user_stats', 'metric_values',
+                                  'write'])
+        write = report.profile['stages'][-1]
+        # An upsert per result model, the upsert of the metric values and the removal of unregistered ones
+        self.assertEqual(write['queries'], 5)
+
+
+class SlowRequestMiddlewareTest(TestCase):
+    def get_response(self, request):
+        User.objects.count()
+        return HttpResponse()
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0, SLOW_REQUEST_PATH_PREFIXES=['/admin/'])
+    def test_slow_admin_request_is_logged(self):
+        middleware = SlowRequestMiddleware(self.get_response)
+
+        with self.assertLogs('stat_analysis.profiling', 'WARNING') as logs:
+            middleware(RequestFactory().get('/admin/core/order/'))
+        self.assertIn('1 queries', logs.output[0])
+
+        with self.assertNoLogs('stat_analysis.profiling', 'WARNING'):
+            middleware(RequestFactory().get('/api/reports/'))
+
+    @override_settings(DEBUG=True)
+    def test_not_adapted_under_asgi(self):
+        # With DEBUG Django logs every middleware it has to adapt to async
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0, SLOW_REQUEST_PATH_PREFIXES=['/admin/'])
+    async def test_async_admin_request_is_logged(self):
+        await self.async_client.aforce_login(await User.objects.acreate(username="admin", is_staff=True,
+                                                                           is_superuser=True))
+        with self.assertLogs('stat_analysis.profiling', 'WARNING') as logs:
+            response = await self.async_client.get('/admin/auth/user/')
+        self.assertEqual(response.status_code, 200)
+        # The queries of the sync admin view are counted
+        self.assertGreater(int(re.search(r'(\d+) queries', logs.output[0]).group(1)), 0)
+
+        with self.assertNoLogs('stat_analysis.profiling', 'WARNING'):
+            await self.async_client.get('/api/reports/')
@@ -0,0 +1,71 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from stat_analysis.models import Report
+from stat_analysis.pipeline import ReportPipeline
+from stat_analysis.rollups import rebuild_rollups, rollups_are_valid
+
+
+# Tables that grow with the data and must never be scanned by a report
+HOT_TABLES = ['execution_job', 'core_order', 'core_customer', 'core_order_services', 'stat_analysis_report']
+
+# Deliberate full scans of a hot table
+ALLOWED_FULL_SCANS = [
+    # The total number of customers of the user statistics, over the narrowest index
+    'SELECT COUNT(*) AS "__count" FROM "core_customer"',
+]
+
+
+@override_settings(
+    CACHES={'plans': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    REPORTS_CACHE='plans',
+    REPORTS_COMPUTE_IN_BACKGROUND=True,
+)
+class QueryPlanTest(TestCase):
+    """Check with EXPLAIN QUERY PLAN that the report queries use the indexes."""
+
+    def setUp(self):
+        self.report = Report.objects.create(title="Plans", quarter_from="Q1", year_from=2024,
+                                            quarter_to="Q2", year_to=2024)
+
+    def capture_report_queries(self):
+        """The report queries reading a hot table, also those without a WHERE clause."""
+        pipeline = ReportPipeline(self.report)
+        with CaptureQueriesContext(connection) as queries:
+            pipeline.job_stats
+            pipeline.order_stats
+            pipeline.user_stats
+            Report.objects.filter(quarter_from="Q1", year_from=2024, quarter_to="Q2", year_to=2024).first()
+        return [query['sql'] for query in queries.captured_queries
+                if any(f'"{table}"' in query['sql'] for table in HOT_TABLES)]
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            details = [row[3] for row in cursor.fetchall()]
+        return [detail for detail in details
+                if detail.startswith('SCAN ') and detail.split()[1] in HOT_TABLES]
+
+    def assert_no_full_scans(self, queries):
+        self.assertTrue(queries)
+        for sql in queries:
+            if sql in ALLOWED_FULL_SCANS:
+                continue
+            with self.subTest(sql=sql):
+                self.assertEqual(self.full_scans(sql), [])
+
+    @override_settings(REPORTS_USE_ROLLUPS=False)
+    def test_raw_queries_use_indexes(self):
+        self.assert_no_full_scans(self.capture_report_queries())
+
+    @override_settings(REPORTS_USE_ROLLUPS=True)
+    def test_rollup_queries_use_indexes(self):
+        rebuild_rollups()
+        self.assertTrue(rollups_are_valid())
+        self.assert_no_full_scans(self.capture_report_queries())
+
+    def test_full_scan_is_detected(self):
+        self.assertEqual(self.full_scans("SELECT * FROM execution_job WHERE job_name = 'x'"),
+                         ['SCAN execution_job'])
+        # Also without a WHERE clause
+        self.assertEqual(self.full_scans('SELECT * FROM core_order ORDER BY total_value'), ['SCAN core_order'])
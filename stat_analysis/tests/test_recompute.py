@@ -0,0 +1,120 @@
+import datetime
+import io
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from core.models import AccountManager, Customer, Order, Service, ServiceProvider
+from stat_analysis import recompute
+from stat_analysis.cache import bump_data_version
+from stat_analysis.models import DataVersion, Report, ReportTask, OrderReportResult
+from stat_analysis.recompute import Checkpoint, recompute_reports, select_reports
+from stat_analysis.stat_utils import get_quarter_index
+
+
+def create_report(title, quarter_from, year_from, quarter_to, year_to, **kwargs):
+    report = Report.objects.create(title=title, quarter_from=quarter_from, year_from=year_from,
+                                   quarter_to=quarter_to, year_to=year_to, **kwargs)
+    ReportTask.objects.filter(report=report).delete()
+    return report
+
+
+@override_settings(REPORTS_COMPUTE_IN_BACKGROUND=True)
+class SelectReportsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="anna")
+        self.q1 = create_report("Q1", "Q1", 2024, "Q1", 2024, created_by=self.user)
+        self.year = create_report("2024", "Q1", 2024, "Q4", 2024)
+        self.old = create_report("2022", "Q1", 2022, "Q2", 2022)
+        Report.objects.filter(pk=self.q1.pk).update(status=Report.STATUS_DONE, finished_at=timezone.now())
+
+    def test_filters(self):
+        q3 = get_quarter_index('Q3', 2024)
+        self.assertEqual(select_reports(overlapping=(q3, q3)), [self.year])
+        self.assertEqual(select_reports(created_by="anna"), [self.q1])
+        self.assertEqual(select_reports(statuses=[Report.STATUS_DONE]), [self.q1])
+        computed_before = timezone.now() - datetime.timedelta(hours=1)
+        self.assertEqual(select_reports(computed_before=computed_before), [self.year, self.old])
+
+    def test_dry_run_counts_ranges(self):
+        create_report("Q1 again", "Q1", 2024, "Q1", 2024)
+        stdout = io.StringIO()
+        call_command('recompute_reports', '--dry-run', '--range', 'Q1', '2024', 'Q1', '2024', stdout=stdout)
+        self.assertIn("Selected 3 report(s) over 2 range(s)", stdout.getvalue())
+
+
+@override_settings(
+    CACHES={'stats': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    REPORTS_CACHE='stats',
+    REPORTS_COMPUTE_IN_BACKGROUND=True,
+    REPORTS_FANOUT_WORKERS=1,
+)
+class RecomputeReportsTest(TransactionTestCase):
+    """Outside of a transaction, so the pool threads see the data."""
+
+    def setUp(self):
+        user = User.objects.create(username="manager")
+        manager = AccountManager.objects.create(user=user)
+        customer = Customer.objects.create(name="Acme", created_by=manager)
+        provider = ServiceProvider.objects.create(name="Fab")
+        service = Service.objects.create(name="Etch", price=Decimal("10.00"), provider=provider)
+        order = Order.objects.create(customer=customer, account_manager=manager,
+                                     created_at=datetime.datetime(2024, 2, 1, tzinfo=datetime.timezone.utc))
+        order.services.add(service)
+        # Created up front, the pool threads only read
+        for source, _ in DataVersion.SOURCE_CHOICES:
+            bump_data_version(source)
+
+        self.reports = [create_report(f"Q1 {index}", "Q1", 2024, "Q1", 2024) for index in range(3)]
+        self.reports += [create_report(f"2024 {index}", "Q1", 2024, "Q4", 2024) for index in range(2)]
+        self.checkpoint_path = os.path.join(tempfile.mkdtemp(), 'recompute.checkpoint')
+        self.addCleanup(os.rmdir, os.path.dirname(self.checkpoint_path))
+
+    def test_each_range_is_computed_once(self):
+        messages = []
+        with mock.patch('stat_analysis.recompute.compute_range', wraps=recompute.compute_range) as compute_range:
+            totals = recompute_reports(self.reports, workers=2, batch_size=100, progress=messages.append)
+
+        self.assertEqual(compute_range.call_count, 2)
+        self.assertEqual((totals['reports'], totals['ranges'], totals['failed']), (5, 2, 0))
+        self.assertEqual(len(messages), 1)
+        for report in Report.objects.all():
+            self.assertEqual(report.status, Report.STATUS_DONE)
+            self.assertIsNotNone(report.profile)
+        self.assertEqual(set(OrderReportResult.objects.values_list('total_orders', flat=True)), {1})
+        self.assertEqual(OrderReportResult.objects.count(), 5)
+
+    def test_resume_skips_written_reports(self):
+        selection = {'created_by': None}
+        Checkpoint(self.checkpoint_path, selection).add([self.reports[0].pk, self.reports[1].pk])
+
+        checkpoint = Checkpoint(self.checkpoint_path, selection)
+        totals = recompute_reports(self.reports, workers=2, batch_size=1, checkpoint=checkpoint)
+        self.assertEqual((totals['reports'], totals['skipped']), (3, 2))
+        self.assertFalse(OrderReportResult.objects.filter(report__in=self.reports[:2]).exists())
+        # Removed once complete
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+    def test_checkpoint_of_other_filters(self):
+        Checkpoint(self.checkpoint_path, {'created_by': "anna"}).add([self.reports[0].pk])
+        self.addCleanup(os.remove, self.checkpoint_path)
+        with self.assertRaises(ValueError):
+            Checkpoint(self.checkpoint_path, {'created_by': None})
+
+    def test_failed_range_is_recorded(self):
+        with mock.patch('stat_analysis.recompute.ReportPipeline.compute', side_effect=RuntimeError("boom")), \
+                self.assertLogs('stat_analysis.recompute', 'ERROR'):
+            totals = recompute_reports(self.reports, workers=1)
+        self.assertEqual(totals['failed'], 5)
+        self.assertIn("RuntimeError: boom", Report.objects.get(pk=self.reports[0].pk).error)
+
+    def test_command(self):
+        stdout = io.StringIO()
+        call_command('recompute_reports', '--range', 'Q4', '2024', 'Q4', '2024', '--workers', '2',
+                     '--checkpoint', self.checkpoint_path, stdout=stdout)
+        self.assertIn("Recomputed 2 report(s) over 1 range(s)", stdout.getvalue())
+        self.assertEqual(OrderReportResult.objects.count(), 2)
@@ -0,0 +1,149 @@
+import datetime
+from io import StringIO
+from decimal import Decimal
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.contrib.auth.models import User
+from execution.models import Job
+from core.totals import repair_order_totals
+from stat_analysis.models import OrderManagerRollup, OrderReportResult, Report, RollupState
+from stat_analysis.pipeline import ReportPipeline
+from stat_analysis.rollups import merged_stats, raw_stats, rebuild_rollups, verify_rollups
+from stat_analysis.stat_utils import get_quarter_index
+from core.models import Order, Customer, AccountManager, ServiceProvider, Service
+
+
+class RollupMaintenanceTest(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username="manager1", first_name="John", last_name="Doe")
+        self.manager1 = AccountManager.objects.create(user=self.user1)
+        self.user2 = User.objects.create(username="manager2")
+        self.manager2 = AccountManager.objects.create(user=self.user2)
+
+        self.q1 = datetime.datetime(2024, 2, 10, tzinfo=datetime.timezone.utc)
+        self.q2 = datetime.datetime(2024, 5, 10, tzinfo=datetime.timezone.utc)
+        self.last_day_q1 = datetime.datetime(2024, 3, 31, 18, tzinfo=datetime.timezone.utc)
+
+        self.customer1 = Customer.objects.create(name="Customer 1", created_by=self.manager1, created_at=self.q1)
+        self.customer2 = Customer.objects.create(name="Customer 2", created_by=self.manager2, created_at=self.q2)
+
+        self.provider1 = ServiceProvider.objects.create(name="Provider 1")
+        self.provider2 = ServiceProvider.objects.create(name="Provider 2")
+        self.service1 = Service.objects.create(name="Service 1", price=Decimal('100.00'), provider=self.provider1)
+        self.service2 = Service.objects.create(name="Service 2", price=Decimal('200.00'), provider=self.provider1)
+        self.service3 = Service.objects.create(name="Service 3", price=Decimal('50.00'), provider=self.provider2)
+
+        self.order1 = Order.objects.create(customer=self.customer1, account_manager=self.manager1, created_at=self.q1)
+        self.order1.services.add(self.service1, self.service2)
+        self.order2 = Order.objects.create(customer=self.customer2, account_manager=self.manager2,
+                                           created_at=self.last_day_q1)
+        self.order2.services.add(self.service3)
+        self.order3 = Order.objects.create(customer=self.customer2, account_manager=self.manager1, created_at=self.q2)
+        self.order3.services.add(self.service1, self.service3)
+
+        Job.objects.create(job_id="J1", job_name="Job 1", state="completed", job_type="regular",
+                           starting_date=self.q1, end_date=self.q1 + datetime.timedelta(days=2), completion_time=2)
+        Job.objects.create(job_id="J2", job_name="Job 2", state="active", job_type="wafer_run",
+                           starting_date=self.q1, end_date=self.q2, completion_time=90)
+        Job.objects.create(job_id="J3", job_name="Job 3", state="created", job_type="regular",
+                           starting_date=self.q2, end_date=self.q2 + datetime.timedelta(days=4), completion_time=4)
+
+        self.first = get_quarter_index("Q1", 2024)
+        self.last = get_quarter_index("Q2", 2024)
+
+    def assertRollupsMatchRawData(self):
+        self.assertEqual(verify_rollups([self.first, self.last]), [])
+
+    def test_rollups_match_raw_data_after_creation(self):
+        self.assertRollupsMatchRawData()
+
+        stats = merged_stats(self.first, self.last)
+        self.assertEqual(stats['orders']['total_orders'], 3)
+        self.assertEqual(stats['orders']['total_revenue'], Decimal('500.00'))
+        self.assertEqual(stats['orders']['orders_per_service_provider'], {'Provider 1': 2, 'Provider 2': 2})
+        self.assertEqual(stats['jobs']['total_jobs'], 3)
+        # The job spanning both quarters only belongs to the two-quarter range
+        self.assertEqual(merged_stats(self.first, self.first)['jobs']['total_jobs'], 1)
+        # Orders on the last day of a quarter are counted in that quarter
+        self.assertEqual(merged_stats(self.first, self.first)['orders']['total_orders'], 2)
+
+    def test_rollups_follow_order_and_service_changes(self):
+        self.order1.services.remove(self.service2)
+        self.order2.services.clear()
+        self.service3.orders.add(self.order1)
+        self.order3.created_at = self.q1
+        self.order3.account_manager = self.manager2
+        self.order3.save()
+        self.service1.price = Decimal('120.00')
+        self.service1.save()
+        self.assertRollupsMatchRawData()
+
+        self.service3.orders.clear()
+        self.service2.delete()
+        self.order1.delete()
+        self.assertRollupsMatchRawData()
+
+        stats = merged_stats(self.first, self.last)
+        self.assertEqual(stats['orders']['total_orders'], 2)
+        self.assertEqual(stats['orders']['total_revenue'], Decimal('120.00'))
+
+    def test_rollups_follow_job_and_customer_changes(self):
+        job = Job.objects.get(job_id="J3")
+        job.state = "completed"
+        job.starting_date = self.q1
+        job.save()
+        Job.objects.get(job_id="J1").delete()
+        self.customer2.created_at = self.q1
+        self.customer2.save()
+        Customer.objects.create(name="Customer 3", created_at=self.q2)
+        self.assertRollupsMatchRawData()
+
+        stats = merged_stats(self.first, self.last)
+        self.assertEqual(stats['jobs']['num_completed'], 1)
+        self.assertEqual(stats['users']['new_customers'], 3)
+
+    @override_settings(
+        CACHES={'stats': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'repair'}},
+        REPORTS_CACHE='stats',
+        REPORTS_COMPUTE_IN_BACKGROUND=True,
+    )
+    def test_repair_of_order_totals_updates_rollups_and_reports(self):
+        Order.objects.filter(pk=self.order1.pk).update(total_value=0)
+        rebuild_rollups()
+        report = Report.objects.create(title="H1", quarter_from="Q1", year_from=2024, quarter_to="Q2", year_to=2024)
+        ReportPipeline(report).run()
+        self.assertEqual(OrderReportResult.objects.get(report=report).total_revenue, Decimal('200.00'))
+
+        self.assertEqual(repair_order_totals(), 1)
+        self.assertRollupsMatchRawData()
+        self.assertEqual(merged_stats(self.first, self.last)['orders']['total_revenue'], Decimal('500.00'))
+        ReportPipeline(report).run()
+        self.assertEqual(OrderReportResult.objects.get(report=report).total_revenue, Decimal('500.00'))
+
+    def test_rebuild_command_regenerates_and_verifies(self):
+        OrderManagerRollup.objects.all().delete()
+        self.assertNotEqual(verify_rollups([self.first, self.last]), [])
+
+        call_command('rebuild_rollups', '--verify', stdout=StringIO())
+
+        self.assertRollupsMatchRawData()
+        self.assertTrue(RollupState.objects.get(pk=1).is_valid)
+        self.assertEqual(merged_stats(self.first, self.last), raw_stats(self.first, self.last))
+
+
+class FailedWriteTest(TransactionTestCase):
+    """Outside of a transaction, so nothing rolls back the rollups of a failed save."""
+
+    def test_failed_save_keeps_rollups(self):
+        start = datetime.datetime(2024, 2, 10, tzinfo=datetime.timezone.utc)
+        Job.objects.create(job_id="J1", job_name="Job 1", state="completed", job_type="regular",
+                           starting_date=start, end_date=start + datetime.timedelta(days=2), completion_time=2)
+        job = Job.objects.create(job_id="J2", job_name="Job 2", state="active", job_type="regular",
+                                 starting_date=start, end_date=start + datetime.timedelta(days=3), completion_time=3)
+
+        job.job_id = "J1"
+        job.state = "completed"
+        with self.assertRaises(IntegrityError):
+            job.save()
+        self.assertEqual(verify_rollups([get_quarter_index("Q1", 2024)]), [])
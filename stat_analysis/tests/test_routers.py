@@ -0,0 +1,125 @@
+import datetime
+import io
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from core.models import AccountManager, Customer, Order, Service, ServiceProvider
+from execution.models import Job
+from stat_analysis.exports import export_report_data
+from stat_analysis.models import Report, JobReportResult
+from stat_analysis.pipeline import ReportPipeline
+from stat_analysis.routers import AnalyticsRouter, analytics_reads, iterate_analytics, primary_reads
+
+
+@override_settings(REPORTS_READ_DATABASE='replica')
+class AnalyticsRouterTest(TestCase):
+    def setUp(self):
+        self.router = AnalyticsRouter()
+
+    def test_reads_go_to_replica_inside_analytics_reads(self):
+        self.assertIsNone(self.router.db_for_read(Order))
+        with analytics_reads():
+            self.assertEqual(self.router.db_for_read(Order), 'replica')
+            self.assertEqual(self.router.db_for_read(Job), 'replica')
+            with primary_reads():
+                self.assertIsNone(self.router.db_for_read(Order))
+        self.assertIsNone(self.router.db_for_read(Order))
+
+    def test_reports_and_writes_use_primary(self):
+        with analytics_reads():
+            self.assertIsNone(self.router.db_for_read(Report))
+            self.assertIsNone(self.router.db_for_read(JobReportResult))
+            self.assertEqual(self.router.db_for_write(Order), 'default')
+
+    def test_no_migrations_on_replica(self):
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+        self.assertFalse(self.router.allow_migrate('replica', 'core'))
+
+    def test_iterate_analytics_does_not_leak(self):
+        def rows():
+            for _ in range(2):
+                yield self.router.db_for_read(Order)
+
+        for db in iterate_analytics(rows()):
+            self.assertEqual(db, 'replica')
+            self.assertIsNone(self.router.db_for_read(Order))
+
+    @override_settings(REPORTS_READ_DATABASE=None)
+    def test_without_replica(self):
+        with analytics_reads():
+            self.assertEqual(self.router.db_for_read(Order), 'default')
+
+
+@override_settings(
+    CACHES={'stats': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    REPORTS_CACHE='stats',
+    REPORTS_COMPUTE_IN_BACKGROUND=True,
+    REPORTS_READ_DATABASE='replica',
+)
+class ReplicaReadsTest(TransactionTestCase):
+    """With the replica mirroring the default database in the tests, the queries are counted per alias.
+
+    The mirror is a separate connection to the in-memory test database,
+    which only sees the committed rows.
+    """
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        user = User.objects.create(username="manager", first_name="Anna", last_name="Bauer")
+        manager = AccountManager.objects.create(user=user)
+        customer = Customer.objects.create(name="Acme", created_by=manager)
+        provider = ServiceProvider.objects.create(name="Fab")
+        service = Service.objects.create(name="Etch", price=Decimal("10.00"), provider=provider)
+        order = Order.objects.create(customer=customer, account_manager=manager,
+                                     created_at=datetime.datetime(2024, 2, 1, tzinfo=datetime.timezone.utc))
+        order.services.add(service)
+        self.report = Report.objects.create(title="Q1", quarter_from="Q1", year_from=2024,
+                                            quarter_to="Q1", year_to=2024)
+
+    def run_pipeline(self, **kwargs):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            results = ReportPipeline(self.report, **kwargs).run()
+        return results, primary.captured_queries, replica.captured_queries
+
+    def test_statistics_are_read_from_replica(self):
+        (job_result, order_result, user_result), primary, replica = self.run_pipeline()
+        self.assertEqual(order_result.total_orders, 1)
+        self.assertEqual(order_result.total_revenue, Decimal("10.00"))
+        self.assertTrue(replica)
+        # The primary only writes the results and the profile, and creates the missing version of the jobs
+        self.assertEqual([query['sql'] for query in primary
+                          if query['sql'].startswith('SELECT') and 'stat_analysis_dataversion' not in query['sql']], [])
+
+    def test_profile_counts_replica_queries(self):
+        def stage_queries(**kwargs):
+            self.run_pipeline(**kwargs)
+            self.report.refresh_from_db()
+            return {stage['name']: stage['queries'] for stage in self.report.profile['stages'][1:-1]}
+
+        # The first computation also creates the missing version of the jobs
+        stage_queries(read_primary=True)
+        from_primary = stage_queries(read_primary=True)
+        from_replica = stage_queries()
+        self.assertEqual(from_replica, from_primary)
+
+    def test_read_primary(self):
+        _, primary, replica = self.run_pipeline(read_primary=True)
+        self.assertEqual(replica, [])
+        self.assertTrue([query['sql'] for query in primary if query['sql'].startswith('SELECT')])
+
+    def test_export_is_read_from_replica(self):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            lines = list(export_report_data('orders', 'ndjson', 'Q1', 2024, 'Q1', 2024))
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(len(replica), 2)
+        self.assertEqual(primary.captured_queries, [])
+
+    def test_sync_replica_requires_sqlite_replica(self):
+        with override_settings(REPORTS_READ_DATABASE=None), self.assertRaises(CommandError):
+            call_command('sync_replica', stdout=io.StringIO())
@@ -0,0 +1,78 @@
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from stat_analysis.cache import bump_data_version, get_or_compute_stats
+from stat_analysis.models import ComputationLock, DataVersion, Report
+from stat_analysis.singleflight import LockTimeout, advisory_lock
+from stat_analysis.stat_utils import get_or_create_report, get_quarter_index
+
+
+CONCURRENCY = 8
+
+
+@override_settings(
+    CACHES={'stats': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'singleflight'}},
+    REPORTS_CACHE='stats',
+    REPORTS_COMPUTE_IN_BACKGROUND=True,
+)
+class SingleFlightTest(TransactionTestCase):
+    """Outside of a transaction, so the locks of the threads see each other."""
+
+    def setUp(self):
+        # Created up front, the threads only take locks
+        for source, _ in DataVersion.SOURCE_CHOICES:
+            bump_data_version(source)
+
+    def run_concurrently(self, function):
+        start = threading.Barrier(CONCURRENCY)
+
+        def call():
+            start.wait()
+            try:
+                return function()
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+            futures = [pool.submit(call) for _ in range(CONCURRENCY)]
+            return [future.result() for future in futures]
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+        quarter = get_quarter_index('Q1', 2024)
+
+        def compute():
+            calls.append(1)
+            # Long enough for all others to miss the cache
+            time.sleep(0.3)
+            return {'total_orders': 42}
+
+        results = self.run_concurrently(lambda: get_or_compute_stats('orders', (quarter, quarter), compute))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'total_orders': 42}] * CONCURRENCY)
+        self.assertFalse(ComputationLock.objects.exists())
+
+    def test_concurrent_calls_create_one_report(self):
+        reports = self.run_concurrently(lambda: get_or_create_report('Q1', 2024, 'Q2', 2024, 'Report'))
+
+        self.assertEqual(Report.objects.count(), 1)
+        self.assertEqual({report.pk for report in reports}, {Report.objects.get().pk})
+
+    def test_expired_lock_is_taken_over(self):
+        ComputationLock.objects.create(key='stale', owner='dead', expires_at=timezone.now() - datetime.timedelta(1))
+        with advisory_lock('stale', wait=1):
+            self.assertNotEqual(ComputationLock.objects.get(key='stale').owner, 'dead')
+        self.assertFalse(ComputationLock.objects.exists())
+
+    def test_wait_times_out(self):
+        ComputationLock.objects.create(key='held', owner='other', expires_at=timezone.now() + datetime.timedelta(1))
+        with self.assertRaises(LockTimeout):
+            with advisory_lock('held', wait=0.1):
+                pass
+        # The lock of the other holder is kept
+        self.assertTrue(ComputationLock.objects.filter(key='held', owner='other').exists())
@@ -0,0 +1,80 @@
+import datetime
+import random
+from django.test import TestCase
+from execution.models import Job
+from stat_analysis.aggregation import aggregate_job_stats
+from stat_analysis.rollups import rollup_job_stats
+from stat_analysis.sketches import RELATIVE_ACCURACY, QuantileSketch
+from stat_analysis.stat_utils import get_quarter_index
+
+
+class QuantileSketchTest(TestCase):
+    def exact_quantile(self, values, q):
+        return sorted(values)[int(q * (len(values) - 1))]
+
+    def test_quantiles_are_within_relative_accuracy(self):
+        rng = random.Random(0)
+        values = [rng.lognormvariate(2.5, 0.8) for _ in range(5000)]
+        sketch = QuantileSketch()
+        for value in values:
+            sketch.add(value)
+
+        for q in (0.5, 0.9, 0.99):
+            exact = self.exact_quantile(values, q)
+            self.assertLessEqual(abs(sketch.quantile(q) - exact), exact * RELATIVE_ACCURACY)
+        # Memory is bounded by the number of buckets, not values
+        self.assertLess(len(sketch.buckets), 500)
+
+    def test_merge_equals_sketch_of_all_values(self):
+        first, second, combined = QuantileSketch(), QuantileSketch(), QuantileSketch()
+        for value in [0, 1.5, 3, 7]:
+            first.add(value)
+            combined.add(value)
+        for value in [2, 30, 120]:
+            second.add(value)
+            combined.add(value)
+
+        self.assertEqual(first.merge(second).buckets, combined.buckets)
+        self.assertEqual(combined.histogram()['0-1'], 1)
+        self.assertEqual(combined.histogram()['100+'], 1)
+        self.assertEqual(combined.merge(second, sign=-1).count, 4)
+
+    def test_values_on_an_edge_are_counted_in_the_bin_above(self):
+        sketch = QuantileSketch()
+        for value in [0.5, 1, 2, 20, 50]:
+            sketch.add(value)
+        self.assertEqual(sketch.histogram(), {'0-1': 1, '1-2': 1, '2-5': 1, '5-10': 0, '10-20': 0,
+                                              '20-50': 1, '50-100': 1, '100+': 0})
+
+
+class JobDistributionStatsTest(TestCase):
+    def setUp(self):
+        base_date = datetime.datetime(2024, 1, 15, tzinfo=datetime.timezone.utc)
+        for index, completion_time in enumerate([1, 2, 3, 4, 100]):
+            Job.objects.create(
+                job_id=f"J{index}", job_name=f"Job {index}", state="completed", job_type="regular",
+                starting_date=base_date, end_date=base_date + datetime.timedelta(days=completion_time),
+                completion_time=completion_time
+            )
+        Job.objects.create(
+            job_id="W1", job_name="Wafer 1", state="active", job_type="wafer_run",
+            starting_date=base_date + datetime.timedelta(days=100),
+            end_date=base_date + datetime.timedelta(days=110), completion_time=10
+        )
+
+    def test_distribution_in_database_and_from_rollups(self):
+        stats = aggregate_job_stats(Job.objects.all())
+
+        self.assertAlmostEqual(stats['median_completion_time_regular'], 3, delta=3 * RELATIVE_ACCURACY)
+        self.assertAlmostEqual(stats['p90_completion_time_regular'], 4, delta=4 * RELATIVE_ACCURACY)
+        self.assertEqual(stats['completion_time_histogram']['regular']['100+'], 1)
+        self.assertAlmostEqual(stats['median_completion_time_wafer_run'], 10, delta=10 * RELATIVE_ACCURACY)
+        self.assertEqual(stats['completion_time_histogram']['regular']['2-5'], 3)
+
+        # The wafer run starts in the next quarter, the rollups merge both quarters
+        merged = rollup_job_stats(get_quarter_index('Q1', 2024), get_quarter_index('Q2', 2024))
+        for name in ('median_completion_time_regular', 'p90_completion_time_regular',
+                     'median_completion_time_wafer_run', 'completion_time_histogram'):
+            self.assertEqual(merged[name], stats[name])
+        self.assertIsNone(rollup_job_stats(get_quarter_index('Q1', 2024),
+                                           get_quarter_index('Q1', 2024))['median_completion_time_wafer_run'])
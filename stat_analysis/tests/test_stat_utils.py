@@ -3,7 +3,7 @@ partly generated by Claude.ai
 """
 import datetime
 from decimal import Decimal
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
 from execution.models import Job
@@ -185,4 +185,52 @@ class ReportPDFTest(TestCase):
 
         # Check the file is attached
         self.assertTrue(report.pdf_report)
-        self.assertTrue(report.pdf_report.name.endswith('.pdf'))
\ No newline at end of file
+        self.assertTrue(report.pdf_report.name.endswith('.pdf'))
+
+
+@override_settings(REPORTS_COMPUTE_IN_BACKGROUND=False)
+class ReportPipelineTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="manager1", first_name="John", last_name="Doe")
+        self.manager = AccountManager.objects.create(user=self.user)
+        self.customer = Customer.objects.create(
+            name="Customer 1", created_by=self.manager,
+            created_at=datetime.datetime(2024, 2, 1, tzinfo=datetime.timezone.utc)
+        )
+        provider = ServiceProvider.objects.create(name="Provider 1")
+        service = Service.objects.create(name="Service 1", price=Decimal('100.00'), provider=provider)
+
+        base_date = datetime.datetime(2024, 1, 15, tzinfo=datetime.timezone.utc)
+        order = Order.objects.create(customer=self.customer, account_manager=self.manager, created_at=base_date)
+        order.services.add(service)
+        Job.objects.create(
+            job_id="J1", job_name="Job 1", state="completed", job_type="regular",
+            starting_date=base_date, end_date=base_date + datetime.timedelta(days=2),
+            completion_time=2
+        )
+
+    def test_save_computes_all_results_for_the_saved_report(self):
+        # Two reports with the same range each get their own results
+        other = Report.objects.create(title="Other", quarter_from="Q1", year_from=2024,
+                                      quarter_to="Q1", year_to=2024)
+        report = Report.objects.create(title="Q1", quarter_from="Q1", year_from=2024,
+                                       quarter_to="Q1", year_to=2024)
+
+        for obj in (other, report):
+            self.assertEqual(obj.jobreportresult.total_jobs, 1)
+            self.assertEqual(obj.orderreportresult.total_revenue, Decimal('100.00'))
+            self.assertEqual(obj.userreportresult.new_customers, 1)
+            self.assertEqual(obj.userreportresult.top_performing_managers, {'John Doe': 100.0})
+
+    def test_resave_updates_results_in_place(self):
+        report = Report.objects.create(title="Q1", quarter_from="Q1", year_from=2024,
+                                       quarter_to="Q1", year_to=2024)
+        result_id = report.orderreportresult.pk
+
+        report.quarter_to = "Q2"
+        report.save()
+        report.refresh_from_db()
+
+        self.assertEqual(report.orderreportresult.pk, result_id)
+        self.assertEqual(report.orderreportresult.total_orders, 1)
+        self.assertEqual(Report.objects.count(), 1)
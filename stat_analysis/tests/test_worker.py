@@ -0,0 +1,81 @@
+import datetime
+from unittest import mock
+from django.test import TestCase, override_settings
+from execution.models import Job
+from stat_analysis.models import Report, ReportTask, JobReportResult
+from stat_analysis.worker import claim_next_task, process_next_task, process_task, requeue_stale_tasks
+
+
+@override_settings(REPORTS_COMPUTE_IN_BACKGROUND=True)
+class ReportWorkerTest(TestCase):
+    def setUp(self):
+        base_date = datetime.datetime(2024, 1, 15, tzinfo=datetime.timezone.utc)
+        Job.objects.create(
+            job_id="J1", job_name="Job 1", state="completed", job_type="regular",
+            starting_date=base_date, end_date=base_date + datetime.timedelta(days=2),
+            completion_time=2
+        )
+        self.report = Report.objects.create(title="Q1", quarter_from="Q1", year_from=2024,
+                                            quarter_to="Q1", year_to=2024)
+
+    def test_save_queues_the_report(self):
+        self.assertEqual(self.report.status, Report.STATUS_PENDING)
+        self.assertEqual(ReportTask.objects.filter(report=self.report).count(), 1)
+        self.assertFalse(JobReportResult.objects.exists())
+
+        # Saving again while queued does not add a second task
+        self.report.save()
+        self.assertEqual(ReportTask.objects.count(), 1)
+
+    def test_worker_computes_the_report(self):
+        self.assertTrue(process_next_task())
+        self.assertFalse(process_next_task())
+
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.status, Report.STATUS_DONE)
+        self.assertEqual(self.report.progress, 100)
+        self.assertIsNotNone(self.report.started_at)
+        self.assertIsNotNone(self.report.finished_at)
+        self.assertEqual(self.report.jobreportresult.total_jobs, 1)
+        self.assertFalse(ReportTask.objects.exists())
+
+    def test_failure_is_recorded_on_the_report(self):
+        with mock.patch('stat_analysis.worker.ReportPipeline.run', side_effect=RuntimeError("boom")), \
+                self.assertLogs('stat_analysis.worker', 'ERROR'):
+            self.assertTrue(process_next_task())
+
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.status, Report.STATUS_FAILED)
+        self.assertIn("RuntimeError: boom", self.report.error)
+        self.assertFalse(ReportTask.objects.exists())
+
+    def test_claimed_task_is_not_claimed_twice(self):
+        self.assertIsNotNone(claim_next_task())
+        self.assertIsNone(claim_next_task())
+
+        # A task whose worker died is released after the timeout
+        self.assertEqual(requeue_stale_tasks(timeout=-1), 1)
+        self.assertIsNotNone(claim_next_task())
+
+    def test_report_deleted_after_claim(self):
+        task = claim_next_task()
+        Report.objects.filter(pk=self.report.pk).delete()
+        process_task(task)
+        self.assertFalse(ReportTask.objects.exists())
+
+    def test_report_saved_while_running_stays_pending(self):
+        def save_during_run(pipeline, on_progress=None):
+            # Changing the range queues the report again
+            report = Report.objects.get(pk=pipeline.report.pk)
+            report.quarter_to = "Q2"
+            report.save()
+
+        with mock.patch('stat_analysis.worker.ReportPipeline.run', autospec=True, side_effect=save_during_run):
+            self.assertTrue(process_next_task())
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.status, Report.STATUS_PENDING)
+        self.assertEqual(ReportTask.objects.filter(report=self.report, claimed_at__isnull=True).count(), 1)
+
+        self.assertTrue(process_next_task())
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.status, Report.STATUS_DONE)
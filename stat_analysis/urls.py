@@ -0,0 +1,13 @@
+from django.urls import path
+
+from stat_analysis import api, views
+
+
+app_name = 'stat_analysis'
+
+urlpatterns = [
+    path('reports/<int:pk>/export/<slug:kind>.<slug:export_format>', views.export_report, name='export_report'),
+    path('api/reports', api.report_list, name='api_reports'),
+    path('api/reports/<int:pk>', api.report_detail, name='api_report'),
+    path('api/reports/<int:pk>/recompute', api.recompute_report, name='api_recompute_report'),
+]
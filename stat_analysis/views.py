@@ -0,0 +1,34 @@
+"""stat_analysis.views.py
+
+Streaming exports of the Orders and Jobs behind a report, see
+`stat_analysis.exports`.
+"""
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+
+from stat_analysis.exports import EXPORT_FORMATS, EXPORTS, export_filename, export_report_data
+from stat_analysis.models import Report
+
+
+# Permission needed to export each kind of rows
+EXPORT_PERMISSIONS = {
+    'orders': 'core.view_order',
+    'jobs': 'execution.view_job',
+}
+
+
+@staff_member_required
+def export_report(request, pk, kind, export_format):
+    if kind not in EXPORTS or export_format not in EXPORT_FORMATS:
+        raise Http404("Unknown export.")
+    if not request.user.has_perm(EXPORT_PERMISSIONS[kind]):
+        raise PermissionDenied
+
+    report = get_object_or_404(Report, pk=pk)
+    lines = export_report_data(kind, export_format, report.quarter_from, report.year_from,
+                               report.quarter_to, report.year_to)
+    response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(report, kind, export_format)}"'
+    return response
@@ -0,0 +1,146 @@
+"""stat_analysis.worker.py
+
+This module computes Reports in the background.
+
+Report.save queues a ReportTask, the worker started with
+`manage.py run_report_worker` claims the tasks from the database
+table and runs the ReportPipeline in a thread pool. No external
+broker is required.
+"""
+import datetime
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, connection
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from stat_analysis.models import Report, ReportTask
+from stat_analysis.pipeline import ReportPipeline
+
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_report(report):
+    """Queue `report` for computation and mark it as pending."""
+    ReportTask.objects.get_or_create(report=report, claimed_at=None)
+    updated_at = timezone.now()
+    Report.objects.filter(pk=report.pk).update(
+        status=Report.STATUS_PENDING, progress=0, started_at=None, finished_at=None, error='',
+        updated_at=updated_at,
+    )
+    report.updated_at = updated_at
+    report.status = Report.STATUS_PENDING
+    report.progress = 0
+    report.started_at = report.finished_at = None
+    report.error = ''
+
+
+def claim_next_task():
+    """Claim the oldest unclaimed task, or return None if the queue is empty.
+
+    Claiming is a conditional UPDATE so concurrent workers never
+    process the same task, also on databases without row locks.
+    """
+    for task in ReportTask.objects.filter(claimed_at__isnull=True)[:10]:
+        claimed_at = timezone.now()
+        if ReportTask.objects.filter(pk=task.pk, claimed_at__isnull=True).update(claimed_at=claimed_at):
+            task.claimed_at = claimed_at
+            return task
+    return None
+
+
+def requeue_stale_tasks(timeout):
+    """Release tasks claimed more than `timeout` seconds ago, e.g. by a killed worker."""
+    cutoff = timezone.now() - datetime.timedelta(seconds=timeout)
+    return ReportTask.objects.filter(claimed_at__lt=cutoff).update(claimed_at=None)
+
+
+def current_report(report):
+    """Queryset of `report` for updating its status, empty once it was queued again.
+
+    A report saved while its task runs gets a new task and is pending,
+    the running computation must not mark it as done.
+    """
+    queued = ReportTask.objects.filter(report=OuterRef('pk'), claimed_at__isnull=True)
+    return Report.objects.filter(pk=report.pk).exclude(Exists(queued))
+
+
+def process_task(task):
+    """Compute the report of a claimed `task` and record the outcome on the report."""
+    try:
+        try:
+            report = task.report
+        except Report.DoesNotExist:
+            # Deleted after the task was claimed
+            return
+        started_at = timezone.now()
+        current_report(report).update(
+            status=Report.STATUS_RUNNING, progress=0, started_at=started_at, finished_at=None, error='',
+            updated_at=started_at,
+        )
+
+        def on_progress(percent):
+            current_report(report).update(progress=percent, updated_at=timezone.now())
+
+        try:
+            ReportPipeline(report).run(on_progress=on_progress)
+        except Exception:
+            logger.exception("Computation of report %s failed", report.pk)
+            finished_at = timezone.now()
+            current_report(report).update(
+                status=Report.STATUS_FAILED, finished_at=finished_at, error=traceback.format_exc(),
+                updated_at=finished_at,
+            )
+        else:
+            finished_at = timezone.now()
+            current_report(report).update(
+                status=Report.STATUS_DONE, progress=100, finished_at=finished_at, updated_at=finished_at
+            )
+    finally:
+        task.delete()
+
+
+def process_next_task():
+    """Claim and process one task. Returns False if the queue was empty."""
+    task = claim_next_task()
+    if task is None:
+        return False
+    process_task(task)
+    return True
+
+
+def _work_until_empty():
+    # Runs in a pool thread, which has its own database connection
+    close_old_connections()
+    try:
+        processed = 0
+        while process_next_task():
+            processed += 1
+        return processed
+    finally:
+        connection.close()
+
+
+def run_worker(workers=2, poll_interval=2.0, once=False, stale_timeout=3600):
+    """Process queued reports with `workers` threads.
+
+    With `once` the queue is drained and the number of processed
+    tasks is returned, otherwise the queue is polled every
+    `poll_interval` seconds until interrupted.
+    """
+    requeued = requeue_stale_tasks(stale_timeout)
+    if requeued:
+        logger.warning("Requeued %s stale report tasks", requeued)
+
+    total = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            futures = [pool.submit(_work_until_empty) for _ in range(workers)]
+            total += sum(future.result() for future in futures)
+            if once:
+                return total
+            time.sleep(poll_interval)